@@ -10,7 +10,9 @@ WATER_MARK_TEMPLATE_IMAGE_PATH = RESOURCES_DIR / "watermark_template.png"  # 水
 
 # 模型权重文件路径
 WATER_MARK_DETECT_YOLO_WEIGHTS = RESOURCES_DIR / "best.pt"  # YOLO水印检测模型权重
+WATER_MARK_DETECT_ONNX_WEIGHTS = RESOURCES_DIR / "best.onnx"  # 由YOLO权重导出的ONNX检测模型
 LAMA_CLEAN_WEIGHTS = RESOURCES_DIR / "big-lama.pt"  # LAMA图像修复模型权重
+LAMA_ONNX_WEIGHTS = RESOURCES_DIR / "big-lama.onnx"  # 由LAMA权重导出的ONNX模型（不存在时自动导出）
 
 # 输出目录
 OUTPUT_DIR = ROOT / "output"  # 输出文件目录
@@ -22,6 +24,86 @@ OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
 # 模型配置
 DEFAULT_WATERMARK_REMOVE_MODEL = "lama"  # 默认的水印移除模型
 
+# 流式处理配置
+STREAMING_WINDOW_SIZE = 16  # 流式模式下每次解码并检测的帧数（决定峰值内存）
+PIPELINE_QUEUE_SIZE = 4  # 多线程流水线中阶段之间有界队列的容量（以窗口计）
+
+# 分段并行处理配置
+SEGMENTS_PER_WORKER = 2  # 每个工作进程平均分到的片段数（片段越多负载越均衡）
+SEGMENT_MIN_FRAMES = 30  # 单个片段的最少帧数
+SEGMENT_OVERLAP_FRAMES = 8  # 片段前额外检测的帧数，用于跨片段边界补全漏检帧
+
+# 水印检测配置
+DETECT_STRIDE = 1  # 完整检测的帧间隔，中间帧仅做一致性校验（1表示每帧都检测）
+DETECT_MIN_SIMILARITY = 0.8  # 一致性校验的最小归一化相关系数，低于此值则重新检测
+DETECTOR_BACKEND = "ultralytics"  # 水印检测后端："ultralytics" 或 "onnx"（onnxruntime，不导入ultralytics）
+DETECT_IMAGE_SIZE = 640  # ONNX检测模型的输入尺寸
+DETECT_CONF_THRESHOLD = 0.25  # ONNX检测的置信度阈值（与ultralytics默认值一致）
+DETECT_IOU_THRESHOLD = 0.7  # ONNX检测NMS的IoU阈值（与ultralytics默认值一致）
+DETECT_MAX_DET = 300  # ONNX检测每帧最多保留的检测框数量
+DETECT_FRAME_SIZE = 0  # 低分辨率检测帧的最长边（0表示直接在原始帧上检测，640与YOLO输入尺寸一致）
+
+# LAMA批量推理配置
+LAMA_BATCH_SIZE = 4  # 跨帧批量修复时每批的水印裁剪块数量（1表示逐帧推理）
+LAMA_CROP_BUCKET = 32  # 裁剪块补齐尺寸的分桶粒度，保证批内张量形状固定
+LAMA_BACKEND = "torch"  # LAMA推理后端："torch"（TorchScript）或 "onnx"（ONNX Runtime，适合CPU节点）
+LAMA_ONNX_INTRA_OP_THREADS = 0  # ONNX Runtime单个算子内的线程数（0表示由onnxruntime决定）
+LAMA_ONNX_INTER_OP_THREADS = 0  # ONNX Runtime算子间并行的线程数（0表示顺序执行）
+LAMA_JIT_OPTIMIZE = True  # 加载时对TorchScript模型做freeze和optimize_for_inference（torch后端）
+LAMA_JIT_CACHE_DIR = RESOURCES_DIR / "jit_cache"  # 优化后模型的缓存目录（按模型MD5、torch版本和设备区分）
+# 加载后预热的输入形状 (批大小, 高, 宽)：水印框加上默认128像素边距并按分桶补齐后约为此尺寸
+LAMA_WARMUP_SHAPES = ((1, 352, 480), (LAMA_BATCH_SIZE, 352, 480))
+
+# 低精度推理配置（"fp32"、"int8" 动态量化（使用ONNX后端）、"bf16" 自动混合精度（使用torch后端））
+LAMA_PRECISION = "fp32"  # LAMA修复模型的推理精度
+DETECT_PRECISION = "fp32"  # 水印检测模型的推理精度
+PRECISION_MIN_PSNR = 35.0  # 精度守卫：水印区域相对fp32结果的最低PSNR（dB）
+PRECISION_MIN_SSIM = 0.95  # 精度守卫：水印区域相对fp32结果的最低SSIM
+
+# 修复块复用配置（镜头静止时跳过重复的LAMA推理）
+PATCH_REUSE_TOLERANCE = 0.0  # 环形区域签名平均绝对差的容差（0表示不复用）
+PATCH_REUSE_RING = 8  # 边界框周围参与签名计算的环形区域宽度（像素）
+PATCH_REUSE_CACHE_SIZE = 8  # 最多缓存的修复块数量
+PATCH_REUSE_MAX_HITS = 30  # 单个修复块最多被复用的次数，超过后强制重新推理
+PATCH_REUSE_COLOR_CORRECTION = True  # 复用时是否按环形区域的颜色偏移校正修复块
+
+# 视频编码配置方案（libx264）
+# - preset: 编码预设，越慢压缩率越高
+# - crf: 恒定质量参数，越小质量越高
+# - bitrate_factor: 相对原视频比特率的倍数，原视频比特率可用时优先于crf，为None时始终使用crf
+# - tune: 编码调优选项，为None时不设置
+# - threads: 编码线程数，0表示由编码器自动决定
+ENCODING_PROFILES = {
+    # 草稿：最快编码速度，适合预览和仅CPU的节点
+    "draft": {
+        "preset": "veryfast",
+        "crf": 28,
+        "bitrate_factor": None,
+        "tune": "fastdecode",
+        "threads": 0,
+    },
+    # 均衡：速度与质量折中
+    "balanced": {
+        "preset": "medium",
+        "crf": 22,
+        "bitrate_factor": None,
+        "tune": None,
+        "threads": 0,
+    },
+    # 存档：最高质量，使用略高于原视频的比特率（默认方案）
+    "archival": {
+        "preset": "slow",
+        "crf": 18,
+        "bitrate_factor": 1.2,
+        "tune": None,
+        "threads": 0,
+    },
+}
+DEFAULT_ENCODING_PROFILE = "archival"  # 默认编码方案
+ENCODER_FRAMES_PER_WRITE = 4  # 每次写入编码管道的系统调用合并的帧数
+ENCODER_PIPE_BUFFER_SIZE = 1 << 20  # 编码管道缓冲区大小（字节，仅Linux有效）
+FRAGMENT_SECONDS = 2.0  # 分片MP4输出时每个分片的时长（秒），同时作为关键帧间隔
+
 # 工作目录
 WORKING_DIR = ROOT / "working_dir"  # 临时工作目录
 WORKING_DIR.mkdir(exist_ok=True, parents=True)  # 创建工作目录
@@ -40,4 +122,27 @@ SQLITE_PATH = DATA_PATH / "db.sqlite3"  # 数据库文件位置
 
 # FFmpeg工具目录
 FFMPEG_DIR_PATH = ROOT / "ffmpeg"  # FFmpeg可执行文件目录
-FFMPEG_DIR_PATH.mkdir(exist_ok=True, parents=True)  # 创建FFmpeg目录
\ No newline at end of file
+FFMPEG_DIR_PATH.mkdir(exist_ok=True, parents=True)  # 创建FFmpeg目录
+
+# 服务端推理工作池
+SERVER_NUM_WORKERS = 1  # 工作进程数量，每个进程持有一份模型副本
+SERVER_WORKER_THREADS = 0  # 每个工作进程的推理线程数，0表示按CPU核数平均分配
+SERVER_WORKER_MAX_TASKS = 50  # 工作进程处理多少个任务后被替换，0表示不限制
+SERVER_WORKER_MAX_RSS_MB = 0  # 工作进程常驻内存超过多少MB后被替换，0表示不限制
+
+# 服务端上传
+UPLOAD_MAX_FIELD_SIZE = 64 * 1024  # 上传表单中文本字段的最大大小（字节）
+UPLOAD_MAX_SIZE_MB = 2048  # 单个上传文件的最大大小（MB），超过时返回413
+STREAM_POLL_INTERVAL = 0.5  # 边处理边下载时检查输出文件新分片的间隔（秒）
+
+# 服务端任务进度存储
+PROGRESS_FLUSH_INTERVAL = 2.0  # 进度快照批量写入数据库的间隔（秒），状态变化会提前触发写入
+PROGRESS_FLUSH_MIN_DELTA = 5  # 进度变化至少多少个百分点才写入数据库
+PROGRESS_STORE_MAX_TERMINAL = 10000  # 内存中保留的已结束任务数量，超出时移除最早的
+
+# 服务端进度推送
+EVENTS_HEARTBEAT_INTERVAL = 15.0  # SSE连接无进度变化时发送心跳的间隔（秒）
+WEBHOOK_ENABLED = False  # 是否允许提交任务时指定webhook回调地址
+WEBHOOK_ALLOWED_HOSTS = ()  # 允许回调的主机名（小写），为空时允许任意公网主机；内网、回环等地址始终拒绝
+WEBHOOK_TIMEOUT = 10.0  # 任务结束时回调webhook的请求超时（秒）
+WEBHOOK_RETRIES = 3  # webhook回调失败时的最大尝试次数
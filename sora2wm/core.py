@@ -1,35 +1,114 @@
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
 from typing import Callable
 
-import ffmpeg
 import numpy as np
 from loguru import logger
 from tqdm import tqdm
 
-# 初始化ffmpeg路径配置（优先使用本地ffmpeg）
-from sora2wm.utils.ffmpeg_utils import init_ffmpeg
-init_ffmpeg()
+# 初始化ffmpeg路径配置（优先使用本地ffmpeg，每个进程只检查一次）
+from sora2wm.utils import ffmpeg_utils
+ffmpeg_utils.init_ffmpeg()
 
+from sora2wm.configs import (
+    DETECT_FRAME_SIZE,
+    DETECT_STRIDE,
+    ENCODER_FRAMES_PER_WRITE,
+    LAMA_BATCH_SIZE,
+    PATCH_REUSE_TOLERANCE,
+    PIPELINE_QUEUE_SIZE,
+    SEGMENT_MIN_FRAMES,
+    SEGMENT_OVERLAP_FRAMES,
+    SEGMENTS_PER_WORKER,
+    STREAMING_WINDOW_SIZE,
+)
+from sora2wm.utils.encode_utils import (
+    EncoderSink,
+    build_output_options,
+    fragmented_options,
+)
+from sora2wm.utils.patch_utils import PatchReuseCache
+from sora2wm.utils.pipeline_utils import StagePipeline
+from sora2wm.utils.segment_utils import (
+    concat_segments,
+    plan_segments,
+    segment_decode_range,
+)
+from sora2wm.utils.stream_utils import (
+    BBoxBackfillWindow,
+    backfill_bboxes,
+    iter_chunks,
+)
 from sora2wm.utils.video_utils import VideoLoader
 from sora2wm.watermark_remover import WaterMarkRemover
-from sora2wm.watermark_detector import Sora2WaterMarkDetector
+from sora2wm.watermark_detector import (
+    Sora2WaterMarkDetector,
+    StrideWaterMarkDetector,
+)
 
 
 class Sora2WM:
     """Sora2视频水印清除器核心类"""
     
     def __init__(self):
-        """初始化水印检测器和清除器"""
-        # 初始化水印检测器
-        self.detector = Sora2WaterMarkDetector()
-        # 初始化水印清除器
-        self.Remover = WaterMarkRemover()
+        """
+        初始化水印检测器和清除器
+
+        两个模型在独立线程中同时加载（权重读取和torch初始化大多释放GIL），
+        各阶段耗时记录在startup_timings中
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-load") as pool:
+            # 初始化水印检测器
+            detector_future = pool.submit(self._timed, Sora2WaterMarkDetector)
+            # 初始化水印清除器
+            remover_future = pool.submit(self._timed, WaterMarkRemover)
+            self.detector, detector_seconds = detector_future.result()
+            self.Remover, remover_seconds = remover_future.result()
+
+        # 启动各阶段耗时（秒）
+        self.startup_timings = {
+            "ffmpeg": ffmpeg_utils.init_seconds,
+            "detector": detector_seconds,
+            "remover": remover_seconds,
+            "models": time.perf_counter() - start,
+        }
+        logger.info(
+            "启动耗时: "
+            + ", ".join(f"{k} {v:.2f}s" for k, v in self.startup_timings.items())
+        )
+
+    @staticmethod
+    def _timed(factory: Callable):
+        """调用factory并返回 (结果, 耗时秒数)"""
+        start = time.perf_counter()
+        result = factory()
+        return result, time.perf_counter() - start
 
     def run(
         self,
         input_video_path: Path,
         output_video_path: Path,
         progress_callback: Callable[[int], None] | None = None,
+        streaming: bool = False,
+        window_size: int = STREAMING_WINDOW_SIZE,
+        batch_size: int = LAMA_BATCH_SIZE,
+        detect_stride: int = DETECT_STRIDE,
+        pipelined: bool = False,
+        num_workers: int = 1,
+        encoding_profile: str | None = None,
+        patch_reuse_tolerance: float = PATCH_REUSE_TOLERANCE,
+        start_frame: int = 0,
+        end_frame: int | None = None,
+        start_time: float | None = None,
+        end_time: float | None = None,
+        detect_size: int = DETECT_FRAME_SIZE,
+        fragmented: bool = False,
     ):
         """
         运行水印检测和清除流程
@@ -38,9 +117,35 @@ class Sora2WM:
         - input_video_path: 输入视频路径
         - output_video_path: 输出视频路径
         - progress_callback: 进度回调函数，可选
+        - streaming: 是否使用流式模式（边解码边检测边清除，内存占用与视频长度无关）
+        - window_size: 每次解码并批量检测的帧数（流式模式下同时决定峰值内存）
+        - batch_size: 跨帧批量修复时每批的水印裁剪块数量（1表示逐帧推理）
+        - detect_stride: 完整检测的帧间隔，中间帧仅在一致性校验失败时重新检测
+        - pipelined: 是否使用多线程流水线（解码、检测、修复、编码并行执行，优先于streaming）
+        - num_workers: 工作进程数，大于1时按GOP分段并在进程池中并行处理（优先于其他模式）
+        - encoding_profile: 编码方案名称（draft/balanced/archival），为None时使用默认方案
+        - patch_reuse_tolerance: 修复块复用的签名容差，大于0时水印周围画面几乎不变的帧
+          直接复用最近的修复结果而不重新推理
+        - start_frame: 处理范围的起始帧（包含），只解码、处理并输出该范围内的帧和对应的音频
+        - end_frame: 处理范围的结束帧（不包含），默认到视频末尾
+        - start_time: 处理范围的起始时间（秒），指定时覆盖start_frame
+        - end_time: 处理范围的结束时间（秒），指定时覆盖end_frame
+        - detect_size: 低分辨率检测帧的最长边，大于0时在同一次解码中输出缩小的帧用于检测，
+          边界框映射回原始分辨率后再清除水印
+        - fragmented: 是否输出分片MP4，处理过程中已写出的分片即可边下载边播放
+          （分段并行模式下输出由片段拼接而成，不支持分片）
         """
-        # 初始化视频加载器
-        input_video_loader = VideoLoader(input_video_path)
+        # 初始化视频加载器（流式和流水线模式下帧只在窗口内短暂停留，复用预分配的帧缓冲区）
+        use_frame_pool = (streaming or pipelined) and num_workers <= 1
+        input_video_loader = VideoLoader(
+            input_video_path,
+            start_frame,
+            end_frame,
+            pool_size=self._frame_pool_size(window_size) if use_frame_pool else 0,
+            start_time=start_time,
+            end_time=end_time,
+            detect_size=detect_size,
+        )
         # 确保输出目录存在
         output_video_path.parent.mkdir(parents=True, exist_ok=True)
         # 获取视频属性
@@ -49,160 +154,689 @@ class Sora2WM:
         fps = input_video_loader.fps
         total_frames = input_video_loader.total_frames
 
-        # 定义临时输出文件路径
-        temp_output_path = output_video_path.parent / f"temp_{output_video_path.name}"
         # 视频输出参数配置
-        output_options = {
-            "pix_fmt": "yuv420p",  # 像素格式
-            "vcodec": "libx264",  # 视频编码器
-            "preset": "slow",     # 编码预设
-        }
+        output_options = self._build_output_options(
+            input_video_loader, encoding_profile
+        )
+        if fragmented and num_workers <= 1:
+            output_options.update(fragmented_options(output_video_path, fps))
 
-        # 根据输入视频比特率设置输出视频质量
-        if input_video_loader.original_bitrate:
-            # 如果有原始比特率，使用略高的比特率以保证质量
-            output_options["video_bitrate"] = str(
-                int(int(input_video_loader.original_bitrate) * 1.2)
+        logger.debug(
+            f"总帧数: {total_frames}, 帧率: {fps}, 宽度: {width}, 高度: {height}"
+        )
+        if input_video_loader.is_partial:
+            logger.info(
+                f"处理范围: 第 {input_video_loader.start_frame} - "
+                f"{input_video_loader.end_frame} 帧 "
+                f"({input_video_loader.start_seconds:.3f}s - "
+                f"{input_video_loader.end_seconds:.3f}s)"
             )
+
+        if num_workers > 1:
+            # 分段并行：各工作进程独立处理片段，最后无损拼接
+            self._run_segment_parallel(
+                input_video_loader,
+                output_video_path,
+                output_options,
+                num_workers,
+                progress_callback,
+                window_size,
+                batch_size,
+                detect_stride,
+                patch_reuse_tolerance,
+                detect_size,
+            )
+        else:
+            # 步长检测器保存跨批次的状态，每个视频新建一个
+            if detect_stride > 1:
+                detector = StrideWaterMarkDetector(self.detector, detect_stride)
+            else:
+                detector = self.detector
+            # 修复块缓存同样按视频新建
+            patch_cache = self._create_patch_cache(patch_reuse_tolerance)
+
+            if pipelined:
+                run_mode = self._run_pipelined
+            elif streaming:
+                run_mode = self._run_streaming
+            else:
+                run_mode = self._run_two_pass
+
+            # 创建FFmpeg编码输出，原始视频作为第二输入直接封装音频轨道；
+            # 出错时终止编码进程，正常结束时等待编码完成并检查退出码
+            with EncoderSink(
+                output_video_path,
+                width,
+                height,
+                fps,
+                output_options,
+                audio_source=input_video_path,
+                audio_codec=input_video_loader.audio_codec,
+                audio_options=input_video_loader.range_input_options(),
+            ) as encoder:
+                run_mode(
+                    input_video_loader,
+                    encoder,
+                    detector,
+                    progress_callback,
+                    window_size,
+                    batch_size,
+                    patch_cache,
+                )
+
+            if detect_stride > 1:
+                logger.debug(
+                    f"步长检测: 完整检测 {detector.full_detections} 帧, "
+                    f"复用检测结果 {detector.reused} 帧"
+                )
+            if patch_cache is not None:
+                logger.info(patch_cache.summary())
+            if input_video_loader.frame_pool is not None:
+                logger.debug(
+                    f"帧缓冲池: 共分配 {input_video_loader.frame_pool.allocated} 个缓冲区"
+                )
+
+        logger.info(f"已保存带音频的无水印视频到: {output_video_path}")
+
+        # 更新进度（99%）
+        if progress_callback:
+            progress_callback(99)
+
+    @staticmethod
+    def _build_output_options(
+        input_video_loader: VideoLoader, encoding_profile: str | None = None
+    ) -> dict:
+        """
+        根据输入视频和编码方案生成编码参数
+
+        参数:
+        - input_video_loader: 输入视频加载器
+        - encoding_profile: 编码方案名称（见configs.ENCODING_PROFILES），为None时使用默认方案
+
+        返回:
+        - 传给ffmpeg输出的参数字典
+        """
+        return build_output_options(
+            encoding_profile, input_video_loader.original_bitrate
+        )
+
+    @staticmethod
+    def _frame_pool_size(window_size: int = STREAMING_WINDOW_SIZE) -> int:
+        """
+        流式处理时预分配的帧缓冲区数量
+
+        一个检测窗口加上补全窗口前瞻的一帧和编码输出中等待批量写出的帧，
+        流水线模式下队列中的窗口会让缓冲池按需扩容
+
+        参数:
+        - window_size: 每次解码并检测的帧数
+
+        返回:
+        - 预分配的帧缓冲区数量
+        """
+        return max(1, window_size) + 1 + ENCODER_FRAMES_PER_WRITE
+
+    @staticmethod
+    def _create_patch_cache(
+        patch_reuse_tolerance: float = PATCH_REUSE_TOLERANCE,
+    ) -> PatchReuseCache | None:
+        """
+        创建修复块复用缓存
+
+        参数:
+        - patch_reuse_tolerance: 签名容差，不大于0时不复用
+
+        返回:
+        - 修复块复用缓存，不复用时返回None
+        """
+        if patch_reuse_tolerance <= 0:
+            return None
+        return PatchReuseCache(tolerance=patch_reuse_tolerance)
+
+    def process_segment(
+        self,
+        input_video_path: Path,
+        segment_output_path: Path,
+        start_frame: int,
+        end_frame: int,
+        output_options: dict,
+        overlap: int = SEGMENT_OVERLAP_FRAMES,
+        window_size: int = STREAMING_WINDOW_SIZE,
+        batch_size: int = LAMA_BATCH_SIZE,
+        detect_stride: int = DETECT_STRIDE,
+        patch_reuse_tolerance: float = PATCH_REUSE_TOLERANCE,
+        detect_size: int = DETECT_FRAME_SIZE,
+    ):
+        """
+        处理视频的一个片段并编码为无音频的视频文件
+
+        片段前多解码overlap帧、后多解码1帧用于检测，使漏检帧补全可以跨越片段边界；
+        只有 [start_frame, end_frame) 范围内的帧会被清除水印并编码
+
+        参数:
+        - input_video_path: 输入视频路径
+        - segment_output_path: 片段输出路径
+        - start_frame: 片段起始帧（包含）
+        - end_frame: 片段结束帧（不包含）
+        - output_options: 编码参数（所有片段必须一致才能无损拼接）
+        - overlap: 片段前额外检测的帧数
+        - window_size: 每次解码并检测的帧数
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - detect_stride: 完整检测的帧间隔
+        - patch_reuse_tolerance: 修复块复用的签名容差，不大于0时不复用
+        - detect_size: 低分辨率检测帧的最长边，0表示直接在原始帧上检测
+        """
+        decode_start, decode_end = segment_decode_range(start_frame, end_frame, overlap)
+        input_video_loader = VideoLoader(
+            input_video_path,
+            decode_start,
+            decode_end,
+            pool_size=self._frame_pool_size(window_size),
+            detect_size=detect_size,
+        )
+        if detect_stride > 1:
+            detector = StrideWaterMarkDetector(self.detector, detect_stride)
         else:
-            # 否则使用CRF参数控制质量
-            output_options["crf"] = "18"
-
-        # 创建FFmpeg输出进程
-        process_out = (
-            ffmpeg.input(
-                "pipe:",
-                format="rawvideo",  # 原始视频格式
-                pix_fmt="bgr24",    # 像素格式
-                s=f"{width}x{height}",  # 视频尺寸
-                r=fps,               # 帧率
+            detector = self.detector
+        patch_cache = self._create_patch_cache(patch_reuse_tolerance)
+
+        with EncoderSink(
+            segment_output_path,
+            input_video_loader.width,
+            input_video_loader.height,
+            input_video_loader.fps,
+            output_options,
+        ) as encoder:
+            self._run_streaming(
+                input_video_loader,
+                encoder,
+                detector,
+                window_size=window_size,
+                batch_size=batch_size,
+                patch_cache=patch_cache,
+                output_range=(start_frame, end_frame),
             )
-            .output(str(temp_output_path), **output_options)  # 输出配置
-            .overwrite_output()       # 覆盖现有文件
-            .global_args("-loglevel", "error")  # 最小化日志输出
-            .run_async(pipe_stdin=True)  # 异步运行并启用管道输入
+        if patch_cache is not None:
+            logger.info(f"片段 [{start_frame}, {end_frame}) {patch_cache.summary()}")
+
+    def _run_segment_parallel(
+        self,
+        input_video_loader: VideoLoader,
+        output_video_path: Path,
+        output_options: dict,
+        num_workers: int,
+        progress_callback: Callable[[int], None] | None = None,
+        window_size: int = STREAMING_WINDOW_SIZE,
+        batch_size: int = LAMA_BATCH_SIZE,
+        detect_stride: int = DETECT_STRIDE,
+        patch_reuse_tolerance: float = PATCH_REUSE_TOLERANCE,
+        detect_size: int = DETECT_FRAME_SIZE,
+    ):
+        """
+        按GOP切分视频，在进程池中并行处理各片段，再用concat demuxer无损拼接
+
+        每个工作进程拥有独立的检测器和清除器
+
+        参数:
+        - input_video_loader: 输入视频加载器
+        - output_video_path: 拼接并封装音频后的输出路径
+        - output_options: 编码参数
+        - num_workers: 工作进程数
+        - progress_callback: 进度回调函数，可选
+        - window_size: 每次解码并检测的帧数
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - detect_stride: 完整检测的帧间隔
+        - patch_reuse_tolerance: 修复块复用的签名容差，不大于0时不复用
+        - detect_size: 低分辨率检测帧的最长边，0表示直接在原始帧上检测
+        """
+        first_frame = input_video_loader.start_frame
+        last_frame = input_video_loader.end_frame
+        total_frames = max(1, len(input_video_loader))
+        # 只在处理范围内规划片段（关键帧索引换算为相对范围起点）
+        keyframes = [
+            idx - first_frame
+            for idx in input_video_loader.get_keyframe_indices()
+            if first_frame <= idx < last_frame
+        ]
+        segments = [
+            (start + first_frame, end + first_frame)
+            for start, end in plan_segments(
+                keyframes,
+                len(input_video_loader),
+                num_workers * SEGMENTS_PER_WORKER,
+                SEGMENT_MIN_FRAMES,
+            )
+        ]
+        logger.info(
+            f"关键帧数: {len(keyframes)}, 切分为 {len(segments)} 个片段, "
+            f"工作进程数: {num_workers}"
         )
 
+        segments_dir = output_video_path.parent / f"temp_{output_video_path.stem}_segments"
+        segments_dir.mkdir(parents=True, exist_ok=True)
+        segment_paths = [
+            segments_dir / f"segment_{i:05d}{output_video_path.suffix}"
+            for i in range(len(segments))
+        ]
+        # 每个工作进程分到的推理线程数
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_segment_worker,
+                initargs=(num_threads,),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _process_segment_task,
+                        dict(
+                            input_video_path=input_video_loader.video_path,
+                            segment_output_path=segment_path,
+                            start_frame=start_frame,
+                            end_frame=end_frame,
+                            output_options=output_options,
+                            window_size=window_size,
+                            batch_size=batch_size,
+                            detect_stride=detect_stride,
+                            patch_reuse_tolerance=patch_reuse_tolerance,
+                            detect_size=detect_size,
+                        ),
+                    )
+                    for (start_frame, end_frame), segment_path in zip(
+                        segments, segment_paths
+                    )
+                ]
+                done_frames = 0
+                with tqdm(total=total_frames, desc="分段并行移除水印") as pbar:
+                    for future in as_completed(futures):
+                        segment_frames = future.result()
+                        done_frames += segment_frames
+                        pbar.update(segment_frames)
+
+                        # 更新进度（10% - 90%）
+                        if progress_callback:
+                            progress = 10 + int((done_frames / total_frames) * 80)
+                            progress_callback(progress)
+
+            # 拼接片段的同时封装原始音频轨道
+            concat_segments(
+                segment_paths,
+                output_video_path,
+                audio_source=input_video_loader.video_path,
+                audio_codec=input_video_loader.audio_codec,
+                audio_options=input_video_loader.range_input_options(),
+            )
+        finally:
+            shutil.rmtree(segments_dir, ignore_errors=True)
+
+    def _run_two_pass(
+        self,
+        input_video_loader: VideoLoader,
+        encoder: EncoderSink,
+        detector: Sora2WaterMarkDetector | StrideWaterMarkDetector,
+        progress_callback: Callable[[int], None] | None = None,
+        window_size: int = STREAMING_WINDOW_SIZE,
+        batch_size: int = LAMA_BATCH_SIZE,
+        patch_cache: PatchReuseCache | None = None,
+    ):
+        """
+        两阶段处理：先检测全部帧，再逐帧清除水印
+
+        参数:
+        - input_video_loader: 输入视频加载器
+        - encoder: FFmpeg编码输出
+        - detector: 提供detect_batch的水印检测器
+        - progress_callback: 进度回调函数，可选
+        - window_size: 每次批量检测的帧数
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - patch_cache: 修复块复用缓存，可选
+        """
+        # 帧索引相对加载器的读取范围起点
+        total_frames = len(input_video_loader)
+
         # 存储帧和检测到的水印位置
         frame_and_mask = {}
         # 存储未检测到水印的帧索引
         detect_missed = []
 
-        logger.debug(
-            f"总帧数: {total_frames}, 帧率: {fps}, 宽度: {width}, 高度: {height}"
+        # 第一阶段：检测水印（每window_size帧合并为一次模型调用）
+        frames = enumerate(
+            tqdm(
+                input_video_loader.iter_with_detect_frames(),
+                total=total_frames,
+                desc="检测水印",
+            )
         )
-        
-        # 第一阶段：检测水印
-        for idx, frame in enumerate(
-            tqdm(input_video_loader, total=total_frames, desc="检测水印")
-        ):
-            # 检测当前帧中的水印
-            detection_result = self.detector.detect(frame)
-            if detection_result["detected"]:
-                # 记录检测到水印的帧和边界框
-                frame_and_mask[idx] = {"frame": frame, "bbox": detection_result["bbox"]}
-            else:
-                # 记录未检测到水印的帧
-                frame_and_mask[idx] = {"frame": frame, "bbox": None}
-                detect_missed.append(idx)
+        for chunk in iter_chunks(frames, max(1, window_size)):
+            detection_results = self._detect_frames(
+                detector, input_video_loader, chunk
+            )
+            for (idx, (frame, _)), detection_result in zip(chunk, detection_results):
+                if detection_result["detected"]:
+                    # 记录检测到水印的帧和边界框
+                    frame_and_mask[idx] = {
+                        "frame": frame,
+                        "bbox": detection_result["bbox"],
+                    }
+                else:
+                    # 记录未检测到水印的帧
+                    frame_and_mask[idx] = {"frame": frame, "bbox": None}
+                    detect_missed.append(idx)
 
-            # 更新进度（10% - 50%）
-            if progress_callback and idx % 10 == 0:
-                progress = 10 + int((idx / total_frames) * 40)
-                progress_callback(progress)
+                # 更新进度（10% - 50%）
+                if progress_callback and idx % 10 == 0:
+                    progress = 10 + int((idx / total_frames) * 40)
+                    progress_callback(progress)
 
         logger.debug(f"未检测到水印的帧: {detect_missed}")
 
         # 处理未检测到水印的帧，使用前后帧的水印位置进行插值
+        filled_bboxes = backfill_bboxes(
+            [frame_and_mask[idx]["bbox"] for idx in range(len(frame_and_mask))]
+        )
         for missed_idx in detect_missed:
-            before = max(missed_idx - 1, 0)  # 前一帧索引
-            after = min(missed_idx + 1, total_frames - 1)  # 后一帧索引
-            before_box = frame_and_mask[before]["bbox"]
-            after_box = frame_and_mask[after]["bbox"]
-            # 优先使用前一帧的水印位置
-            if before_box:
-                frame_and_mask[missed_idx]["bbox"] = before_box
-            # 如果前一帧没有，使用后一帧
-            elif after_box:
-                frame_and_mask[missed_idx]["bbox"] = after_box
-
-        # 第二阶段：移除水印
-        for idx in tqdm(range(total_frames), desc="移除水印"):
-            frame_info = frame_and_mask[idx]
-            frame = frame_info["frame"]
-            bbox = frame_info["bbox"]
-            
-            if bbox is not None:
-                # 提取水印边界框坐标
-                x1, y1, x2, y2 = bbox
-                # 创建水印掩码
-                mask = np.zeros((height, width), dtype=np.uint8)
-                mask[y1:y2, x1:x2] = 255  # 水印区域设为白色
-                # 清除水印
-                cleaned_frame = self.Remover.clean(frame, mask)
-            else:
-                # 如果没有检测到水印，使用原始帧
-                cleaned_frame = frame
-            
-            # 将处理后的帧写入FFmpeg输入
-            process_out.stdin.write(cleaned_frame.tobytes())
-
-            # 更新进度（50% - 95%）
-            if progress_callback and idx % 10 == 0:
-                progress = 50 + int((idx / total_frames) * 45)
-                progress_callback(progress)
-
-        # 关闭FFmpeg输入流并等待处理完成
-        process_out.stdin.close()
-        process_out.wait()
-
-        # 更新进度（95%）
-        if progress_callback:
-            progress_callback(95)
+            frame_and_mask[missed_idx]["bbox"] = filled_bboxes[missed_idx]
 
-        # 合并音频轨道
-        self.merge_audio_track(input_video_path, temp_output_path, output_video_path)
+        # 第二阶段：移除水印（每batch_size帧合并为一个批次推理）
+        with tqdm(total=total_frames, desc="移除水印") as pbar:
+            for indices in iter_chunks(range(total_frames), max(1, batch_size)):
+                frames = [frame_and_mask[idx]["frame"] for idx in indices]
+                bboxes = [frame_and_mask[idx]["bbox"] for idx in indices]
+                # 清除水印（没有检测到水印时使用原始帧）
+                cleaned_frames = self._clean_frames(
+                    frames, bboxes, batch_size, patch_cache
+                )
 
-        # 更新进度（99%）
-        if progress_callback:
-            progress_callback(99)
+                for idx, frame, cleaned_frame in zip(
+                    indices, frames, cleaned_frames
+                ):
+                    # 将处理后的帧写入FFmpeg输入，写出后归还帧缓冲区
+                    encoder.write(
+                        cleaned_frame, partial(input_video_loader.release, frame)
+                    )
+                    # 释放已写入的帧
+                    frame_and_mask[idx]["frame"] = None
+                    pbar.update(1)
 
-    def merge_audio_track(
+                    # 更新进度（50% - 95%）
+                    if progress_callback and idx % 10 == 0:
+                        progress = 50 + int((idx / total_frames) * 45)
+                        progress_callback(progress)
+
+    def _run_streaming(
         self,
-        input_video_path: Path,
-        temp_output_path: Path,
-        output_video_path: Path
+        input_video_loader: VideoLoader,
+        encoder: EncoderSink,
+        detector: Sora2WaterMarkDetector | StrideWaterMarkDetector,
+        progress_callback: Callable[[int], None] | None = None,
+        window_size: int = STREAMING_WINDOW_SIZE,
+        batch_size: int = LAMA_BATCH_SIZE,
+        patch_cache: PatchReuseCache | None = None,
+        output_range: tuple | None = None,
     ):
         """
-        合并原始音频轨道到处理后的视频
-        
+        流式处理：在滑动前瞻窗口内完成解码、检测、漏检补全和水印清除
+
+        峰值内存只取决于窗口大小，漏检帧的补全结果与两阶段处理一致
+
         参数:
-        - input_video_path: 原始视频路径
-        - temp_output_path: 无音频的处理后视频路径
-        - output_video_path: 最终输出视频路径
-        """
-        logger.info("合并音频轨道中...")
-        # 加载处理后的视频流
-        video_stream = ffmpeg.input(str(temp_output_path))
-        # 加载原始视频的音频流
-        audio_stream = ffmpeg.input(str(input_video_path)).audio
-
-        # 合并视频和音频
-        (
-            ffmpeg.output(
-                video_stream,
-                audio_stream,
-                str(output_video_path),
-                vcodec="copy",  # 直接复制视频流，不重新编码
-                acodec="aac",  # 音频编码为AAC
+        - input_video_loader: 输入视频加载器
+        - encoder: FFmpeg编码输出
+        - detector: 提供detect_batch的水印检测器
+        - progress_callback: 进度回调函数，可选
+        - window_size: 每次解码并检测的帧数
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - patch_cache: 修复块复用缓存，可选
+        - output_range: 需要清除并编码的帧范围 (起始帧, 结束帧)，
+          范围外的帧只参与检测和补全，默认为加载器的整个读取范围
+        """
+        if output_range is None:
+            output_range = (input_video_loader.start_frame, input_video_loader.end_frame)
+        out_start, out_end = output_range
+        total_frames = max(1, out_end - out_start)
+        backfill_window = BBoxBackfillWindow()
+        detect_missed = []
+
+        def remove_and_write(ready):
+            """批量清除已确定边界框的帧并写入FFmpeg输入"""
+            # 范围外的帧只参与检测和补全，直接归还缓冲区
+            for idx, frame, _ in ready:
+                if not out_start <= idx < out_end:
+                    input_video_loader.release(frame)
+            ready = [it for it in ready if out_start <= it[0] < out_end]
+            if not ready:
+                return
+            indices, frames, bboxes = zip(*ready)
+            cleaned_frames = self._clean_frames(
+                frames, bboxes, batch_size, patch_cache
             )
-            .overwrite_output()  # 覆盖现有文件
-            .run(quiet=True)     # 静默运行
+            for idx, frame, cleaned_frame in zip(indices, frames, cleaned_frames):
+                # 写出后归还帧缓冲区
+                encoder.write(cleaned_frame, partial(input_video_loader.release, frame))
+                pbar.update(1)
+
+                # 更新进度（10% - 95%）
+                if progress_callback and idx % 10 == 0:
+                    progress = 10 + int(((idx - out_start) / total_frames) * 85)
+                    progress_callback(progress)
+
+        frames = enumerate(
+            input_video_loader.iter_with_detect_frames(),
+            start=input_video_loader.start_frame,
         )
-        
-        # 清理临时文件
-        temp_output_path.unlink()
-        logger.info(f"已保存带音频的无水印视频到: {output_video_path}")
+        with tqdm(total=total_frames, desc="流式移除水印") as pbar:
+            for chunk in iter_chunks(frames, max(1, window_size)):
+                ready = []
+                # 整个窗口的帧合并为一次模型调用
+                detection_results = self._detect_frames(
+                    detector, input_video_loader, chunk
+                )
+                for (idx, (frame, _)), detection_result in zip(
+                    chunk, detection_results
+                ):
+                    if not detection_result["detected"]:
+                        detect_missed.append(idx)
+                    ready.extend(
+                        backfill_window.push(idx, frame, detection_result["bbox"])
+                    )
+                remove_and_write(ready)
+            remove_and_write(backfill_window.flush())
+
+        logger.debug(f"未检测到水印的帧: {detect_missed}")
+
+    def _run_pipelined(
+        self,
+        input_video_loader: VideoLoader,
+        encoder: EncoderSink,
+        detector: Sora2WaterMarkDetector | StrideWaterMarkDetector,
+        progress_callback: Callable[[int], None] | None = None,
+        window_size: int = STREAMING_WINDOW_SIZE,
+        batch_size: int = LAMA_BATCH_SIZE,
+        patch_cache: PatchReuseCache | None = None,
+    ) -> list:
+        """
+        多线程流水线处理：解码 → 检测 → 修复 → 编码
+
+        各阶段运行在独立线程中，通过有界队列传递窗口，
+        内存占用由窗口大小和队列容量决定，漏检帧的补全结果与两阶段处理一致
+
+        参数:
+        - input_video_loader: 输入视频加载器
+        - encoder: FFmpeg编码输出
+        - detector: 提供detect_batch的水印检测器
+        - progress_callback: 进度回调函数，可选
+        - window_size: 每次解码并检测的帧数
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - patch_cache: 修复块复用缓存，可选
+
+        返回:
+        - 各阶段的统计信息列表
+        """
+        first_index = input_video_loader.start_frame
+        total_frames = max(1, len(input_video_loader))
+        backfill_window = BBoxBackfillWindow()
+        detect_missed = []
+
+        def detect(chunk):
+            """批量检测一个窗口并输出已确定边界框的帧"""
+            detection_results = self._detect_frames(
+                detector, input_video_loader, chunk
+            )
+            ready = []
+            for (idx, (frame, _)), detection_result in zip(chunk, detection_results):
+                if not detection_result["detected"]:
+                    detect_missed.append(idx)
+                ready.extend(backfill_window.push(idx, frame, detection_result["bbox"]))
+            return [ready] if ready else []
+
+        def flush_detect():
+            """输出补全窗口中剩余的帧"""
+            ready = backfill_window.flush()
+            return [ready] if ready else []
+
+        def inpaint(ready):
+            """批量清除水印"""
+            indices, frames, bboxes = zip(*ready)
+            cleaned_frames = self._clean_frames(
+                frames, bboxes, batch_size, patch_cache
+            )
+            return [list(zip(indices, frames, cleaned_frames))]
+
+        def encode(cleaned):
+            """将处理后的帧写入FFmpeg输入"""
+            for idx, frame, cleaned_frame in cleaned:
+                # 写出后归还帧缓冲区
+                encoder.write(cleaned_frame, partial(input_video_loader.release, frame))
+                pbar.update(1)
+
+                # 更新进度（10% - 95%）
+                if progress_callback and idx % 10 == 0:
+                    progress = 10 + int(((idx - first_index) / total_frames) * 85)
+                    progress_callback(progress)
+            return []
+
+        pipeline = (
+            StagePipeline(queue_size=PIPELINE_QUEUE_SIZE)
+            .add_stage("detect", detect, flush=flush_detect)
+            .add_stage("inpaint", inpaint)
+            .add_stage("encode", encode)
+        )
+        frames = iter_chunks(
+            enumerate(input_video_loader.iter_with_detect_frames(), start=first_index),
+            max(1, window_size),
+        )
+        with tqdm(total=total_frames, desc="流水线移除水印") as pbar:
+            stats = pipeline.run(frames, source_name="decode")
+
+        logger.debug(f"未检测到水印的帧: {detect_missed}")
+        for stage_stats in stats:
+            logger.info(stage_stats.summary())
+        return stats
+
+    @staticmethod
+    def _detect_frames(
+        detector: Sora2WaterMarkDetector | StrideWaterMarkDetector,
+        input_video_loader: VideoLoader,
+        chunk: list,
+    ) -> list:
+        """
+        在检测帧上批量检测水印，并把边界框映射回原始分辨率
+
+        参数:
+        - detector: 提供detect_batch的水印检测器
+        - input_video_loader: 产生这些帧的视频加载器
+        - chunk: [(帧索引, (原始帧, 检测帧)), ...]
+
+        返回:
+        - 与输入一一对应的检测结果字典列表，边界框为原始分辨率坐标
+        """
+        detection_results = detector.detect_batch(
+            [detect_frame for _, (_, detect_frame) in chunk]
+        )
+        if not input_video_loader.has_detect_stream:
+            return detection_results
+
+        mapped = []
+        for detection_result in detection_results:
+            if detection_result["detected"]:
+                # 新建字典，避免修改检测器内部保存的结果
+                bbox = input_video_loader.to_full_res_bbox(detection_result["bbox"])
+                detection_result = {
+                    **detection_result,
+                    "bbox": bbox,
+                    "center": ((bbox[0] + bbox[2]) // 2, (bbox[1] + bbox[3]) // 2),
+                }
+            mapped.append(detection_result)
+        return mapped
+
+    def _clean_frames(
+        self,
+        frames,
+        bboxes,
+        batch_size: int = LAMA_BATCH_SIZE,
+        patch_cache: PatchReuseCache | None = None,
+    ) -> list:
+        """
+        批量清除多帧中指定边界框内的水印
+
+        参数:
+        - frames: 输入帧列表（BGR格式）
+        - bboxes: 对应的水印边界框列表，为None的帧直接返回原始帧
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - patch_cache: 修复块复用缓存，可选
+
+        返回:
+        - 清除水印后的帧列表
+        """
+        cleaned_frames = list(frames)
+        todo = [i for i, bbox in enumerate(bboxes) if bbox is not None]
+        if not todo:
+            return cleaned_frames
+        # 仅修复水印区域，可写帧直接原地贴回
+        results = self.Remover.clean_bboxes(
+            [frames[i] for i in todo],
+            [bboxes[i] for i in todo],
+            inplace=all(frames[i].flags.writeable for i in todo),
+            batch_size=batch_size,
+            patch_cache=patch_cache,
+        )
+        for i, result in zip(todo, results):
+            cleaned_frames[i] = result
+        return cleaned_frames
+
+
+# 分段并行工作进程中的Sora2WM实例（每个进程一个）
+_segment_worker_wm: Sora2WM | None = None
+
+
+def _init_segment_worker(num_threads: int):
+    """
+    分段并行工作进程初始化：限制推理线程数并加载模型
+
+    参数:
+    - num_threads: 本进程使用的推理线程数
+    """
+    global _segment_worker_wm
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _segment_worker_wm = Sora2WM()
+
+
+def _process_segment_task(kwargs: dict) -> int:
+    """
+    在工作进程中处理一个片段
+
+    参数:
+    - kwargs: 传给Sora2WM.process_segment的参数
+
+    返回:
+    - 片段包含的帧数
+    """
+    _segment_worker_wm.process_segment(**kwargs)
+    return kwargs["end_frame"] - kwargs["start_frame"]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""
+水印检测后端基准测试
+
+在参考视频上分别使用ultralytics和ONNX检测后端检测水印，统计导入和加载耗时、检测速度，
+以及两个后端检测结果的一致性（检出是否一致、边界框IoU）
+
+用法:
+    python -m sora2wm.detect_benchmark --input resources/dog_vs_sam.mp4
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from sora2wm.configs import LAMA_BATCH_SIZE
+from sora2wm.utils.stream_utils import iter_chunks
+from sora2wm.utils.video_utils import VideoLoader
+
+BACKENDS = ["ultralytics", "onnx"]
+
+
+def bbox_iou(a, b) -> float:
+    """计算两个 (x1, y1, x2, y2) 边界框的IoU"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def benchmark_backend(backend: str, frames: list, batch_size: int) -> dict:
+    """
+    使用一个检测后端检测所有帧并统计结果
+
+    参数:
+    - backend: 检测后端名称
+    - frames: 已解码的帧列表（BGR格式）
+    - batch_size: 每次detect_batch的帧数
+
+    返回:
+    - 统计结果字典（包含逐帧检测结果）
+    """
+    start = time.perf_counter()
+    from sora2wm.watermark_detector import Sora2WaterMarkDetector
+
+    detector = Sora2WaterMarkDetector(backend=backend)
+    load_seconds = time.perf_counter() - start
+
+    # 预热一次，避免首次推理的初始化开销计入检测速度
+    detector.detect(frames[0])
+
+    detections = []
+    start = time.perf_counter()
+    for chunk in iter_chunks(frames, batch_size):
+        detections.extend(detector.detect_batch(chunk))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "fps": len(frames) / elapsed if elapsed > 0 else 0.0,
+        "seconds": elapsed,
+        "detected": sum(d["detected"] for d in detections),
+        "detections": detections,
+    }
+
+
+def compare_detections(reference: list, candidate: list) -> dict:
+    """
+    比较两个后端的逐帧检测结果
+
+    参数:
+    - reference: 基准后端的检测结果列表
+    - candidate: 待比较后端的检测结果列表
+
+    返回:
+    - 一致性统计字典
+    """
+    agree, ious = 0, []
+    for ref, cand in zip(reference, candidate):
+        if ref["detected"] == cand["detected"]:
+            agree += 1
+        if ref["detected"] and cand["detected"]:
+            ious.append(bbox_iou(ref["bbox"], cand["bbox"]))
+    return {
+        "agreement": agree / len(reference) if reference else 0.0,
+        "mean_iou": float(np.mean(ious)) if ious else None,
+        "min_iou": float(np.min(ious)) if ious else None,
+    }
+
+
+def benchmark(
+    input_path: Path, backends: list[str], max_frames: int, batch_size: int
+) -> list[dict]:
+    """
+    在参考视频上对比各检测后端
+
+    参数:
+    - input_path: 参考视频路径
+    - backends: 参与对比的检测后端列表（第一个作为一致性比较的基准）
+    - max_frames: 最多使用的帧数
+    - batch_size: 每次detect_batch的帧数
+
+    返回:
+    - 各检测后端的统计结果列表
+    """
+    loader = VideoLoader(input_path, end_frame=max_frames)
+    # 预先解码到内存，使统计的耗时只包含检测
+    frames = list(loader)
+    if not frames:
+        raise ValueError(f"参考视频没有可用的帧: {input_path}")
+    logger.info(
+        f"参考视频: {input_path}, 帧数: {len(frames)}, "
+        f"尺寸: {loader.width}x{loader.height}"
+    )
+
+    results = []
+    for backend in backends:
+        result = benchmark_backend(backend, frames, batch_size)
+        result["ultralytics_imported"] = "ultralytics" in sys.modules
+        if results:
+            result.update(
+                compare_detections(results[0]["detections"], result["detections"])
+            )
+        results.append(result)
+    return results
+
+
+def print_results(results: list[dict]):
+    """以表格形式打印统计结果"""
+    print(
+        f"{'backend':<12} {'load (s)':>9} {'detect fps':>10} {'detected':>9} "
+        f"{'agreement':>10} {'mean IoU':>9} {'min IoU':>8}"
+    )
+    for r in results:
+        agreement = f"{r['agreement']:.1%}" if "agreement" in r else "-"
+        mean_iou = "-" if r.get("mean_iou") is None else f"{r['mean_iou']:.3f}"
+        min_iou = "-" if r.get("min_iou") is None else f"{r['min_iou']:.3f}"
+        print(
+            f"{r['backend']:<12} {r['load_seconds']:>9.2f} {r['fps']:>10.2f} "
+            f"{r['detected']:>9} {agreement:>10} {mean_iou:>9} {min_iou:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比各水印检测后端的速度和检测结果")
+    parser.add_argument("--input", type=Path, required=True, help="参考视频路径")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=BACKENDS,
+        choices=BACKENDS,
+        help="参与对比的检测后端，第一个作为一致性比较的基准",
+    )
+    parser.add_argument("--max-frames", type=int, default=300, help="最多使用的帧数")
+    parser.add_argument(
+        "--batch-size", type=int, default=LAMA_BATCH_SIZE, help="每次批量检测的帧数"
+    )
+    args = parser.parse_args()
+
+    print_results(
+        benchmark(args.input, args.backends, args.max_frames, args.batch_size)
+    )
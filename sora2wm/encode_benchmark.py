@@ -0,0 +1,145 @@
+"""
+视频编码方案基准测试
+
+在参考视频上依次使用各编码方案编码，统计编码速度、输出大小和相对原视频的PSNR，
+用于根据实测数据选择编码方案
+
+用法:
+    python -m sora2wm.encode_benchmark --input resources/dog_vs_sam.mp4
+"""
+
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import ffmpeg
+from loguru import logger
+
+from sora2wm.configs import ENCODING_PROFILES
+from sora2wm.utils.encode_utils import EncoderSink, build_output_options
+from sora2wm.utils.video_utils import VideoLoader
+
+
+def measure_psnr(encoded_path: Path, reference_path: Path) -> float | None:
+    """
+    计算编码结果相对参考视频的平均PSNR
+
+    参数:
+    - encoded_path: 编码后的视频路径
+    - reference_path: 参考视频路径
+
+    返回:
+    - 平均PSNR（dB），无法解析时返回None
+    """
+    encoded = ffmpeg.input(str(encoded_path)).video
+    reference = ffmpeg.input(str(reference_path)).video
+    _, stderr = (
+        ffmpeg.filter([encoded, reference], "psnr", shortest=1)
+        .output("-", format="null")
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    match = re.search(r"average:(inf|[\d.]+)", stderr.decode(errors="ignore"))
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+def benchmark_profile(
+    frames: list, loader: VideoLoader, profile: str, output_path: Path
+) -> dict:
+    """
+    使用一个编码方案编码已解码的帧并统计结果
+
+    参数:
+    - frames: 已解码的帧列表（BGR格式）
+    - loader: 参考视频加载器（提供尺寸、帧率和比特率）
+    - profile: 编码方案名称
+    - output_path: 编码输出路径
+
+    返回:
+    - 统计结果字典
+    """
+    output_options = build_output_options(profile, loader.original_bitrate)
+
+    start = time.perf_counter()
+    with EncoderSink(
+        output_path, loader.width, loader.height, loader.fps, output_options
+    ) as encoder:
+        for frame in frames:
+            encoder.write(frame)
+    elapsed = time.perf_counter() - start
+
+    size = output_path.stat().st_size
+    return {
+        "profile": profile,
+        "fps": len(frames) / elapsed if elapsed > 0 else 0.0,
+        "seconds": elapsed,
+        "size_mb": size / 1024 / 1024,
+        "bitrate_kbps": size * 8 / 1000 / (len(frames) / loader.fps),
+        "options": output_options,
+    }
+
+
+def benchmark(input_path: Path, profiles: list[str], max_frames: int) -> list[dict]:
+    """
+    在参考视频上对比各编码方案
+
+    参数:
+    - input_path: 参考视频路径
+    - profiles: 参与对比的编码方案名称列表
+    - max_frames: 最多使用的帧数
+
+    返回:
+    - 各编码方案的统计结果列表
+    """
+    loader = VideoLoader(input_path, end_frame=max_frames)
+    # 预先解码到内存，使统计的耗时只包含编码
+    frames = list(loader)
+    if not frames:
+        raise ValueError(f"参考视频没有可用的帧: {input_path}")
+    logger.info(
+        f"参考视频: {input_path}, 帧数: {len(frames)}, "
+        f"尺寸: {loader.width}x{loader.height}, 帧率: {loader.fps}"
+    )
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in profiles:
+            output_path = Path(tmp_dir) / f"{profile}{input_path.suffix or '.mp4'}"
+            result = benchmark_profile(frames, loader, profile, output_path)
+            result["psnr"] = measure_psnr(output_path, input_path)
+            results.append(result)
+            logger.info(f"[{profile}] 编码参数: {result['options']}")
+    return results
+
+
+def print_results(results: list[dict]):
+    """以表格形式打印统计结果"""
+    print(
+        f"{'profile':<10} {'encode fps':>10} {'seconds':>8} "
+        f"{'size (MB)':>10} {'kbps':>8} {'PSNR (dB)':>10}"
+    )
+    for r in results:
+        psnr = "n/a" if r["psnr"] is None else f"{r['psnr']:.2f}"
+        print(
+            f"{r['profile']:<10} {r['fps']:>10.2f} {r['seconds']:>8.2f} "
+            f"{r['size_mb']:>10.2f} {r['bitrate_kbps']:>8.0f} {psnr:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比各视频编码方案的速度和输出大小")
+    parser.add_argument("--input", type=Path, required=True, help="参考视频路径")
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(ENCODING_PROFILES),
+        choices=list(ENCODING_PROFILES),
+        help="参与对比的编码方案",
+    )
+    parser.add_argument("--max-frames", type=int, default=300, help="最多使用的帧数")
+    args = parser.parse_args()
+
+    print_results(benchmark(args.input, args.profiles, args.max_frames))
@@ -5,7 +5,6 @@ import os
 import time
 
 import numpy as np
-import nvidia_smi
 import psutil
 import torch
 
@@ -50,6 +49,8 @@ def run_model(model, size):
 
 
 def benchmark(model, times: int, empty_cache: bool):
+    import nvidia_smi
+
     sizes = [(512, 512)]
 
     nvidia_smi.nvmlInit()
@@ -88,12 +89,62 @@ def benchmark(model, times: int, empty_cache: bool):
     nvidia_smi.nvmlShutdown()
 
 
+def benchmark_batch(model, times: int, batch_sizes, frame_size, box_size):
+    """Report frames/sec of cross-frame batched box inpainting per batch size"""
+    frame_h, frame_w = frame_size
+    box_h, box_w = box_size
+    config = InpaintRequest(hd_strategy=HDStrategy.CROP, hd_strategy_crop_margin=128)
+
+    def format(metrics):
+        return f"{np.mean(metrics):.2f} ± {np.std(metrics):.2f}"
+
+    process = psutil.Process(os.getpid())
+    for batch_size in batch_sizes:
+        # RGB, watermark boxes jitter a few pixels like consecutive video frames
+        rng = np.random.default_rng(0)
+        images = [
+            rng.integers(0, 256, (frame_h, frame_w, 3), dtype=np.uint8)
+            for _ in range(batch_size)
+        ]
+        boxes = []
+        for _ in range(batch_size):
+            x1 = frame_w // 2 + int(rng.integers(-4, 5))
+            y1 = frame_h // 2 + int(rng.integers(-4, 5))
+            boxes.append([x1, y1, x1 + box_w, y1 + box_h])
+
+        # warm up
+        model.inpaint_boxes(images, boxes, config, batch_size=batch_size)
+
+        fps_metrics = []
+        memory_metrics = []
+        for _ in range(times):
+            start = time.time()
+            model.inpaint_boxes(images, boxes, config, batch_size=batch_size)
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            fps_metrics.append(batch_size / (time.time() - start))
+            memory_metrics.append(process.memory_info().rss / 1024 / 1024)
+
+        print(f"batch size: {batch_size}".center(80, "-"))
+        print(f"fps: {format(fps_metrics)} frames/s")
+        print(f"memory: {format(memory_metrics)} MB")
+
+
 def get_args_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("--name")
     parser.add_argument("--device", default="cuda", type=str)
     parser.add_argument("--times", default=10, type=int)
     parser.add_argument("--empty-cache", action="store_true")
+    parser.add_argument(
+        "--batch-sizes",
+        default=None,
+        type=str,
+        help="Comma separated batch sizes, e.g. 1,2,4,8. "
+        "Benchmark cross-frame batched box inpainting instead of full images",
+    )
+    parser.add_argument("--frame-size", default="704x1280", type=str, help="HxW")
+    parser.add_argument("--box-size", default="64x160", type=str, help="HxW")
     return parser.parse_args()
 
 
@@ -106,4 +157,13 @@ if __name__ == "__main__":
         disable_nsfw=True,
         sd_cpu_textencoder=True,
     )
-    benchmark(model, args.times, args.empty_cache)
+    if args.batch_sizes:
+        benchmark_batch(
+            model,
+            args.times,
+            [int(it) for it in args.batch_sizes.split(",")],
+            tuple(int(it) for it in args.frame_size.split("x")),
+            tuple(int(it) for it in args.box_size.split("x")),
+        )
+    else:
+        benchmark(model, args.times, args.empty_cache)
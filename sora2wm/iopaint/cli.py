@@ -53,10 +53,11 @@ def list_model(
         file_okay=False,
         callback=setup_model_dir,
     ),
+    refresh: bool = Option(False, help="Ignore the cached model index and rescan"),
 ):
     from sora2wm.iopaint.download import scan_models
 
-    scanned_models = scan_models()
+    scanned_models = scan_models(refresh=refresh)
     for it in scanned_models:
         print(it.name)
 
@@ -243,3 +244,20 @@ def start_web_config(
     from sora2wm.iopaint.web_config import main
 
     main(config_file)
+
+
+@typer_app.command(help="Export the LaMa TorchScript model to ONNX")
+def export_lama_onnx(
+    output: Path = Option(..., help="Output .onnx file path"),
+    model_path: Optional[Path] = Option(
+        None, help="LaMa TorchScript model, download big-lama.pt if not set"
+    ),
+    opset: int = Option(17, help="ONNX opset version, DFT requires >= 17"),
+):
+    from sora2wm.iopaint.helper import download_model
+    from sora2wm.iopaint.model.lama import LAMA_MODEL_MD5, LAMA_MODEL_URL
+    from sora2wm.iopaint.model.lama_onnx import export_lama_onnx as export
+
+    if model_path is None:
+        model_path = download_model(LAMA_MODEL_URL, LAMA_MODEL_MD5)
+    export(model_path, output, opset=opset)
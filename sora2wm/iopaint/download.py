@@ -185,18 +185,23 @@ def scan_inpaint_models(model_dir: Path) -> List[ModelInfo]:
 
     # logger.info(f"Scanning inpaint models in {model_dir}")
 
-    for name, m in models.items():
-        if m.is_erase_model and m.is_downloaded():
-            res.append(
-                ModelInfo(
-                    name=name,
-                    path=name,
-                    model_type=ModelType.INPAINT,
-                )
-            )
+    for name in models:
+        info = get_erase_model_info(name)
+        if info is not None:
+            res.append(info)
     return res
 
 
+def get_erase_model_info(name: str) -> Optional[ModelInfo]:
+    """ModelInfo of a downloaded builtin erase model, without scanning the
+    model cache. Returns None for other models."""
+    from sora2wm.iopaint.model import is_erase_model, models
+
+    if not is_erase_model(name) or not models[name].is_downloaded():
+        return None
+    return ModelInfo(name=name, path=name, model_type=ModelType.INPAINT)
+
+
 def scan_diffusers_models() -> List[ModelInfo]:
     from huggingface_hub.constants import HF_HUB_CACHE
 
@@ -304,11 +309,134 @@ def scan_converted_diffusers_models(cache_dir) -> List[ModelInfo]:
     return available_models
 
 
-def scan_models() -> List[ModelInfo]:
-    model_dir = os.getenv("XDG_CACHE_HOME", DEFAULT_MODEL_DIR)
+MODEL_INDEX_FILE = "iopaint_model_index.json"
+MODEL_INDEX_VERSION = 1
+
+
+def _stat_key(path) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _watched_paths(model_dir, hf_cache_dir, models: List[ModelInfo]) -> List[str]:
+    """Paths whose mtime/size change whenever the scan result may change.
+
+    Adding or removing a model always touches one of these directories, so
+    checking them is enough to validate the index without walking the trees:
+    the scanned roots, their first level directories (converted diffusers
+    models), every HF snapshot directory and the model files found last time.
+    """
+    paths = []
+    roots = [
+        Path(model_dir) / "stable_diffusion",
+        Path(model_dir) / "stable_diffusion_xl",
+    ]
+    for root in roots:
+        paths.append(str(root))
+        if root.is_dir():
+            paths.extend(str(it) for it in root.iterdir() if it.is_dir())
+
+    hf_cache_dir = Path(hf_cache_dir)
+    paths.append(str(hf_cache_dir))
+    if hf_cache_dir.is_dir():
+        for repo in hf_cache_dir.glob("models--*"):
+            snapshots = repo / "snapshots"
+            paths.append(str(snapshots))
+            if snapshots.is_dir():
+                paths.extend(str(it) for it in snapshots.iterdir())
+
+    for it in models:
+        if it.is_single_file_diffusers:
+            paths.append(it.path)
+        elif os.path.isabs(it.path):
+            paths.append(os.path.join(it.path, "model_index.json"))
+    return paths
+
+
+def _index_path(model_dir) -> Path:
+    return Path(model_dir) / MODEL_INDEX_FILE
+
+
+def _load_model_index(model_dir, hf_cache_dir) -> Optional[List[ModelInfo]]:
+    index_path = _index_path(model_dir)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if (
+            index["version"] != MODEL_INDEX_VERSION
+            or index["hf_cache_dir"] != str(hf_cache_dir)
+        ):
+            return None
+        for path, key in index["fingerprint"].items():
+            if _stat_key(path) != key:
+                return None
+        return [ModelInfo(**it) for it in index["models"]]
+    except Exception:
+        return None
+
+
+def _save_model_index(model_dir, hf_cache_dir, models: List[ModelInfo]):
+    index_path = _index_path(model_dir)
+    index = {
+        "version": MODEL_INDEX_VERSION,
+        "hf_cache_dir": str(hf_cache_dir),
+        "fingerprint": {
+            path: _stat_key(path)
+            for path in _watched_paths(model_dir, hf_cache_dir, models)
+        },
+        "models": [
+            {
+                "name": it.name,
+                "path": it.path,
+                "model_type": it.model_type,
+                "is_single_file_diffusers": it.is_single_file_diffusers,
+            }
+            for it in models
+        ],
+    }
+    tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as fw:
+            json.dump(index, fw, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.warning(f"Failed to save model index {index_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+
+def _scan_diffusion_models(model_dir) -> List[ModelInfo]:
     available_models = []
-    available_models.extend(scan_inpaint_models(model_dir))
     available_models.extend(scan_single_file_diffusion_models(model_dir))
     available_models.extend(scan_diffusers_models())
     available_models.extend(scan_converted_diffusers_models(model_dir))
     return available_models
+
+
+def scan_models(refresh: bool = False) -> List[ModelInfo]:
+    """Scan downloaded models.
+
+    Diffusion models are read from a persisted index in the model dir, which is
+    rebuilt when any watched directory mtime or model file size changes, or
+    when refresh is True. Builtin erase models are always checked directly.
+    """
+    from huggingface_hub.constants import HF_HUB_CACHE
+
+    model_dir = os.getenv("XDG_CACHE_HOME", DEFAULT_MODEL_DIR)
+    diffusion_models = None if refresh else _load_model_index(model_dir, HF_HUB_CACHE)
+    if diffusion_models is None:
+        diffusion_models = _scan_diffusion_models(model_dir)
+        _save_model_index(model_dir, HF_HUB_CACHE, diffusion_models)
+
+    available_models = []
+    available_models.extend(scan_inpaint_models(model_dir))
+    available_models.extend(diffusion_models)
+    return available_models
+
+
+def refresh_model_index() -> List[ModelInfo]:
+    """Rescan all model caches and rewrite the persisted index."""
+    return scan_models(refresh=True)
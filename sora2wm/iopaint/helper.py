@@ -116,6 +116,102 @@ def load_jit_model(url_or_path, device, model_md5: str):
     return model
 
 
+def _model_file_key(model_path) -> str:
+    # path + size + mtime identify the weights without reading the whole file
+    stat = os.stat(model_path)
+    key = f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _optimized_cache_path(cache_dir, model_path, device, suffix) -> str:
+    # the optimized graph is only valid for the same weights, torch build and device
+    torch_version = torch.__version__.replace("+", "_")
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    device_type = torch.device(device).type
+    return os.path.join(
+        cache_dir,
+        f"{name}-{_model_file_key(model_path)}-torch{torch_version}-{device_type}-{suffix}.pt",
+    )
+
+
+def _save_jit_atomic(model, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        torch.jit.save(model, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def warmup_jit_model(model, device, shapes: List[Tuple[int, ...]], iters: int = 2):
+    """Run the model on dummy inputs so the profiling executor specializes
+    and optimizes the graph before the first real call.
+
+    shapes: list of (batch, height, width) of the image/mask inputs
+    """
+    with torch.no_grad():
+        for batch, height, width in shapes:
+            image = torch.zeros(batch, 3, height, width, device=device)
+            mask = torch.zeros(batch, 1, height, width, device=device)
+            for _ in range(iters):
+                model(image, mask)
+
+
+def load_optimized_jit_model(
+    url_or_path,
+    device,
+    model_md5: str,
+    cache_dir: str,
+    warmup_shapes: Optional[List[Tuple[int, ...]]] = None,
+):
+    """Load a TorchScript model frozen and optimized for inference on device.
+
+    The optimized artifact is cached in cache_dir, keyed by the model file's
+    path, size and mtime, the torch version and the device type, so later
+    process starts only pay for torch.jit.load and the warm-up. Falls back to the plain model if
+    freezing fails.
+    """
+    if os.path.exists(url_or_path):
+        model_path = url_or_path
+    else:
+        model_path = download_model(url_or_path, model_md5)
+    device = torch.device(device)
+    os.makedirs(cache_dir, exist_ok=True)
+    optimized_path = _optimized_cache_path(cache_dir, model_path, device, "optimized")
+    frozen_path = _optimized_cache_path(cache_dir, model_path, device, "frozen")
+
+    model = None
+    if os.path.exists(optimized_path):
+        logger.info(f"Loading optimized model from: {optimized_path}")
+        model = torch.jit.load(optimized_path, map_location=device)
+    elif os.path.exists(frozen_path):
+        logger.info(f"Loading frozen model from: {frozen_path}")
+        model = torch.jit.optimize_for_inference(
+            torch.jit.load(frozen_path, map_location=device)
+        )
+    else:
+        model = load_jit_model(model_path, device, model_md5)
+        try:
+            frozen = torch.jit.freeze(model)
+        except Exception as e:
+            logger.warning(f"Failed to freeze {model_path}, use unoptimized model: {e}")
+        else:
+            model = torch.jit.optimize_for_inference(frozen)
+            try:
+                _save_jit_atomic(model, optimized_path)
+            except Exception as e:
+                # graphs optimized for CPU may hold MKLDNN tensors that can't be
+                # serialized, cache the frozen graph and re-run the cheap pass on load
+                logger.info(f"Cache frozen model instead of optimized one: {e}")
+                _save_jit_atomic(frozen, frozen_path)
+
+    model.eval()
+    if warmup_shapes:
+        warmup_jit_model(model, device, warmup_shapes)
+    return model
+
+
 def load_model(model: torch.nn.Module, url_or_path, device, model_md5):
     if os.path.exists(url_or_path):
         model_path = url_or_path
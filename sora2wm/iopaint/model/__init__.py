@@ -1,38 +1,87 @@
-from .anytext.anytext_model import AnyText
-from .controlnet import ControlNet
-from .fcf import FcF
-from .instruct_pix2pix import InstructPix2Pix
-from .kandinsky import Kandinsky22
-from .lama import AnimeLaMa, LaMa
-from .ldm import LDM
-from .manga import Manga
-from .mat import MAT
-from .mi_gan import MIGAN
-from .opencv2 import OpenCV2
-from .paint_by_example import PaintByExample
-from .power_paint.power_paint import PowerPaint
-from .sd import SD, SD2, SD15, Anything4, RealisticVision14
-from .sdxl import SDXL
-from .zits import ZITS
-
-models = {
-    LaMa.name: LaMa,
-    AnimeLaMa.name: AnimeLaMa,
-    LDM.name: LDM,
-    ZITS.name: ZITS,
-    MAT.name: MAT,
-    FcF.name: FcF,
-    OpenCV2.name: OpenCV2,
-    Manga.name: Manga,
-    MIGAN.name: MIGAN,
-    SD15.name: SD15,
-    Anything4.name: Anything4,
-    RealisticVision14.name: RealisticVision14,
-    SD2.name: SD2,
-    PaintByExample.name: PaintByExample,
-    InstructPix2Pix.name: InstructPix2Pix,
-    Kandinsky22.name: Kandinsky22,
-    SDXL.name: SDXL,
-    PowerPaint.name: PowerPaint,
-    AnyText.name: AnyText,
+import importlib
+from collections.abc import Mapping
+
+from sora2wm.iopaint.const import (
+    ANYTEXT_NAME,
+    INSTRUCT_PIX2PIX_NAME,
+    KANDINSKY22_NAME,
+    POWERPAINT_NAME,
+)
+
+# model name -> (module, class name), the module is imported on first access so
+# that loading an erase model like lama doesn't pull in diffusers/transformers
+_MODEL_CLASSES = {
+    "lama": (".lama", "LaMa"),
+    "anime-lama": (".lama", "AnimeLaMa"),
+    "ldm": (".ldm", "LDM"),
+    "zits": (".zits", "ZITS"),
+    "mat": (".mat", "MAT"),
+    "fcf": (".fcf", "FcF"),
+    "cv2": (".opencv2", "OpenCV2"),
+    "manga": (".manga", "Manga"),
+    "migan": (".mi_gan", "MIGAN"),
+    "runwayml/stable-diffusion-inpainting": (".sd", "SD15"),
+    "Sanster/anything-4.0-inpainting": (".sd", "Anything4"),
+    "Sanster/Realistic_Vision_V1.4-inpainting": (".sd", "RealisticVision14"),
+    "stabilityai/stable-diffusion-2-inpainting": (".sd", "SD2"),
+    "Fantasy-Studio/Paint-by-Example": (".paint_by_example", "PaintByExample"),
+    INSTRUCT_PIX2PIX_NAME: (".instruct_pix2pix", "InstructPix2Pix"),
+    KANDINSKY22_NAME: (".kandinsky", "Kandinsky22"),
+    "diffusers/stable-diffusion-xl-1.0-inpainting-0.1": (".sdxl", "SDXL"),
+    POWERPAINT_NAME: (".power_paint.power_paint", "PowerPaint"),
+    ANYTEXT_NAME: (".anytext.anytext_model", "AnyText"),
+}
+
+# models with is_erase_model = True, known without importing their modules
+ERASE_MODELS = frozenset(
+    ["lama", "anime-lama", "ldm", "zits", "mat", "fcf", "cv2", "manga", "migan"]
+)
+
+# classes used directly by model_manager, resolved by module __getattr__
+_EXTRA_CLASSES = {
+    "SD": (".sd", "SD"),
+    "SDXL": (".sdxl", "SDXL"),
+    "ControlNet": (".controlnet", "ControlNet"),
 }
+
+
+def _load_class(module_name: str, class_name: str):
+    module = importlib.import_module(module_name, __name__)
+    return getattr(module, class_name)
+
+
+class LazyModelRegistry(Mapping):
+    """Mapping of model name to model class, importing each class on first use."""
+
+    def __init__(self, entries):
+        self._entries = dict(entries)
+        self._classes = {}
+
+    def __getitem__(self, name):
+        if name not in self._classes:
+            module_name, class_name = self._entries[name]
+            self._classes[name] = _load_class(module_name, class_name)
+        return self._classes[name]
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+models = LazyModelRegistry(_MODEL_CLASSES)
+
+
+def is_erase_model(name: str) -> bool:
+    return name in ERASE_MODELS
+
+
+def __getattr__(name):
+    for entries in (_EXTRA_CLASSES, {v[1]: v for v in _MODEL_CLASSES.values()}):
+        if name in entries:
+            return _load_class(*entries[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
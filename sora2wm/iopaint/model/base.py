@@ -8,6 +8,7 @@ from loguru import logger
 
 from sora2wm.iopaint.helper import (
     boxes_from_mask,
+    ceil_modulo,
     pad_img_to_modulo,
     resize_max_size,
     switch_mps_device,
@@ -58,7 +59,6 @@ class InpaintModel:
         ...
 
     def _pad_forward(self, image, mask, config: InpaintRequest):
-        origin_height, origin_width = image.shape[:2]
         pad_image = pad_img_to_modulo(
             image, mod=self.pad_mod, square=self.pad_to_square, min_size=self.min_size
         )
@@ -71,6 +71,20 @@ class InpaintModel:
         image, mask = self.forward_pre_process(image, mask, config)
 
         result = self.forward(pad_image, pad_mask, config)
+        return self._unpad_result(result, image, mask, config)
+
+    def _unpad_result(self, result, image, mask, config: InpaintRequest):
+        """Crop padded forward result back to image size and post process
+
+        Args:
+            result: padded BGR IMAGE
+            image: [H, W, C] RGB, before padding
+            mask: [H, W], before padding
+
+        Returns:
+            BGR IMAGE
+        """
+        origin_height, origin_width = image.shape[:2]
         result = result[0:origin_height, 0:origin_width, :]
 
         result, image, mask = self.forward_post_process(result, image, mask, config)
@@ -80,6 +94,66 @@ class InpaintModel:
             result = result * (mask / 255) + image[:, :, ::-1] * (1 - (mask / 255))
         return result
 
+    def forward_batch(self, images, masks, config: InpaintRequest):
+        """Input images have same size, run forward on each of them.
+        Models that support real batched inference should override this.
+        images: list of [H, W, C] RGB
+        masks: list of [H, W, 1] 255 为 masks 区域
+        return: list of BGR IMAGE
+        """
+        return [
+            self.forward(image, mask, config) for image, mask in zip(images, masks)
+        ]
+
+    def _batch_pad_forward(
+        self, images, masks, config: InpaintRequest, batch_size: int, bucket: int
+    ):
+        """Pad images to bucketed sizes, run forward_batch on each bucket
+
+        Images whose padded sizes fall into the same bucket are stacked together,
+        so the model always sees a few static shapes.
+
+        Args:
+            images: list of [H, W, C] RGB
+            masks: list of [H, W]
+            batch_size: max images per forward_batch call
+            bucket: padded height/width are multiples of this value
+
+        Returns:
+            list of BGR IMAGE
+        """
+        bucket = ceil_modulo(max(bucket, self.pad_mod), self.pad_mod)
+        if self.min_size is not None and self.min_size % bucket != 0:
+            bucket = self.pad_mod
+
+        groups = {}
+        pad_images = []
+        pad_masks = []
+        for i, (image, mask) in enumerate(zip(images, masks)):
+            pad_image = pad_img_to_modulo(
+                image, mod=bucket, square=self.pad_to_square, min_size=self.min_size
+            )
+            pad_mask = pad_img_to_modulo(
+                mask, mod=bucket, square=self.pad_to_square, min_size=self.min_size
+            )
+            pad_images.append(pad_image)
+            pad_masks.append(pad_mask)
+            groups.setdefault(pad_image.shape[:2], []).append(i)
+
+        results = [None] * len(images)
+        for indices in groups.values():
+            for start in range(0, len(indices), batch_size):
+                batch_indices = indices[start : start + batch_size]
+                batch_results = self.forward_batch(
+                    [pad_images[i] for i in batch_indices],
+                    [pad_masks[i] for i in batch_indices],
+                    config,
+                )
+                for i, result in zip(batch_indices, batch_results):
+                    image, mask = self.forward_pre_process(images[i], masks[i], config)
+                    results[i] = self._unpad_result(result, image, mask, config)
+        return results
+
     def forward_pre_process(self, image, mask, config):
         return image, mask
 
@@ -142,6 +216,90 @@ class InpaintModel:
 
         return inpaint_result
 
+    @torch.no_grad()
+    def inpaint_box(self, image, box, config: InpaintRequest):
+        """Inpaint a single rectangular area without building a full-frame mask.
+
+        The box is cropped with hd_strategy_crop_margin (same as HDStrategy.CROP),
+        only the crop goes through the model.
+
+        Args:
+            image: [H, W, C] RGB, not normalized
+            box: [left,top,right,bottom] area to repaint
+
+        Returns:
+            BGR IMAGE of the crop, [l, t, r, b] crop position in image
+        """
+        crop_img, crop_mask, crop_box = self._crop_box_without_mask(image, box, config)
+        return self._pad_forward(crop_img, crop_mask, config), crop_box
+
+    @torch.no_grad()
+    def inpaint_boxes(
+        self,
+        images,
+        boxes,
+        config: InpaintRequest,
+        batch_size: int = 1,
+        bucket: int = 32,
+    ):
+        """Inpaint one rectangular area in each of several images.
+
+        Crops are padded to bucketed sizes and run through forward_batch
+        in batches of batch_size.
+
+        Args:
+            images: list of [H, W, C] RGB, not normalized
+            boxes: list of [left,top,right,bottom] area to repaint
+            batch_size: max crops per forward_batch call, 1 disables batching
+            bucket: padded crop height/width are multiples of this value
+
+        Returns:
+            list of (BGR IMAGE of the crop, [l, t, r, b] crop position in image)
+        """
+        if batch_size <= 1:
+            return [
+                self.inpaint_box(image, box, config)
+                for image, box in zip(images, boxes)
+            ]
+
+        crop_imgs, crop_masks, crop_boxes = [], [], []
+        for image, box in zip(images, boxes):
+            crop_img, crop_mask, crop_box = self._crop_box_without_mask(
+                image, box, config
+            )
+            crop_imgs.append(crop_img)
+            crop_masks.append(crop_mask)
+            crop_boxes.append(crop_box)
+
+        crop_results = self._batch_pad_forward(
+            crop_imgs, crop_masks, config, batch_size, bucket
+        )
+        return list(zip(crop_results, crop_boxes))
+
+    def _crop_box_without_mask(self, image, box, config: InpaintRequest):
+        """
+
+        Args:
+            image: [H, W, C] RGB
+            box: [left,top,right,bottom]
+
+        Returns:
+            crop image, crop mask built from box, [l, t, r, b]
+        """
+        img_h, img_w = image.shape[:2]
+        box_l = min(max(int(box[0]), 0), img_w)
+        box_t = min(max(int(box[1]), 0), img_h)
+        box_r = min(max(int(box[2]), 0), img_w)
+        box_b = min(max(int(box[3]), 0), img_h)
+
+        l, t, r, b = self._get_crop_box(
+            [box_l, box_t, box_r, box_b], img_h, img_w, config
+        )
+        crop_img = image[t:b, l:r, :]
+        crop_mask = np.zeros((b - t, r - l), dtype=np.uint8)
+        crop_mask[box_t - t : box_b - t, box_l - l : box_r - l] = 255
+        return crop_img, crop_mask, [l, t, r, b]
+
     def _crop_box(self, image, mask, box, config: InpaintRequest):
         """
 
@@ -153,11 +311,29 @@ class InpaintModel:
         Returns:
             BGR IMAGE, (l, r, r, b)
         """
+        img_h, img_w = image.shape[:2]
+        l, t, r, b = self._get_crop_box(box, img_h, img_w, config)
+
+        crop_img = image[t:b, l:r, :]
+        crop_mask = mask[t:b, l:r]
+
+        return crop_img, crop_mask, [l, t, r, b]
+
+    def _get_crop_box(self, box, img_h, img_w, config: InpaintRequest):
+        """
+
+        Args:
+            box: [left,top,right,bottom]
+            img_h: image height
+            img_w: image width
+
+        Returns:
+            [l, t, r, b] crop area with hd_strategy_crop_margin
+        """
         box_h = box[3] - box[1]
         box_w = box[2] - box[0]
         cx = (box[0] + box[2]) // 2
         cy = (box[1] + box[3]) // 2
-        img_h, img_w = image.shape[:2]
 
         w = box_w + config.hd_strategy_crop_margin * 2
         h = box_h + config.hd_strategy_crop_margin * 2
@@ -187,12 +363,7 @@ class InpaintModel:
         t = max(t, 0)
         b = min(b, img_h)
 
-        crop_img = image[t:b, l:r, :]
-        crop_mask = mask[t:b, l:r]
-
-        # logger.info(f"box size: ({box_h},{box_w}) crop size: {crop_img.shape}")
-
-        return crop_img, crop_mask, [l, t, r, b]
+        return [l, t, r, b]
 
     def _calculate_cdf(self, histogram):
         cdf = histogram.cumsum()
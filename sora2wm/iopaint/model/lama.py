@@ -9,12 +9,30 @@ from sora2wm.iopaint.helper import (
     download_model,
     get_cache_path_by_url,
     load_jit_model,
+    load_optimized_jit_model,
     norm_img,
+    warmup_jit_model,
 )
 from sora2wm.iopaint.schema import InpaintRequest
 
 from .base import InpaintModel
-from ...configs import LAMA_CLEAN_WEIGHTS
+from ...configs import (
+    LAMA_BACKEND,
+    LAMA_CLEAN_WEIGHTS,
+    LAMA_JIT_CACHE_DIR,
+    LAMA_JIT_OPTIMIZE,
+    LAMA_ONNX_INTER_OP_THREADS,
+    LAMA_ONNX_INTRA_OP_THREADS,
+    LAMA_ONNX_WEIGHTS,
+    LAMA_PRECISION,
+    LAMA_WARMUP_SHAPES,
+)
+from ...utils.precision_utils import (
+    autocast_context,
+    check_precision,
+    resolve_bf16,
+    resolve_int8,
+)
 
 LAMA_MODEL_URL = os.environ.get(
     "LAMA_MODEL_URL",
@@ -35,23 +53,81 @@ class LaMa(InpaintModel):
     name = "lama"
     pad_mod = 8
     is_erase_model = True
+    # ONNX Runtime session when lama_backend="onnx", otherwise None
+    session = None
+    # fp32, int8 (quantized ONNX model) or bf16 (torch autocast)
+    precision = "fp32"
 
     @staticmethod
     def download():
         download_model(LAMA_MODEL_URL, LAMA_MODEL_MD5)
 
     def init_model(self, device, **kwargs):
+        backend = kwargs.get("lama_backend") or LAMA_BACKEND
+        precision = check_precision(kwargs.get("lama_precision") or LAMA_PRECISION)
+        precision = resolve_int8(precision)
+        # int8 needs onnxruntime's dynamic quantization, TorchScript convs can't be
+        # quantized dynamically; bf16 relies on torch autocast
+        required = {"int8": "onnx", "bf16": "torch"}.get(precision, backend)
+        if required != backend:
+            logger.info(f"lama precision {precision} uses the {required} backend")
+            backend = required
+        self.precision = resolve_bf16(precision, device)
         # 优先检查本地LAMA_CLEAN_WEIGHTS路径
         if os.path.exists(LAMA_CLEAN_WEIGHTS):
             logger.info(f"使用本地模型: {LAMA_CLEAN_WEIGHTS}")
-            self.model = load_jit_model(LAMA_CLEAN_WEIGHTS, device, LAMA_MODEL_MD5).eval()
+            model_path = str(LAMA_CLEAN_WEIGHTS)
         else:
-            # 如果本地文件不存在，从URL下载并加载
-            self.model = load_jit_model(LAMA_MODEL_URL, device, LAMA_MODEL_MD5).eval()
+            # 如果本地文件不存在，从URL下载
+            model_path = download_model(LAMA_MODEL_URL, LAMA_MODEL_MD5)
+
+        if backend == "onnx":
+            self.init_onnx_session(device, model_path, **kwargs)
+        elif backend == "torch":
+            self.init_jit_model(device, model_path, **kwargs)
+        else:
+            raise ValueError(f"Unknown lama backend: {backend}, use torch or onnx")
+
+    def init_jit_model(self, device, model_path, **kwargs):
+        if not kwargs.get("lama_jit_optimize", LAMA_JIT_OPTIMIZE):
+            self.model = load_jit_model(model_path, device, LAMA_MODEL_MD5).eval()
+            return
+        self.model = load_optimized_jit_model(
+            model_path, device, LAMA_MODEL_MD5, str(LAMA_JIT_CACHE_DIR)
+        )
+        # warm up with the same autocast setting used by _infer
+        with autocast_context(self.precision, device):
+            warmup_jit_model(
+                self.model, device, kwargs.get("lama_warmup_shapes", LAMA_WARMUP_SHAPES)
+            )
+
+    def init_onnx_session(self, device, model_path, **kwargs):
+        from .lama_onnx import create_onnx_session, export_lama_onnx
+
+        onnx_path = kwargs.get("lama_onnx_path") or LAMA_ONNX_WEIGHTS
+        if not os.path.exists(onnx_path):
+            export_lama_onnx(model_path, onnx_path)
+        if self.precision == "int8":
+            from ...utils.precision_utils import quantize_onnx_dynamic
+
+            onnx_path = quantize_onnx_dynamic(onnx_path)
+        self.session = create_onnx_session(
+            onnx_path,
+            device,
+            intra_op_threads=kwargs.get(
+                "onnx_intra_op_threads", LAMA_ONNX_INTRA_OP_THREADS
+            ),
+            inter_op_threads=kwargs.get(
+                "onnx_inter_op_threads", LAMA_ONNX_INTER_OP_THREADS
+            ),
+        )
 
     @staticmethod
     def is_downloaded() -> bool:
-        return os.path.exists(get_cache_path_by_url(LAMA_MODEL_URL))
+        # init_model prefers the local LAMA_CLEAN_WEIGHTS, no download needed then
+        return os.path.exists(LAMA_CLEAN_WEIGHTS) or os.path.exists(
+            get_cache_path_by_url(LAMA_MODEL_URL)
+        )
 
     def forward(self, image, mask, config: InpaintRequest):
         """Input image and output image have same size
@@ -59,19 +135,40 @@ class LaMa(InpaintModel):
         mask: [H, W]
         return: BGR IMAGE
         """
-        image = norm_img(image)
-        mask = norm_img(mask)
+        return self.forward_batch([image], [mask], config)[0]
 
-        mask = (mask > 0) * 1
-        image = torch.from_numpy(image).unsqueeze(0).to(self.device)
-        mask = torch.from_numpy(mask).unsqueeze(0).to(self.device)
+    def forward_batch(self, images, masks, config: InpaintRequest):
+        """Input images have same size, stacked into one batch
+        images: list of [H, W, C] RGB
+        masks: list of [H, W]
+        return: list of BGR IMAGE
+        """
+        image = np.stack([norm_img(it) for it in images])
+        mask = np.stack([norm_img(it) for it in masks])
 
-        inpainted_image = self.model(image, mask)
+        mask = ((mask > 0) * 1).astype(np.float32)
+        inpainted_image = self._infer(image, mask)
 
-        cur_res = inpainted_image[0].permute(1, 2, 0).detach().cpu().numpy()
+        cur_res = inpainted_image.transpose(0, 2, 3, 1)
         cur_res = np.clip(cur_res * 255, 0, 255).astype("uint8")
-        cur_res = cv2.cvtColor(cur_res, cv2.COLOR_RGB2BGR)
-        return cur_res
+        return [cv2.cvtColor(it, cv2.COLOR_RGB2BGR) for it in cur_res]
+
+    def _infer(self, image: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """Run the model on a normalized batch
+        image: [N, 3, H, W] float32
+        mask: [N, 1, H, W] float32
+        return: [N, 3, H, W] float32 RGB
+        """
+        if self.session is not None:
+            from .lama_onnx import run_onnx_session
+
+            return run_onnx_session(self.session, image, mask)
+
+        image = torch.from_numpy(image).to(self.device)
+        mask = torch.from_numpy(mask).to(self.device)
+        with autocast_context(self.precision, self.device):
+            inpainted_image = self.model(image, mask)
+        return inpainted_image.detach().float().cpu().numpy()
 
 
 class AnimeLaMa(LaMa):
@@ -0,0 +1,294 @@
+"""ONNX export and ONNX Runtime inference for the LaMa TorchScript model.
+
+big-lama's Fast Fourier Convolution blocks call torch.fft.rfftn / irfftn and
+move between real and complex tensors, which torch.onnx cannot export out of
+the box. The symbolics below map those ops onto the ONNX DFT operator
+(opset 17) and represent a complex tensor as a real tensor with a trailing
+dimension of size 2 holding (real, imag).
+"""
+
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+from loguru import logger
+
+# ONNX DFT is available from opset 17
+LAMA_ONNX_OPSET = 17
+
+# onnx TensorProto data types
+_ONNX_FLOAT = 1
+_ONNX_INT64 = 7
+
+
+def _const(g, values, dtype=torch.int64):
+    return g.op("Constant", value_t=torch.tensor(values, dtype=dtype))
+
+
+def _rank(value, default: int) -> int:
+    from torch.onnx import symbolic_helper
+
+    rank = symbolic_helper._get_tensor_rank(value)
+    return default if rank is None else rank
+
+
+def _fft_params(dim, norm):
+    from torch.onnx import symbolic_helper
+
+    dims = symbolic_helper._maybe_get_const(dim, "is")
+    if not isinstance(dims, (list, tuple)):
+        raise RuntimeError("LaMa ONNX export requires constant fft dims")
+    if norm is None or symbolic_helper._is_none(norm):
+        norm = "backward"
+    else:
+        norm = symbolic_helper._maybe_get_const(norm, "s")
+    return list(dims), norm
+
+
+def _signal_numel(g, x, axes):
+    """Number of elements in the transformed axes of x, as a float scalar."""
+    shape = g.op("Shape", x)
+    numel = None
+    for axis in axes:
+        size = g.op("Gather", shape, _const(g, axis), axis_i=0)
+        numel = size if numel is None else g.op("Mul", numel, size)
+    return g.op("Cast", numel, to_i=_ONNX_FLOAT)
+
+
+def _fft_rfftn(g, self, s, dim, norm):
+    from torch.onnx import symbolic_helper
+
+    if not symbolic_helper._is_none(s):
+        raise RuntimeError("LaMa ONNX export does not support rfftn with s")
+    dims, norm = _fft_params(dim, norm)
+    rank = _rank(self, default=4)
+    axes = [d % rank for d in dims]
+
+    # [..., 1] real signal -> [..., 2] complex spectrum
+    out = symbolic_helper._unsqueeze_helper(g, self, [rank])
+    # one-sided transform on the last axis, full transform on the others
+    out = g.op("DFT", out, axis_i=axes[-1], onesided_i=1, inverse_i=0)
+    for axis in reversed(axes[:-1]):
+        out = g.op("DFT", out, axis_i=axis, onesided_i=0, inverse_i=0)
+
+    if norm == "ortho":
+        out = g.op("Div", out, g.op("Sqrt", _signal_numel(g, self, axes)))
+    elif norm == "forward":
+        out = g.op("Div", out, _signal_numel(g, self, axes))
+    return out
+
+
+def _last_signal_size(g, s):
+    """Output length of the last transformed axis from irfftn's s, as a [1] tensor."""
+    from torch.onnx import symbolic_helper
+
+    if s is None or symbolic_helper._is_none(s):
+        return None
+    sizes = symbolic_helper._maybe_get_const(s, "is")
+    if isinstance(sizes, (list, tuple)):
+        return _const(g, [sizes[-1]])
+    last = symbolic_helper._unpack_list(s)[-1]
+    last = g.op("Cast", last, to_i=_ONNX_INT64)
+    return g.op("Reshape", last, _const(g, [1]))
+
+
+def _fft_irfftn(g, self, s, dim, norm):
+    dims, norm = _fft_params(dim, norm)
+    # self is [..., 2], the complex rank is one less
+    rank = _rank(self, default=5) - 1
+    axes = [d % rank for d in dims]
+    last_axis = axes[-1]
+
+    # full inverse transform on all axes but the last
+    out = self
+    for axis in axes[:-1]:
+        out = g.op("DFT", out, axis_i=axis, onesided_i=0, inverse_i=1)
+
+    # rebuild the Hermitian half of the last axis: X[n - k] = conj(X[k])
+    shape = g.op("Shape", out)
+    half = g.op("Gather", shape, _const(g, [last_axis]), axis_i=0)
+    size = _last_signal_size(g, s)
+    if size is None:
+        size = g.op("Mul", g.op("Sub", half, _const(g, [1])), _const(g, [2]))
+    mirrored = g.op(
+        "Slice",
+        out,
+        g.op("Sub", size, half),
+        _const(g, [0]),
+        _const(g, [last_axis]),
+        _const(g, [-1]),
+    )
+    mirrored = g.op("Mul", mirrored, _const(g, [1.0, -1.0], dtype=torch.float32))
+    out = g.op("Concat", out, mirrored, axis_i=last_axis)
+    out = g.op("DFT", out, axis_i=last_axis, onesided_i=0, inverse_i=1)
+    # keep the real part
+    out = g.op("Gather", out, _const(g, 0), axis_i=-1)
+
+    # ONNX inverse DFT is already scaled by 1/n ("backward")
+    if norm in ("ortho", "forward"):
+        numel = None
+        for axis in axes[:-1]:
+            axis_size = g.op("Gather", shape, _const(g, axis), axis_i=0)
+            numel = axis_size if numel is None else g.op("Mul", numel, axis_size)
+        last_size = g.op("Reshape", size, _const(g, []))
+        numel = last_size if numel is None else g.op("Mul", numel, last_size)
+        numel = g.op("Cast", numel, to_i=_ONNX_FLOAT)
+        if norm == "ortho":
+            numel = g.op("Sqrt", numel)
+        out = g.op("Mul", out, numel)
+    return out
+
+
+def _real(g, self):
+    return g.op("Gather", self, _const(g, 0), axis_i=-1)
+
+
+def _imag(g, self):
+    return g.op("Gather", self, _const(g, 1), axis_i=-1)
+
+
+def _complex(g, real, imag):
+    from torch.onnx import symbolic_helper
+
+    real = symbolic_helper._unsqueeze_helper(g, real, [-1])
+    imag = symbolic_helper._unsqueeze_helper(g, imag, [-1])
+    return g.op("Concat", real, imag, axis_i=-1)
+
+
+def _view_as_real(g, self):
+    # complex tensors are already stored as [..., 2]
+    return self
+
+
+def _view_as_complex(g, self):
+    return self
+
+
+def register_fft_symbolics(opset: int = LAMA_ONNX_OPSET):
+    """Register the FFT / complex symbolics needed to export LaMa."""
+    from torch.onnx import register_custom_op_symbolic
+
+    for name, fn in [
+        ("aten::fft_rfftn", _fft_rfftn),
+        ("aten::fft_irfftn", _fft_irfftn),
+        ("aten::real", _real),
+        ("aten::imag", _imag),
+        ("aten::complex", _complex),
+        ("aten::view_as_real", _view_as_real),
+        ("aten::view_as_complex", _view_as_complex),
+    ]:
+        register_custom_op_symbolic(name, fn, opset)
+
+
+def export_lama_onnx(
+    model_path,
+    output_path,
+    opset: int = LAMA_ONNX_OPSET,
+    sample_size: Tuple[int, int] = (256, 256),
+) -> Path:
+    """Export a LaMa TorchScript model to ONNX.
+
+    Batch, height and width are exported as dynamic axes.
+
+    Args:
+        model_path: TorchScript model, e.g. big-lama.pt
+        output_path: .onnx file to write
+        opset: ONNX opset, must be >= 17 for DFT
+        sample_size: (height, width) of the tracing sample, multiple of 8
+
+    Returns:
+        output_path
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Exporting {model_path} to {output_path}, opset {opset}")
+
+    model = torch.jit.load(str(model_path), map_location="cpu").eval()
+    register_fft_symbolics(opset)
+
+    h, w = sample_size
+    image = torch.rand(1, 3, h, w)
+    mask = (torch.rand(1, 1, h, w) > 0.5).float()
+    dynamic_axes = {
+        "image": {0: "batch", 2: "height", 3: "width"},
+        "mask": {0: "batch", 2: "height", 3: "width"},
+        "output": {0: "batch", 2: "height", 3: "width"},
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (image, mask),
+            str(output_path),
+            input_names=["image", "mask"],
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+            # the FFT symbolics above only apply to the TorchScript exporter,
+            # newer torch defaults to the dynamo exporter which ignores them
+            dynamo=False,
+        )
+    return output_path
+
+
+def create_onnx_session(
+    model_path,
+    device: Optional[torch.device] = None,
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+):
+    """Create an ONNX Runtime session for an exported LaMa model.
+
+    Args:
+        model_path: exported .onnx file
+        device: CUDA device uses CUDAExecutionProvider when available
+        intra_op_threads: threads inside one op, 0 lets onnxruntime decide
+        inter_op_threads: threads across independent ops, 0 lets onnxruntime decide
+
+    Returns:
+        onnxruntime.InferenceSession
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads > 0:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads > 0:
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+    providers = ["CPUExecutionProvider"]
+    if (
+        device is not None
+        and str(device).startswith("cuda")
+        and "CUDAExecutionProvider" in ort.get_available_providers()
+    ):
+        providers.insert(0, "CUDAExecutionProvider")
+
+    logger.info(f"Loading ONNX model from: {model_path}, providers: {providers}")
+    return ort.InferenceSession(
+        os.fspath(model_path), sess_options=options, providers=providers
+    )
+
+
+def run_onnx_session(session, image: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Run LaMa on a normalized batch.
+
+    Args:
+        session: session from create_onnx_session
+        image: [N, 3, H, W] float32 in [0, 1]
+        mask: [N, 1, H, W] float32, 1 means area to repaint
+
+    Returns:
+        [N, 3, H, W] float32 RGB in [0, 1]
+    """
+    return session.run(
+        ["output"],
+        {
+            "image": np.ascontiguousarray(image, dtype=np.float32),
+            "mask": np.ascontiguousarray(mask, dtype=np.float32),
+        },
+    )[0]
@@ -4,12 +4,9 @@ import numpy as np
 import torch
 from loguru import logger
 
-from sora2wm.iopaint.download import scan_models
+from sora2wm.iopaint.download import get_erase_model_info, scan_models
 from sora2wm.iopaint.helper import switch_mps_device
-from sora2wm.iopaint.model import SD, SDXL, ControlNet, models
-from sora2wm.iopaint.model.brushnet.brushnet_wrapper import BrushNetWrapper
-from sora2wm.iopaint.model.brushnet.brushnet_xl_wrapper import BrushNetXLWrapper
-from sora2wm.iopaint.model.power_paint.power_paint_v2 import PowerPaintV2
+from sora2wm.iopaint.model import models
 from sora2wm.iopaint.model.utils import is_local_files_only, torch_gc
 from sora2wm.iopaint.schema import InpaintRequest, ModelInfo, ModelType
 
@@ -20,7 +17,13 @@ class ModelManager:
         self.device = device
         self.kwargs = kwargs
         self.available_models: Dict[str, ModelInfo] = {}
-        self.scan_models()
+        erase_model_info = get_erase_model_info(name)
+        if erase_model_info is not None:
+            # builtin erase models don't need a scan of the whole model cache,
+            # the full scan is deferred until switch() or scan_models() is called
+            self.available_models[name] = erase_model_info
+        else:
+            self.scan_models()
 
         self.enable_controlnet = kwargs.get("enable_controlnet", False)
         controlnet_method = kwargs.get("controlnet_method", None)
@@ -60,16 +63,29 @@ class ModelManager:
             "brushnet_method": self.brushnet_method,
         }
 
+        # diffusers based wrappers are imported on demand, erase models don't need them
         if model_info.support_controlnet and self.enable_controlnet:
+            from sora2wm.iopaint.model.controlnet import ControlNet
+
             return ControlNet(device, **kwargs)
 
         if model_info.support_brushnet and self.enable_brushnet:
             if model_info.model_type == ModelType.DIFFUSERS_SD:
+                from sora2wm.iopaint.model.brushnet.brushnet_wrapper import (
+                    BrushNetWrapper,
+                )
+
                 return BrushNetWrapper(device, **kwargs)
             elif model_info.model_type == ModelType.DIFFUSERS_SDXL:
+                from sora2wm.iopaint.model.brushnet.brushnet_xl_wrapper import (
+                    BrushNetXLWrapper,
+                )
+
                 return BrushNetXLWrapper(device, **kwargs)
 
         if model_info.support_powerpaint_v2 and self.enable_powerpaint_v2:
+            from sora2wm.iopaint.model.power_paint.power_paint_v2 import PowerPaintV2
+
             return PowerPaintV2(device, **kwargs)
 
         if model_info.name in models:
@@ -79,12 +95,16 @@ class ModelManager:
             ModelType.DIFFUSERS_SD_INPAINT,
             ModelType.DIFFUSERS_SD,
         ]:
+            from sora2wm.iopaint.model.sd import SD
+
             return SD(device, **kwargs)
 
         if model_info.model_type in [
             ModelType.DIFFUSERS_SDXL_INPAINT,
             ModelType.DIFFUSERS_SDXL,
         ]:
+            from sora2wm.iopaint.model.sdxl import SDXL
+
             return SDXL(device, **kwargs)
 
         raise NotImplementedError(f"Unsupported model: {name}")
@@ -110,8 +130,52 @@ class ModelManager:
         self.enable_disable_lcm_lora(config)
         return self.model(image, mask, config).astype(np.uint8)
 
-    def scan_models(self) -> List[ModelInfo]:
-        available_models = scan_models()
+    @torch.inference_mode()
+    def inpaint_box(self, image, box, config: InpaintRequest):
+        """
+
+        Args:
+            image: [H, W, C] RGB
+            box: [left, top, right, bottom] area to repaint
+            config:
+
+        Returns:
+            BGR image of the crop, [l, t, r, b] crop position in image
+        """
+        crop_result, crop_box = self.model.inpaint_box(image, box, config)
+        return crop_result.astype(np.uint8), crop_box
+
+    @torch.inference_mode()
+    def inpaint_boxes(
+        self,
+        images,
+        boxes,
+        config: InpaintRequest,
+        batch_size: int = 1,
+        bucket: int = 32,
+    ):
+        """
+
+        Args:
+            images: list of [H, W, C] RGB
+            boxes: list of [left, top, right, bottom] area to repaint
+            config:
+            batch_size: max crops per model call
+            bucket: padded crop height/width are multiples of this value
+
+        Returns:
+            list of (BGR image of the crop, [l, t, r, b] crop position in image)
+        """
+        results = self.model.inpaint_boxes(
+            images, boxes, config, batch_size=batch_size, bucket=bucket
+        )
+        return [
+            (crop_result.astype(np.uint8), crop_box)
+            for crop_result, crop_box in results
+        ]
+
+    def scan_models(self, refresh: bool = False) -> List[ModelInfo]:
+        available_models = scan_models(refresh=refresh)
         self.available_models = {it.name: it for it in available_models}
         return available_models
 
@@ -119,6 +183,9 @@ class ModelManager:
         if new_name == self.name:
             return
 
+        if new_name not in self.available_models:
+            self.scan_models()
+
         old_name = self.name
         old_controlnet_method = self.controlnet_method
         self.name = new_name
@@ -0,0 +1,49 @@
+import os
+
+import torch
+
+from sora2wm.iopaint import helper
+from sora2wm.iopaint.helper import _optimized_cache_path, load_optimized_jit_model
+
+
+class AddMask(torch.nn.Module):
+    def forward(self, image, mask):
+        return image * (1 - mask) + mask
+
+
+def _save_model(path):
+    torch.jit.save(torch.jit.script(AddMask()), str(path))
+
+
+def _fail_md5sum(_):
+    raise AssertionError("model file must not be hashed to build the cache key")
+
+
+def test_optimized_model_cache_does_not_hash_weights(tmp_path, monkeypatch):
+    model_path = tmp_path / "model.pt"
+    _save_model(model_path)
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(helper, "md5sum", _fail_md5sum)
+
+    model = load_optimized_jit_model(str(model_path), "cpu", "", str(cache_dir))
+    cached = os.listdir(cache_dir)
+    assert len(cached) == 1
+
+    image = torch.rand(1, 3, 8, 8)
+    mask = torch.zeros(1, 1, 8, 8)
+    model = load_optimized_jit_model(str(model_path), "cpu", "", str(cache_dir))
+    assert os.listdir(cache_dir) == cached
+    assert torch.allclose(model(image, mask), image)
+
+
+def test_optimized_model_cache_key_follows_file_changes(tmp_path):
+    model_path = tmp_path / "model.pt"
+    _save_model(model_path)
+    before = _optimized_cache_path(str(tmp_path), str(model_path), "cpu", "frozen")
+    assert before == _optimized_cache_path(
+        str(tmp_path), str(model_path), "cpu", "frozen"
+    )
+
+    stat = os.stat(model_path)
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert _optimized_cache_path(str(tmp_path), str(model_path), "cpu", "frozen") != before
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import torch
+
+from sora2wm.iopaint.model.lama_onnx import create_onnx_session, export_lama_onnx
+
+
+class SpectralBlock(torch.nn.Module):
+    """The rfftn -> conv -> irfftn round trip used by LaMa's FFC blocks."""
+
+    def __init__(self):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(8, 8, 1)
+
+    def forward(self, image, mask):
+        x = torch.cat([image, mask], 1)
+        b, c, h, w = x.shape
+        ff = torch.fft.rfftn(x, dim=(-2, -1), norm="ortho")
+        ff = torch.stack((ff.real, ff.imag), dim=-1)
+        ff = ff.permute(0, 1, 4, 2, 3).contiguous().view(b, -1, h, w // 2 + 1)
+        ff = self.conv(ff)
+        ff = ff.view(b, -1, 2, h, w // 2 + 1).permute(0, 1, 3, 4, 2).contiguous()
+        ff = torch.complex(ff[..., 0], ff[..., 1])
+        out = torch.fft.irfftn(ff, s=(h, w), dim=(-2, -1), norm="ortho")
+        return out[:, :3]
+
+
+def test_export_uses_fft_symbolics(tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    model = torch.jit.script(SpectralBlock().eval())
+    model_path = tmp_path / "block.pt"
+    torch.jit.save(model, str(model_path))
+
+    onnx_path = export_lama_onnx(
+        model_path, tmp_path / "block.onnx", sample_size=(64, 64)
+    )
+    session = create_onnx_session(onnx_path)
+
+    # batch, height and width differ from the tracing sample
+    for batch, h, w in [(1, 64, 64), (2, 40, 88)]:
+        image = torch.rand(batch, 3, h, w)
+        mask = torch.rand(batch, 1, h, w)
+        expected = model(image, mask).detach().numpy()
+        (output,) = session.run(None, {"image": image.numpy(), "mask": mask.numpy()})
+        assert output.shape == expected.shape
+        assert np.abs(output - expected).max() < 1e-3
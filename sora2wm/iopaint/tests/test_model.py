@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 import torch
 
@@ -8,6 +9,7 @@ from sora2wm.iopaint.tests.utils import (
     check_device,
     current_dir,
     get_config,
+    get_data,
 )
 
 
@@ -33,6 +35,26 @@ def test_lama(device, strategy):
     )
 
 
+def test_lama_onnx_matches_torch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    torch_model = ModelManager(name="lama", device="cpu", lama_backend="torch")
+    onnx_model = ModelManager(
+        name="lama",
+        device="cpu",
+        lama_backend="onnx",
+        lama_onnx_path=tmp_path / "big-lama.onnx",
+    )
+    img, mask = get_data()
+    cfg = get_config(strategy=HDStrategy.ORIGINAL)
+
+    torch_res = torch_model(img, mask, cfg).astype(np.float32)
+    onnx_res = onnx_model(img, mask, cfg).astype(np.float32)
+    assert torch_res.shape == onnx_res.shape
+    # float rounding in the DFT differs between backends, allow small pixel drift
+    assert np.abs(torch_res - onnx_res).mean() < 1.0
+    assert np.abs(torch_res - onnx_res).max() <= 16
+
+
 @pytest.mark.parametrize("device", ["cuda", "cpu"])
 @pytest.mark.parametrize(
     "strategy", [HDStrategy.ORIGINAL, HDStrategy.RESIZE, HDStrategy.CROP]
@@ -163,3 +185,21 @@ def test_mi_gan(device, strategy):
         fx=1.5,
         fy=1.7,
     )
+
+
+@pytest.mark.parametrize("cv2_flag", ["INPAINT_NS", "INPAINT_TELEA"])
+def test_inpaint_box_match_crop_strategy(cv2_flag):
+    model = ModelManager(
+        name="cv2",
+        device=torch.device("cpu"),
+    )
+    cfg = get_config(strategy=HDStrategy.CROP, cv2_flag=cv2_flag, cv2_radius=3)
+    img, _ = get_data(img_p=current_dir / "overture-creations-5sI6fQgYIuo.png")
+    h, w = img.shape[:2]
+    box = [w // 4, h // 4, w // 2, h // 2]
+    mask = np.zeros((h, w), dtype=np.uint8)
+    mask[box[1] : box[3], box[0] : box[2]] = 255
+
+    full_res = model(img, mask, cfg)
+    crop_res, (l, t, r, b) = model.inpaint_box(img, box, cfg)
+    assert np.array_equal(full_res[t:b, l:r], crop_res)
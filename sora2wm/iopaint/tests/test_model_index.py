@@ -0,0 +1,59 @@
+import json
+
+import huggingface_hub.constants
+import pytest
+
+from sora2wm.iopaint import download
+from sora2wm.iopaint.download import MODEL_INDEX_FILE, refresh_model_index, scan_models
+
+
+def _add_converted_model(model_dir, name):
+    model_path = model_dir / "stable_diffusion" / name
+    model_path.mkdir(parents=True)
+    with open(model_path / "model_index.json", "w") as fw:
+        json.dump({"_class_name": "StableDiffusionInpaintPipeline"}, fw)
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "models"))
+    monkeypatch.setattr(huggingface_hub.constants, "HF_HUB_CACHE", str(tmp_path / "hf"))
+    (tmp_path / "models").mkdir()
+    return tmp_path / "models"
+
+
+def _names(models):
+    return {it.name for it in models}
+
+
+def test_scan_models_uses_index(model_dir, monkeypatch):
+    _add_converted_model(model_dir, "model-a")
+    assert "model-a" in _names(scan_models())
+    assert (model_dir / MODEL_INDEX_FILE).exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("index should be used")
+
+    monkeypatch.setattr(download, "_scan_diffusion_models", fail)
+    assert "model-a" in _names(scan_models())
+
+
+def test_scan_models_invalidated_by_new_model(model_dir):
+    _add_converted_model(model_dir, "model-a")
+    scan_models()
+    _add_converted_model(model_dir, "model-b")
+    assert {"model-a", "model-b"} <= _names(scan_models())
+
+
+def test_refresh_model_index(model_dir, monkeypatch):
+    scan_models()
+    calls = []
+    original = download._scan_diffusion_models
+
+    def counting_scan(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(download, "_scan_diffusion_models", counting_scan)
+    refresh_model_index()
+    assert calls
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+from sora2wm.iopaint.model import ERASE_MODELS, models
+
+
+def _imported_modules_after(code: str) -> set:
+    # run in a fresh interpreter, sys.modules of the test process is already polluted
+    out = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return set(out.split())
+
+
+def test_lama_path_does_not_import_diffusers():
+    modules = _imported_modules_after(
+        "from sora2wm.iopaint.model_manager import ModelManager\n"
+        "from sora2wm.iopaint.model import models\n"
+        "models['lama']\n"
+        "from sora2wm.watermark_remover import WaterMarkRemover"
+    )
+    assert "sora2wm.iopaint.model.lama" in modules
+    assert "diffusers" not in modules
+    assert "transformers" not in modules
+
+
+def test_registry_resolves_classes():
+    assert "lama" in models
+    assert models["lama"].name == "lama"
+    for name in ERASE_MODELS:
+        assert models[name].is_erase_model
+    for name in models:
+        assert models[name].name == name
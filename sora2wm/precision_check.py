@@ -0,0 +1,217 @@
+"""
+低精度推理的精度守卫
+
+在参考视频上分别以fp32和低精度模式运行水印检测和修复，比较水印区域的PSNR/SSIM和推理耗时，
+低于配置的阈值时以非零状态码退出，用于在启用低精度模式前确认质量损失在可接受范围内
+
+用法:
+    python -m sora2wm.precision_check --input resources/dog_vs_sam.mp4 --lama-precision int8
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from sora2wm.configs import LAMA_BATCH_SIZE, PRECISION_MIN_PSNR, PRECISION_MIN_SSIM
+from sora2wm.utils.patch_utils import clamp_bbox
+from sora2wm.utils.precision_utils import PRECISIONS, psnr, ssim
+from sora2wm.utils.stream_utils import iter_chunks
+from sora2wm.utils.video_utils import VideoLoader
+from sora2wm.watermark_detector import Sora2WaterMarkDetector
+from sora2wm.watermark_remover import WaterMarkRemover
+
+# 完全相同的图像PSNR为inf，统计均值时按该值计
+_PSNR_CAP = 100.0
+
+
+def detect_all(detector: Sora2WaterMarkDetector, frames: list) -> tuple[list, float]:
+    """
+    检测所有帧的水印
+
+    返回:
+    - (检测结果列表, 耗时秒数)
+    """
+    start = time.perf_counter()
+    results = []
+    for chunk in iter_chunks(frames, LAMA_BATCH_SIZE):
+        results.extend(detector.detect_batch(chunk))
+    return results, time.perf_counter() - start
+
+
+def clean_all(
+    remover: WaterMarkRemover, frames: list, bboxes: list
+) -> tuple[list, float]:
+    """
+    修复所有帧的水印（边界框为None的帧保持原样）
+
+    返回:
+    - (修复结果列表, 耗时秒数)
+    """
+    outputs = list(frames)
+    todo = [i for i, bbox in enumerate(bboxes) if bbox is not None]
+    start = time.perf_counter()
+    cleaned = remover.clean_bboxes([frames[i] for i in todo], [bboxes[i] for i in todo])
+    elapsed = time.perf_counter() - start
+    for i, output in zip(todo, cleaned):
+        outputs[i] = output
+    return outputs, elapsed
+
+
+def patch_metrics(references: list, candidates: list, bboxes: list) -> dict:
+    """
+    计算各帧水印区域相对fp32结果的PSNR/SSIM
+
+    参数:
+    - references: fp32结果列表
+    - candidates: 低精度结果列表
+    - bboxes: fp32检测得到的水印边界框列表（为None的帧不参与统计）
+
+    返回:
+    - 统计结果字典
+    """
+    psnrs, ssims = [], []
+    for reference, candidate, bbox in zip(references, candidates, bboxes):
+        if bbox is None:
+            continue
+        x1, y1, x2, y2 = clamp_bbox(bbox, reference.shape)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        psnrs.append(
+            min(psnr(reference[y1:y2, x1:x2], candidate[y1:y2, x1:x2]), _PSNR_CAP)
+        )
+        ssims.append(ssim(reference[y1:y2, x1:x2], candidate[y1:y2, x1:x2]))
+    if not psnrs:
+        return {"frames": 0}
+    return {
+        "frames": len(psnrs),
+        "mean_psnr": float(np.mean(psnrs)),
+        "min_psnr": float(np.min(psnrs)),
+        "mean_ssim": float(np.mean(ssims)),
+        "min_ssim": float(np.min(ssims)),
+    }
+
+
+def check(
+    input_path: Path,
+    lama_precision: str,
+    detect_precision: str,
+    max_frames: int,
+    min_psnr: float = PRECISION_MIN_PSNR,
+    min_ssim: float = PRECISION_MIN_SSIM,
+) -> list[dict]:
+    """
+    在参考视频上比较低精度模式与fp32的结果
+
+    参数:
+    - input_path: 参考视频路径
+    - lama_precision: 待检查的LAMA推理精度
+    - detect_precision: 待检查的检测推理精度
+    - max_frames: 最多使用的帧数
+    - min_psnr: 水印区域最差帧的最低PSNR
+    - min_ssim: 水印区域最差帧的最低SSIM
+
+    返回:
+    - 各项检查的结果列表（含passed字段）
+    """
+    frames = list(VideoLoader(input_path, end_frame=max_frames))
+    if not frames:
+        raise ValueError(f"参考视频没有可用的帧: {input_path}")
+
+    detections, detect_seconds = detect_all(
+        Sora2WaterMarkDetector(precision="fp32"), frames
+    )
+    bboxes = [d["bbox"] if d["detected"] else None for d in detections]
+    if not any(bbox is not None for bbox in bboxes):
+        raise ValueError(f"参考视频中没有检测到水印: {input_path}")
+    remover = WaterMarkRemover(precision="fp32")
+    references, clean_seconds = clean_all(remover, frames, bboxes)
+
+    results = []
+    if lama_precision != "fp32":
+        candidate = WaterMarkRemover(precision=lama_precision)
+        outputs, seconds = clean_all(candidate, frames, bboxes)
+        result = {
+            "model": "lama",
+            "precision": candidate.model_manager.model.precision,
+            "speedup": clean_seconds / seconds if seconds > 0 else 0.0,
+        }
+        result.update(patch_metrics(references, outputs, bboxes))
+        results.append(result)
+
+    if detect_precision != "fp32":
+        candidate = Sora2WaterMarkDetector(precision=detect_precision)
+        candidate_detections, seconds = detect_all(candidate, frames)
+        candidate_bboxes = [
+            d["bbox"] if d["detected"] else None for d in candidate_detections
+        ]
+        # 用fp32修复模型处理低精度检测的结果，衡量检测偏差对最终画面的影响
+        outputs, _ = clean_all(remover, frames, candidate_bboxes)
+        result = {
+            "model": "detector",
+            "precision": candidate.precision,
+            "speedup": detect_seconds / seconds if seconds > 0 else 0.0,
+        }
+        result.update(patch_metrics(references, outputs, bboxes))
+        results.append(result)
+
+    for result in results:
+        result["passed"] = (
+            result["frames"] > 0
+            and result["min_psnr"] >= min_psnr
+            and result["min_ssim"] >= min_ssim
+        )
+    return results
+
+
+def print_results(results: list[dict]):
+    """以表格形式打印检查结果"""
+    print(
+        f"{'model':<10} {'precision':<10} {'speedup':>8} {'frames':>7} "
+        f"{'PSNR mean/min':>15} {'SSIM mean/min':>15} {'result':>7}"
+    )
+    for r in results:
+        if r["frames"]:
+            psnr_text = f"{r['mean_psnr']:.2f}/{r['min_psnr']:.2f}"
+            ssim_text = f"{r['mean_ssim']:.4f}/{r['min_ssim']:.4f}"
+        else:
+            psnr_text = ssim_text = "n/a"
+        print(
+            f"{r['model']:<10} {r['precision']:<10} {r['speedup']:>7.2f}x "
+            f"{r['frames']:>7} {psnr_text:>15} {ssim_text:>15} "
+            f"{'PASS' if r['passed'] else 'FAIL':>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比较低精度推理模式与fp32在水印区域的质量")
+    parser.add_argument("--input", type=Path, required=True, help="参考视频路径")
+    parser.add_argument(
+        "--lama-precision", default="fp32", choices=PRECISIONS, help="待检查的LAMA推理精度"
+    )
+    parser.add_argument(
+        "--detect-precision", default="fp32", choices=PRECISIONS, help="待检查的检测推理精度"
+    )
+    parser.add_argument("--max-frames", type=int, default=60, help="最多使用的帧数")
+    parser.add_argument("--min-psnr", type=float, default=PRECISION_MIN_PSNR)
+    parser.add_argument("--min-ssim", type=float, default=PRECISION_MIN_SSIM)
+    args = parser.parse_args()
+
+    if args.lama_precision == "fp32" and args.detect_precision == "fp32":
+        parser.error("请至少指定一个低精度模式（--lama-precision 或 --detect-precision）")
+
+    results = check(
+        args.input,
+        args.lama_precision,
+        args.detect_precision,
+        args.max_frames,
+        args.min_psnr,
+        args.min_ssim,
+    )
+    print_results(results)
+    if not all(r["passed"] for r in results):
+        logger.error("低精度模式的质量损失超出阈值")
+        sys.exit(1)
@@ -17,11 +17,15 @@ async def lifespan(app: FastAPI):
 
     await worker.initialize()
 
-    _ = asyncio.create_task(worker.run())
+    worker_task = asyncio.create_task(worker.run())
+    flusher_task = asyncio.create_task(worker.store.run_flusher())
 
     logger.info("Application started successfully")
 
     yield
 
     logger.info("Shutting down...")
+    worker_task.cancel()
+    flusher_task.cancel()
+    await worker.shutdown()
     logger.info("Application shutdown complete")
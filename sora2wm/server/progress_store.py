@@ -0,0 +1,216 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from loguru import logger
+from sqlalchemy import select, update
+
+from sora2wm.configs import (
+    PROGRESS_FLUSH_INTERVAL,
+    PROGRESS_FLUSH_MIN_DELTA,
+    PROGRESS_STORE_MAX_TERMINAL,
+)
+from sora2wm.server.db import get_session
+from sora2wm.server.models import Task
+from sora2wm.server.schemas import Status, WMRemoveResults
+
+TERMINAL_STATUSES = (Status.FINISHED, Status.ERROR)
+
+
+@dataclass
+class TaskState:
+    id: str
+    status: Status
+    percentage: int = 0
+    video_path: str = ""
+    output_path: str | None = None
+    download_url: str | None = None
+    # not yet inserted into the tasks table
+    is_new: bool = False
+    dirty: bool = False
+    flushed_percentage: int = 0
+    updated_at: float = field(default_factory=time.monotonic)
+    # notified on every change, replaced after each notification
+    version: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    webhook_url: str | None = None
+
+    def notify(self):
+        self.version += 1
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def to_results(self) -> WMRemoveResults:
+        return WMRemoveResults(
+            percentage=self.percentage,
+            status=self.status,
+            download_url=self.download_url,
+        )
+
+    def to_row(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status.value,
+            "percentage": self.percentage,
+            "video_path": self.video_path,
+            "output_path": self.output_path,
+            "download_url": self.download_url,
+        }
+
+
+class ProgressStore:
+    """
+    In-process task state, the source of truth for status queries.
+
+    Status transitions are flushed to the tasks table right away (batched with
+    whatever else is pending); progress-only changes are flushed every
+    `flush_interval` seconds and only when they moved by `min_delta` percent.
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = PROGRESS_FLUSH_INTERVAL,
+        min_delta: int = PROGRESS_FLUSH_MIN_DELTA,
+        max_terminal: int = PROGRESS_STORE_MAX_TERMINAL,
+    ):
+        self.flush_interval = flush_interval
+        self.min_delta = min_delta
+        self.max_terminal = max_terminal
+        self._states: OrderedDict[str, TaskState] = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        # stats
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def create(self, task_id: str, status: Status = Status.UPLOADING) -> TaskState:
+        state = TaskState(id=task_id, status=status, is_new=True, dirty=True)
+        self._states[task_id] = state
+        self._wakeup.set()
+        return state
+
+    def update(self, task_id: str, **fields) -> TaskState | None:
+        """Apply a status transition (or other non-progress change)."""
+        state = self._states.get(task_id)
+        if state is None:
+            return None
+        for key, value in fields.items():
+            setattr(state, key, value)
+        state.dirty = True
+        state.updated_at = time.monotonic()
+        self._states.move_to_end(task_id)
+        self._wakeup.set()
+        state.notify()
+        return state
+
+    def set_progress(self, task_id: str, percentage: int):
+        state = self._states.get(task_id)
+        if state is None or state.status in TERMINAL_STATUSES:
+            return
+        if percentage == state.percentage:
+            return
+        state.percentage = percentage
+        state.updated_at = time.monotonic()
+        if abs(percentage - state.flushed_percentage) >= self.min_delta:
+            state.dirty = True
+        state.notify()
+
+    def peek(self, task_id: str) -> TaskState | None:
+        """In-memory state only, without falling back to the database."""
+        return self._states.get(task_id)
+
+    async def get(self, task_id: str) -> TaskState | None:
+        state = self._states.get(task_id)
+        if state is None:
+            state = await self._load(task_id)
+        return state
+
+    async def wait_for_change(
+        self, state: TaskState, version: int, timeout: float
+    ) -> bool:
+        """Wait until the state changes past `version`, False on timeout."""
+        if state.version != version:
+            return True
+        try:
+            await asyncio.wait_for(state.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _load(self, task_id: str) -> TaskState | None:
+        """Load a task that is not in memory, e.g. from before a restart."""
+        async with get_session() as session:
+            result = await session.execute(select(Task).where(Task.id == task_id))
+            task = result.scalar_one_or_none()
+        if task is None:
+            return None
+        state = TaskState(
+            id=task.id,
+            status=Status(task.status),
+            percentage=task.percentage,
+            video_path=task.video_path,
+            output_path=task.output_path,
+            download_url=task.download_url,
+            flushed_percentage=task.percentage,
+        )
+        # a task that was running when the server stopped will never finish
+        if state.status not in TERMINAL_STATUSES:
+            state.status = Status.ERROR
+            state.dirty = True
+            self._wakeup.set()
+        self._states[task_id] = state
+        self._evict()
+        return state
+
+    async def flush(self):
+        """Write all dirty task states to the database in one transaction."""
+        async with self._flush_lock:
+            dirty = [s for s in self._states.values() if s.dirty]
+            if not dirty:
+                return
+            for state in dirty:
+                state.dirty = False
+            # snapshot before the await, progress may move while committing
+            snapshots = [(state, state.to_row()) for state in dirty]
+            new_rows = [row for state, row in snapshots if state.is_new]
+            rows = [row for state, row in snapshots if not state.is_new]
+            try:
+                async with get_session() as session:
+                    if new_rows:
+                        session.add_all(Task(**row) for row in new_rows)
+                    if rows:
+                        await session.execute(update(Task), rows)
+            except Exception as e:
+                for state in dirty:
+                    state.dirty = True
+                logger.error(f"Error flushing {len(dirty)} task states: {e}")
+                return
+            for state, row in snapshots:
+                state.is_new = False
+                state.flushed_percentage = row["percentage"]
+            self.flushes += 1
+            self.rows_flushed += len(dirty)
+            self._evict()
+
+    async def run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            # coalesce bursts of transitions into one write
+            await asyncio.sleep(min(0.1, self.flush_interval))
+
+    def _evict(self):
+        """Drop the oldest finished tasks that are already persisted."""
+        terminal = [
+            s
+            for s in self._states.values()
+            if s.status in TERMINAL_STATUSES and not s.dirty and not s.is_new
+        ]
+        for state in terminal[: max(0, len(terminal) - self.max_terminal)]:
+            del self._states[state.id]
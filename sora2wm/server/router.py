@@ -1,38 +1,121 @@
-from pathlib import Path
-from uuid import uuid4
+import json
 
-import aiofiles
-from fastapi import APIRouter, BackgroundTasks, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.requests import ClientDisconnect
 
-from sora2wm.server.schemas import WMRemoveResults
+from sora2wm.configs import (
+    ENCODING_PROFILES,
+    EVENTS_HEARTBEAT_INTERVAL,
+    UPLOAD_MAX_SIZE_MB,
+    WEBHOOK_ENABLED,
+)
+from sora2wm.server.schemas import Status, WMRemoveResults
+from sora2wm.server.progress_store import TERMINAL_STATUSES
+from sora2wm.server.streaming import file_response, tail_fragments
+from sora2wm.server.upload import (
+    UploadError,
+    UploadTooLarge,
+    get_boundary,
+    receive_multipart_upload,
+)
+from sora2wm.server.webhook import is_valid_webhook_url
 from sora2wm.server.worker import worker
 
 router = APIRouter()
 
 
-async def process_upload_and_queue(
-    task_id: str, video_content: bytes, video_path: Path
-):
+# the body is parsed by hand, describe the form for the OpenAPI docs
+_SUBMIT_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["video"],
+                    "properties": {
+                        "video": {"type": "string", "format": "binary"},
+                        "encoding_profile": {"type": "string"},
+                        "webhook_url": {"type": "string"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/submit_remove_task", openapi_extra=_SUBMIT_FORM_SCHEMA)
+async def submit_remove_task(request: Request):
+    """
+    Multipart form with a `video` file and optional `encoding_profile` and
+    `webhook_url` fields. The body is parsed straight from the socket so the
+    upload never sits in memory or in a spooled temp file.
+    """
+    max_size = UPLOAD_MAX_SIZE_MB * 1024 * 1024
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds {UPLOAD_MAX_SIZE_MB} MB",
+        # the rest of the body is not read, don't reuse the connection
+        headers={"Connection": "close"},
+    )
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size:
+        raise too_large
+    try:
+        boundary = get_boundary(request.headers.get("content-type"))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    task_id = await worker.create_task()
     try:
-        async with aiofiles.open(video_path, "wb") as f:
-            await f.write(video_content)
-        await worker.queue_task(task_id, video_path)
+        upload = await receive_multipart_upload(
+            request.stream(), boundary, worker.upload_dir, "video", max_size
+        )
+    except UploadTooLarge as e:
+        await worker.mark_task_error(task_id, str(e))
+        raise too_large
+    except UploadError as e:
+        await worker.mark_task_error(task_id, str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except ClientDisconnect:
+        await worker.mark_task_error(task_id, "Client disconnected during upload")
+        raise
     except Exception as e:
         await worker.mark_task_error(task_id, str(e))
+        raise HTTPException(status_code=500, detail="Failed to save upload.")
 
+    encoding_profile = upload.fields.get("encoding_profile") or None
+    webhook_url = upload.fields.get("webhook_url") or None
+    error = None
+    if encoding_profile is not None and encoding_profile not in ENCODING_PROFILES:
+        error = (
+            f"Unknown encoding profile: {encoding_profile}. "
+            f"Available: {', '.join(ENCODING_PROFILES)}"
+        )
+    elif webhook_url is not None and not WEBHOOK_ENABLED:
+        error = "Webhooks are disabled on this server."
+    elif webhook_url is not None and not is_valid_webhook_url(webhook_url):
+        error = "Invalid or not allowed webhook url."
+    if error is not None:
+        upload.path.unlink(missing_ok=True)
+        await worker.mark_task_error(task_id, error)
+        raise HTTPException(status_code=400, detail=error)
+    worker.set_webhook(task_id, webhook_url)
+    logger.info(
+        f"Task {task_id} upload saved: {upload.path} "
+        f"({upload.size} bytes, sha256 {upload.sha256})"
+    )
 
-@router.post("/submit_remove_task")
-async def submit_remove_task(
-    background_tasks: BackgroundTasks, video: UploadFile = File(...)
-):
-    task_id = await worker.create_task()
-    content = await video.read()
-    upload_filename = f"{uuid4()}_{video.filename}"
-    video_path = worker.upload_dir / upload_filename
-    background_tasks.add_task(process_upload_and_queue, task_id, content, video_path)
+    try:
+        await worker.queue_task(task_id, upload.path, encoding_profile)
+    except Exception as e:
+        await worker.mark_task_error(task_id, str(e))
+        raise HTTPException(status_code=500, detail="Failed to queue task.")
 
-    return {"task_id": task_id, "message": "Task submitted."}
+    return {"task_id": task_id, "message": "Task submitted.", "sha256": upload.sha256}
 
 
 @router.get("/get_results")
@@ -44,8 +127,37 @@ async def get_results(remove_task_id: str) -> WMRemoveResults:
     return result
 
 
+@router.get("/events/{task_id}")
+async def task_events(task_id: str, request: Request):
+    state = await worker.get_task_state(task_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Task does not exist.")
+
+    async def event_stream():
+        version = -1
+        while True:
+            if state.version != version:
+                version = state.version
+                data = json.dumps(state.to_results().model_dump(mode="json"))
+                yield f"event: progress\nid: {version}\ndata: {data}\n\n"
+                if state.status in TERMINAL_STATUSES:
+                    return
+            elif not await worker.store.wait_for_change(
+                state, version, EVENTS_HEARTBEAT_INTERVAL
+            ):
+                if await request.is_disconnected():
+                    return
+                yield ": heartbeat\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/download/{task_id}")
-async def download_video(task_id: str):
+async def download_video(task_id: str, request: Request):
     result = await worker.get_task_status(task_id)
     if result is None:
         raise HTTPException(status_code=404, detail="Task does not exist.")
@@ -57,6 +169,30 @@ async def download_video(task_id: str):
     if output_path is None or not output_path.exists():
         raise HTTPException(status_code=404, detail="Output file does not exits")
 
-    return FileResponse(
-        path=output_path, filename=output_path.name, media_type="video/mp4"
+    return file_response(output_path, request.headers.get("range"), "video/mp4")
+
+
+@router.get("/stream/{task_id}")
+async def stream_video(task_id: str, request: Request):
+    result = await worker.get_task_status(task_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Task does not exist.")
+    if result.status in (Status.UPLOADING, Status.ERROR):
+        raise HTTPException(
+            status_code=400, detail=f"Task cannot be streamed: {result.status}"
+        )
+    output_path = await worker.get_output_path(task_id)
+    if output_path is None:
+        raise HTTPException(status_code=404, detail="Output file does not exits")
+    if result.status == Status.FINISHED:
+        if not output_path.exists():
+            raise HTTPException(status_code=404, detail="Output file does not exits")
+        return file_response(output_path, request.headers.get("range"), "video/mp4")
+
+    async def is_running() -> bool:
+        status = await worker.get_task_status(task_id)
+        return status is not None and status.status == Status.PROCESSING
+
+    return StreamingResponse(
+        tail_fragments(output_path, is_running), media_type="video/mp4"
     )
@@ -0,0 +1,148 @@
+import asyncio
+import re
+import struct
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable
+
+import aiofiles
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+
+from sora2wm.configs import STREAM_POLL_INTERVAL
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _read_box_header(f, offset: int) -> tuple[int, bytes] | None:
+    """Return (size, type) of the box at `offset`, None if the header is cut short."""
+    f.seek(offset)
+    header = f.read(16)
+    if len(header) < 8:
+        return None
+    size, box_type = struct.unpack(">I4s", header[:8])
+    if size == 1:
+        if len(header) < 16:
+            return None
+        size = struct.unpack(">Q", header[8:16])[0]
+    return size, box_type
+
+
+def complete_boxes_end(path: Path, offset: int) -> int:
+    """
+    Return the end offset of the last complete top-level MP4 box after `offset`.
+
+    A trailing moof is held back until its mdat is complete, so a reader never
+    receives a fragment header without the samples it describes.
+    """
+    end = offset
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        while True:
+            box = _read_box_header(f, end)
+            if box is None:
+                break
+            size, box_type = box
+            if size < 8 or end + size > file_size:
+                # size 0 (box extends to EOF) or not fully written yet
+                break
+            if box_type == b"moof":
+                next_box = _read_box_header(f, end + size)
+                if next_box is None:
+                    break
+                next_size, next_type = next_box
+                if next_type != b"mdat" or next_size < 8:
+                    break
+                if end + size + next_size > file_size:
+                    break
+                size += next_size
+            end += size
+    return end
+
+
+async def _read_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """Read [start, end) of a file in chunks."""
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = await f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def tail_fragments(
+    path: Path,
+    is_running: Callable[[], Awaitable[bool]],
+    poll_interval: float = STREAM_POLL_INTERVAL,
+) -> AsyncIterator[bytes]:
+    """
+    Stream complete boxes of a fragmented MP4 while it is being written.
+
+    Polls the file for newly completed fragments until `is_running` returns
+    False, then sends whatever is left.
+    """
+    sent = 0
+    while True:
+        running = await is_running()
+        if not path.exists():
+            if not running:
+                return
+            await asyncio.sleep(poll_interval)
+            continue
+        if running:
+            ready = await asyncio.to_thread(complete_boxes_end, path, sent)
+        else:
+            ready = path.stat().st_size
+        if ready > sent:
+            async for chunk in _read_range(path, sent, ready):
+                yield chunk
+            sent = ready
+        if not running:
+            return
+        await asyncio.sleep(poll_interval)
+
+
+def file_response(path: Path, range_header: str | None, media_type: str):
+    """Serve a finished file, honouring a single `bytes=` Range request."""
+    headers = {"Accept-Ranges": "bytes"}
+    match = _RANGE_RE.match(range_header.strip()) if range_header else None
+    if match is None:
+        return FileResponse(
+            path=path, filename=path.name, media_type=media_type, headers=headers
+        )
+
+    file_size = path.stat().st_size
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), file_size - 1) if last else file_size - 1
+    elif last:
+        # suffix range: the final N bytes
+        start = max(0, file_size - int(last))
+        end = file_size - 1
+    else:
+        start, end = 0, file_size - 1
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"},
+        )
+
+    headers.update(
+        {
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": f'attachment; filename="{path.name}"',
+        }
+    )
+    return StreamingResponse(
+        _read_range(path, start, end + 1),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
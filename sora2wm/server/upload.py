@@ -0,0 +1,162 @@
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from sora2wm.configs import UPLOAD_MAX_FIELD_SIZE
+
+_DEFAULT_FILENAME = "video.mp4"
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+@dataclass
+class UploadResult:
+    path: Path
+    size: int
+    sha256: str
+    fields: dict = field(default_factory=dict)
+
+
+def get_boundary(content_type: str | None) -> bytes:
+    if not content_type:
+        raise UploadError("Missing Content-Type header")
+    media_type, params = parse_options_header(content_type)
+    if media_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise UploadError("Expected multipart/form-data with a boundary")
+    return params[b"boundary"]
+
+
+async def receive_multipart_upload(
+    stream: AsyncIterator[bytes],
+    boundary: bytes,
+    upload_dir: Path,
+    file_field: str,
+    max_size: int,
+) -> UploadResult:
+    """
+    Parse a multipart body as it arrives from the socket.
+
+    The part named `file_field` is written to `upload_dir` chunk by chunk while
+    its SHA-256 is updated; other parts are kept as small text fields. Raises
+    UploadTooLarge as soon as the body passes `max_size` bytes, without
+    reading the rest of it. The partially written file is removed on error.
+    """
+    # parser callbacks are sync, collect them and handle after each write
+    events = []
+    header_field = bytearray()
+    header_value = bytearray()
+    headers = {}
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("headers", dict(headers)))
+        headers.clear()
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    part_path = upload_dir / f"{uuid4()}.part"
+    digest = hashlib.sha256()
+    fields = {}
+    received = 0
+    file_size = 0
+    filename = None
+    out = None
+    # name of the current text field, or None while inside the file part
+    current_field = None
+    current_value = bytearray()
+    in_file = False
+    try:
+        async for chunk in stream:
+            received += len(chunk)
+            if received > max_size:
+                raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+            parser.write(chunk)
+            for kind, payload in events:
+                if kind == "headers":
+                    _, options = parse_options_header(
+                        payload.get(b"content-disposition", b"")
+                    )
+                    name = options.get(b"name", b"").decode()
+                    if name == file_field:
+                        if out is not None:
+                            raise UploadError(f"Duplicate {file_field} part")
+                        in_file = True
+                        raw_name = options.get(b"filename", b"").decode(errors="ignore")
+                        filename = Path(raw_name).name or _DEFAULT_FILENAME
+                        out = await aiofiles.open(part_path, "wb")
+                    else:
+                        in_file = False
+                        current_field = name
+                        current_value.clear()
+                elif kind == "data":
+                    if in_file:
+                        file_size += len(payload)
+                        digest.update(payload)
+                        await out.write(payload)
+                    else:
+                        current_value.extend(payload)
+                        if len(current_value) > UPLOAD_MAX_FIELD_SIZE:
+                            raise UploadError(f"Field {current_field} is too large")
+                elif kind == "end":
+                    if in_file:
+                        await out.close()
+                        in_file = False
+                    elif current_field:
+                        fields[current_field] = current_value.decode()
+                        current_field = None
+            events.clear()
+        parser.finalize()
+        if out is None:
+            raise UploadError(f"Missing {file_field} part")
+        if not out.closed:
+            raise UploadError("Upload ended before the file part was complete")
+        video_path = upload_dir / f"{part_path.stem}_{filename}"
+        await aiofiles.os.replace(part_path, video_path)
+    except BaseException:
+        if out is not None and not out.closed:
+            await out.close()
+        part_path.unlink(missing_ok=True)
+        raise
+    return UploadResult(video_path, file_size, digest.hexdigest(), fields)
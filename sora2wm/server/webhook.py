@@ -0,0 +1,129 @@
+import asyncio
+import ipaddress
+import json
+import socket
+from urllib.parse import urlparse
+
+import certifi
+import urllib3
+from loguru import logger
+
+from sora2wm.configs import (
+    WEBHOOK_ALLOWED_HOSTS,
+    WEBHOOK_ENABLED,
+    WEBHOOK_RETRIES,
+    WEBHOOK_TIMEOUT,
+)
+
+
+class WebhookRejected(Exception):
+    pass
+
+
+def is_valid_webhook_url(
+    url: str,
+    enabled: bool = WEBHOOK_ENABLED,
+    allowed_hosts: tuple = WEBHOOK_ALLOWED_HOSTS,
+) -> bool:
+    """Cheap checks at submission time; the address is vetted on delivery."""
+    if not enabled:
+        return False
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    if parsed.username or parsed.password:
+        return False
+    return not allowed_hosts or parsed.hostname.lower() in allowed_hosts
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def resolve_public_address(host: str, port: int) -> str:
+    """
+    Resolve `host` and return an address to connect to.
+
+    Every resolved address must be public, so a name that also points at
+    loopback, private, link-local or reserved space is rejected outright.
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise WebhookRejected(f"cannot resolve {host}: {e}")
+    addresses = [info[4][0] for info in infos]
+    if not addresses:
+        raise WebhookRejected(f"cannot resolve {host}")
+    for address in addresses:
+        if not is_public_address(address):
+            raise WebhookRejected(f"{host} resolves to non-public address {address}")
+    return addresses[0]
+
+
+def post_webhook(url: str, payload: dict, timeout: float) -> int:
+    """
+    POST the payload to the vetted address of the url's host.
+
+    The connection goes to the address that was checked, not to a second DNS
+    lookup, so the name cannot be rebound to an internal address in between.
+    TLS still uses the hostname for SNI and certificate checks. Redirects are
+    not followed.
+    """
+    parsed = urlparse(url)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    address = resolve_public_address(parsed.hostname, port)
+    if parsed.scheme == "https":
+        pool = urllib3.HTTPSConnectionPool(
+            address,
+            port,
+            server_hostname=parsed.hostname,
+            assert_hostname=parsed.hostname,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=certifi.where(),
+        )
+    else:
+        pool = urllib3.HTTPConnectionPool(address, port)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += f"?{parsed.query}"
+    try:
+        response = pool.urlopen(
+            "POST",
+            path,
+            body=json.dumps(payload).encode(),
+            headers={"Host": parsed.netloc, "Content-Type": "application/json"},
+            redirect=False,
+            retries=False,
+            timeout=timeout,
+        )
+        return response.status
+    finally:
+        pool.close()
+
+
+async def deliver_webhook(
+    url: str,
+    payload: dict,
+    retries: int = WEBHOOK_RETRIES,
+    timeout: float = WEBHOOK_TIMEOUT,
+) -> bool:
+    """POST the payload as JSON, retrying with exponential backoff."""
+    for attempt in range(1, retries + 1):
+        try:
+            status = await asyncio.to_thread(post_webhook, url, payload, timeout)
+            if status < 300:
+                logger.info(f"Webhook delivered to {url} for task {payload['task_id']}")
+                return True
+            error = f"HTTP {status}"
+        except WebhookRejected as e:
+            logger.warning(f"Webhook to {url} rejected: {e}")
+            return False
+        except urllib3.exceptions.HTTPError as e:
+            error = str(e)
+        logger.warning(f"Webhook to {url} failed (attempt {attempt}/{retries}): {error}")
+        if attempt < retries:
+            await asyncio.sleep(2 ** (attempt - 1))
+    return False
@@ -5,66 +5,78 @@ from pathlib import Path
 from uuid import uuid4
 
 from loguru import logger
-from sqlalchemy import select
 
-from sora2wm.configs import WORKING_DIR
-from sora2wm.core import Sora2WM
-from sora2wm.server.db import get_session
-from sora2wm.server.models import Task
+from sora2wm.configs import SERVER_NUM_WORKERS, WORKING_DIR
+from sora2wm.server.progress_store import ProgressStore, TaskState
 from sora2wm.server.schemas import Status, WMRemoveResults
+from sora2wm.server.webhook import deliver_webhook
+from sora2wm.server.worker_pool import InferenceWorkerPool, PoolTask
 
 
 class WMRemoveTaskWorker:
     def __init__(self) -> None:
         self.queue = Queue()
-        self.Sora2_wm = None
+        self.store = ProgressStore()
+        self._webhook_tasks = set()
+        self.pool = None
+        self.loop = None
+        self.num_workers = SERVER_NUM_WORKERS
         self.output_dir = WORKING_DIR
         self.upload_dir = WORKING_DIR / "uploads"
         self.upload_dir.mkdir(exist_ok=True, parents=True)
 
     async def initialize(self):
-        logger.info("Initializing Sora2WM models...")
-        self.Sora2_wm = Sora2WM()
-        logger.info("Sora2WM models initialized")
+        logger.info("Starting Sora2WM worker pool...")
+        self.loop = asyncio.get_running_loop()
+        self.pool = InferenceWorkerPool(
+            on_progress=self._on_progress,
+            on_done=self._on_done,
+            on_error=self._on_error,
+            num_workers=self.num_workers,
+        )
+        self.pool.start()
+
+    async def shutdown(self):
+        if self.pool is not None:
+            await asyncio.to_thread(self.pool.stop)
+            self.pool = None
+        await self.store.flush()
 
     async def create_task(self) -> str:
         task_uuid = str(uuid4())
-        async with get_session() as session:
-            task = Task(
-                id=task_uuid,
-                video_path="",  # 暂时为空，后续会更新
-                status=Status.UPLOADING,
-                percentage=0,
-            )
-            session.add(task)
+        self.store.create(task_uuid, Status.UPLOADING)
         logger.info(f"Task {task_uuid} created with UPLOADING status")
         return task_uuid
 
-    async def queue_task(self, task_id: str, video_path: Path):
-        async with get_session() as session:
-            result = await session.execute(select(Task).where(Task.id == task_id))
-            task = result.scalar_one()
-            task.video_path = str(video_path)
-            task.status = Status.PROCESSING
-            task.percentage = 0
-
-        self.queue.put_nowait((task_id, video_path))
+    def set_webhook(self, task_id: str, webhook_url: str | None):
+        # in memory only, like the rest of the delivery state
+        state = self.store.peek(task_id)
+        if state is not None:
+            state.webhook_url = webhook_url
+
+    async def queue_task(
+        self, task_id: str, video_path: Path, encoding_profile: str | None = None
+    ):
+        self.store.update(
+            task_id,
+            video_path=str(video_path),
+            status=Status.PROCESSING,
+            percentage=0,
+        )
+        self.queue.put_nowait((task_id, video_path, encoding_profile))
         logger.info(f"Task {task_id} queued for processing: {video_path}")
 
     async def mark_task_error(self, task_id: str, error_msg: str):
-        async with get_session() as session:
-            result = await session.execute(select(Task).where(Task.id == task_id))
-            task = result.scalar_one_or_none()
-            if task:
-                task.status = Status.ERROR
-                task.percentage = 0
+        state = self.store.update(task_id, status=Status.ERROR, percentage=0)
         logger.error(f"Task {task_id} marked as ERROR: {error_msg}")
+        if state is not None:
+            self._notify_webhook(state, error_msg)
 
     async def run(self):
         logger.info("Worker started, waiting for tasks...")
         while True:
-            task_uuid, video_path = await self.queue.get()
-            logger.info(f"Processing task {task_uuid}: {video_path}")
+            task_uuid, video_path, encoding_profile = await self.queue.get()
+            logger.info(f"Dispatching task {task_uuid}: {video_path}")
 
             try:
                 timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
@@ -72,82 +84,74 @@ class WMRemoveTaskWorker:
                 output_filename = f"{task_uuid}_{timestamp}{file_suffix}"
                 output_path = self.output_dir / output_filename
 
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(Task).where(Task.id == task_uuid)
-                    )
-                    task = result.scalar_one()
-                    task.status = Status.PROCESSING
-                    task.percentage = 10
-
-                loop = asyncio.get_event_loop()
-
-                def progress_callback(percentage: int):
-                    asyncio.run_coroutine_threadsafe(
-                        self._update_progress(task_uuid, percentage), loop
-                    )
-
-                await asyncio.to_thread(
-                    self.Sora2_wm.run, video_path, output_path, progress_callback
+                # output path is known up front so /stream can serve
+                # fragments while running
+                self.store.update(
+                    task_uuid,
+                    status=Status.PROCESSING,
+                    percentage=10,
+                    output_path=str(output_path),
                 )
 
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(Task).where(Task.id == task_uuid)
-                    )
-                    task = result.scalar_one()
-                    task.status = Status.FINISHED
-                    task.percentage = 100
-                    task.output_path = str(output_path)
-                    task.download_url = f"/download/{task_uuid}"
-
-                logger.info(
-                    f"Task {task_uuid} completed successfully, output: {output_path}"
+                self.pool.submit(
+                    PoolTask(task_uuid, video_path, output_path, encoding_profile)
                 )
 
             except Exception as e:
-                logger.error(f"Error processing task {task_uuid}: {e}")
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(Task).where(Task.id == task_uuid)
-                    )
-                    task = result.scalar_one()
-                    task.status = Status.ERROR
-                    task.percentage = 0
+                await self.mark_task_error(task_uuid, str(e))
 
             finally:
                 self.queue.task_done()
 
-    async def _update_progress(self, task_id: str, percentage: int):
-        try:
-            async with get_session() as session:
-                result = await session.execute(select(Task).where(Task.id == task_id))
-                task = result.scalar_one_or_none()
-                if task:
-                    task.percentage = percentage
-                    logger.debug(f"Task {task_id} progress updated to {percentage}%")
-        except Exception as e:
-            logger.error(f"Error updating progress for task {task_id}: {e}")
+    # pool callbacks run on the pool monitor thread, the store lives on the loop
+    def _on_progress(self, task_id: str, percentage: int):
+        self.loop.call_soon_threadsafe(self.store.set_progress, task_id, percentage)
+
+    def _on_done(self, task_id: str, output_path: str):
+        self.loop.call_soon_threadsafe(self._mark_task_finished, task_id, output_path)
+
+    def _on_error(self, task_id: str, error_msg: str):
+        asyncio.run_coroutine_threadsafe(
+            self.mark_task_error(task_id, error_msg), self.loop
+        )
+
+    def _mark_task_finished(self, task_id: str, output_path: str):
+        state = self.store.update(
+            task_id,
+            status=Status.FINISHED,
+            percentage=100,
+            output_path=output_path,
+            download_url=f"/download/{task_id}",
+        )
+        logger.info(f"Task {task_id} completed successfully, output: {output_path}")
+        if state is not None:
+            self._notify_webhook(state)
+
+    def _notify_webhook(self, state: TaskState, error: str | None = None):
+        if not state.webhook_url:
+            return
+        payload = {"task_id": state.id, **state.to_results().model_dump(mode="json")}
+        if error is not None:
+            payload["error"] = error
+        task = asyncio.create_task(deliver_webhook(state.webhook_url, payload))
+        # keep a reference until delivery finishes
+        self._webhook_tasks.add(task)
+        task.add_done_callback(self._webhook_tasks.discard)
 
     async def get_task_status(self, task_id: str) -> WMRemoveResults | None:
-        async with get_session() as session:
-            result = await session.execute(select(Task).where(Task.id == task_id))
-            task = result.scalar_one_or_none()
-            if task is None:
-                return None
-            return WMRemoveResults(
-                percentage=task.percentage,
-                status=Status(task.status),
-                download_url=task.download_url,
-            )
+        state = await self.store.get(task_id)
+        if state is None:
+            return None
+        return state.to_results()
+
+    async def get_task_state(self, task_id: str) -> TaskState | None:
+        return await self.store.get(task_id)
 
     async def get_output_path(self, task_id: str) -> Path | None:
-        async with get_session() as session:
-            result = await session.execute(select(Task).where(Task.id == task_id))
-            task = result.scalar_one_or_none()
-            if task is None or task.output_path is None:
-                return None
-            return Path(task.output_path)
+        state = await self.store.get(task_id)
+        if state is None or state.output_path is None:
+            return None
+        return Path(state.output_path)
 
 
 worker = WMRemoveTaskWorker()
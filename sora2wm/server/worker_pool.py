@@ -0,0 +1,317 @@
+"""
+多进程推理工作池
+
+每个工作进程持有自己的Sora2WM实例，从共享的任务队列中取任务处理，
+一个长视频只占用一个工作进程，不会阻塞其它上传的任务。
+工作进程处理指定数量的任务或常驻内存超过阈值后主动退出并由新进程替换，以回收泄漏的内存。
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+
+from sora2wm.configs import (
+    SERVER_NUM_WORKERS,
+    SERVER_WORKER_MAX_RSS_MB,
+    SERVER_WORKER_MAX_TASKS,
+    SERVER_WORKER_THREADS,
+)
+
+# 工作进程发给主进程的事件类型
+_EVENT_READY = "ready"
+_EVENT_START = "start"
+_EVENT_PROGRESS = "progress"
+_EVENT_DONE = "done"
+_EVENT_ERROR = "error"
+_EVENT_RETIRE = "retire"
+
+
+@dataclass
+class PoolTask:
+    """提交给工作池的一个去水印任务"""
+
+    task_id: str
+    video_path: Path
+    output_path: Path
+    encoding_profile: str | None = None
+
+
+def _worker_main(
+    worker_id: int,
+    task_queue,
+    event_queue,
+    num_threads: int,
+    max_tasks: int,
+    max_rss_mb: int,
+):
+    """
+    工作进程入口：加载模型后循环处理任务
+
+    参数:
+    - worker_id: 工作进程编号
+    - task_queue: 共享任务队列，收到None时退出
+    - event_queue: 发往主进程的事件队列
+    - num_threads: 推理线程数，0表示不限制
+    - max_tasks: 处理多少个任务后退出，0表示不限制
+    - max_rss_mb: 常驻内存超过多少MB后退出，0表示不限制
+    """
+    import psutil
+    import torch
+
+    from sora2wm.core import Sora2WM
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    wm = Sora2WM()
+    process = psutil.Process()
+    event_queue.put((_EVENT_READY, worker_id, None, None))
+
+    tasks_done = 0
+    while True:
+        task = task_queue.get()
+        if task is None:
+            return
+        event_queue.put((_EVENT_START, worker_id, task.task_id, None))
+
+        last_percentage = -1
+
+        def progress_callback(percentage: int):
+            nonlocal last_percentage
+            if percentage != last_percentage:
+                last_percentage = percentage
+                event_queue.put((_EVENT_PROGRESS, worker_id, task.task_id, percentage))
+
+        try:
+            wm.run(
+                task.video_path,
+                task.output_path,
+                progress_callback,
+                streaming=True,
+                pipelined=True,
+                encoding_profile=task.encoding_profile,
+                fragmented=True,
+            )
+            event_queue.put((_EVENT_DONE, worker_id, task.task_id, str(task.output_path)))
+        except Exception as e:
+            event_queue.put((_EVENT_ERROR, worker_id, task.task_id, str(e)))
+
+        tasks_done += 1
+        rss_mb = process.memory_info().rss / 1024 / 1024
+        if (max_tasks and tasks_done >= max_tasks) or (max_rss_mb and rss_mb > max_rss_mb):
+            event_queue.put(
+                (_EVENT_RETIRE, worker_id, None, f"任务数 {tasks_done}, RSS {rss_mb:.0f}MB")
+            )
+            return
+
+
+class InferenceWorkerPool:
+    """
+    多进程推理工作池
+
+    主进程中的监控线程接收工作进程的事件并通过回调通知调用方，
+    同时替换主动退出或意外退出的工作进程；意外退出时正在处理的任务按失败处理。
+    回调在监控线程中调用。
+    """
+
+    def __init__(
+        self,
+        on_progress: Callable[[str, int], None],
+        on_done: Callable[[str, str], None],
+        on_error: Callable[[str, str], None],
+        num_workers: int = SERVER_NUM_WORKERS,
+        max_tasks: int = SERVER_WORKER_MAX_TASKS,
+        max_rss_mb: int = SERVER_WORKER_MAX_RSS_MB,
+        num_threads: int = SERVER_WORKER_THREADS,
+    ):
+        """
+        初始化工作池
+
+        参数:
+        - on_progress: 进度回调 (任务ID, 百分比)
+        - on_done: 完成回调 (任务ID, 输出路径)
+        - on_error: 失败回调 (任务ID, 错误信息)
+        - num_workers: 工作进程数量
+        - max_tasks: 每个工作进程处理多少个任务后被替换，0表示不限制
+        - max_rss_mb: 工作进程常驻内存超过多少MB后被替换，0表示不限制
+        - num_threads: 每个工作进程的推理线程数，0表示按CPU核数平均分配
+        """
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.num_workers = max(1, num_workers)
+        self.max_tasks = max_tasks
+        self.max_rss_mb = max_rss_mb
+        self.num_threads = num_threads or max(
+            1, (os.cpu_count() or 1) // self.num_workers
+        )
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._task_queue = self._ctx.Queue()
+        self._event_queue = self._ctx.Queue()
+        # 工作进程编号 -> 进程对象
+        self._processes = {}
+        # 工作进程编号 -> 正在处理的任务ID
+        self._running = {}
+        self._next_worker_id = 0
+        self._stopping = threading.Event()
+        self._monitor = None
+        # 统计信息
+        self.recycled = 0
+
+    def start(self):
+        """启动所有工作进程和监控线程"""
+        for _ in range(self.num_workers):
+            self._spawn()
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name="worker-pool-monitor", daemon=True
+        )
+        self._monitor.start()
+        logger.info(
+            f"推理工作池已启动: {self.num_workers} 个进程, 每进程 {self.num_threads} 线程, "
+            f"回收条件: 任务数 {self.max_tasks or '不限'}, RSS {self.max_rss_mb or '不限'}MB"
+        )
+
+    def submit(self, task: PoolTask):
+        """
+        提交任务，由空闲的工作进程处理
+
+        参数:
+        - task: 去水印任务
+        """
+        self._task_queue.put(task)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        停止工作池，等待空闲的工作进程退出，超时后强制终止
+
+        先停止监控线程，之后只有当前线程访问工作进程表；等待期间继续分发工作进程事件，
+        已完成任务的结果不会丢失，被强制终止的进程中正在处理的任务按失败处理
+
+        参数:
+        - timeout: 等待工作进程退出的秒数
+        """
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        for _ in self._processes:
+            self._task_queue.put(None)
+        deadline = time.monotonic() + timeout
+        # 事件队列写满时工作进程无法退出，等待的同时持续读取事件
+        while time.monotonic() < deadline and any(
+            process.is_alive() for process in self._processes.values()
+        ):
+            self._dispatch_events(min(0.2, max(0.0, deadline - time.monotonic())))
+        self._dispatch_events(0.0)
+        for worker_id, process in self._processes.items():
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1.0)
+            task_id = self._running.pop(worker_id, None)
+            if task_id is not None:
+                self.on_error(task_id, "服务停止，任务被中断")
+        self._processes.clear()
+        logger.info("推理工作池已停止")
+
+    def _spawn(self):
+        """启动一个新的工作进程"""
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker_id,
+                self._task_queue,
+                self._event_queue,
+                self.num_threads,
+                self.max_tasks,
+                self.max_rss_mb,
+            ),
+            name=f"sora2wm-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+        logger.info(f"工作进程 {worker_id} 已启动 (pid {process.pid})")
+
+    def _replace(self, worker_id: int, reason: str):
+        """回收一个工作进程并启动替换进程"""
+        process = self._processes.pop(worker_id, None)
+        if process is None:
+            # 已经被回收过（例如退出检查先于RETIRE事件发现了进程退出）
+            return
+        process.join(timeout=5.0)
+        if process.is_alive():
+            process.terminate()
+        self.recycled += 1
+        logger.info(f"回收工作进程 {worker_id}: {reason}")
+        if not self._stopping.is_set():
+            self._spawn()
+
+    def _monitor_loop(self):
+        """监控线程：分发工作进程事件，并定期替换退出的工作进程"""
+        while not self._stopping.is_set():
+            # 每轮最多分发1秒的事件，持续的进度事件不会推迟退出检查
+            self._dispatch_events(1.0)
+            self._check_processes()
+
+    def _dispatch_events(self, max_seconds: float):
+        """
+        分发事件队列中的事件，直到队列为空或超过max_seconds秒
+
+        参数:
+        - max_seconds: 最长分发时间，0表示只分发已到达的事件
+        """
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._event_queue.get(timeout=remaining)
+                elif max_seconds > 0:
+                    return
+                else:
+                    item = self._event_queue.get_nowait()
+            except queue.Empty:
+                return
+            event, worker_id, task_id, payload = item
+            try:
+                self._handle_event(event, worker_id, task_id, payload)
+            except Exception as e:
+                logger.error(f"处理工作进程事件 {event} 出错: {e}")
+
+    def _handle_event(self, event: str, worker_id: int, task_id, payload):
+        """处理一个工作进程事件"""
+        if event == _EVENT_READY:
+            logger.info(f"工作进程 {worker_id} 模型加载完成")
+        elif event == _EVENT_START:
+            self._running[worker_id] = task_id
+        elif event == _EVENT_PROGRESS:
+            self.on_progress(task_id, payload)
+        elif event == _EVENT_DONE:
+            self._running.pop(worker_id, None)
+            self.on_done(task_id, payload)
+        elif event == _EVENT_ERROR:
+            self._running.pop(worker_id, None)
+            self.on_error(task_id, payload)
+        elif event == _EVENT_RETIRE:
+            self._replace(worker_id, payload)
+
+    def _check_processes(self):
+        """替换意外退出的工作进程，其正在处理的任务按失败处理"""
+        # 先分发已到达的事件，避免把进程退出前已发出的完成事件当作失败
+        self._dispatch_events(0.0)
+        for worker_id, process in list(self._processes.items()):
+            # 正常退出（退出码0）的进程已发送RETIRE事件，由事件处理回收
+            if process.is_alive() or process.exitcode == 0:
+                continue
+            task_id = self._running.pop(worker_id, None)
+            if task_id is not None:
+                self.on_error(task_id, f"工作进程意外退出 (exitcode {process.exitcode})")
+            self._replace(worker_id, f"意外退出 (exitcode {process.exitcode})")
@@ -0,0 +1,217 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from sora2wm.utils import encode_utils
+from sora2wm.utils.encode_utils import EncoderSink, _write_all
+
+
+class PartialWritev:
+    """os.writev that writes at most `limit` bytes per call."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.calls = []
+
+    def __call__(self, fd, buffers):
+        data = b"".join(bytes(buffer) for buffer in buffers)[: self.limit]
+        self.calls.append(len(data))
+        return os.write(fd, data)
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    yield read_fd, write_fd
+    for fd in (read_fd, write_fd):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def read_exactly(fd, size):
+    data = b""
+    while len(data) < size:
+        data += os.read(fd, size - len(data))
+    return data
+
+
+def test_write_all_writes_every_buffer(pipe):
+    read_fd, write_fd = pipe
+    chunks = [b"abc", b"", b"defgh", b"i"]
+    _write_all(write_fd, [memoryview(chunk) for chunk in chunks])
+    assert read_exactly(read_fd, 9) == b"abcdefghi"
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 7])
+def test_write_all_resumes_after_partial_writev(pipe, monkeypatch, limit):
+    read_fd, write_fd = pipe
+    writev = PartialWritev(limit)
+    monkeypatch.setattr(os, "writev", writev)
+    chunks = [b"abc", b"defgh", b"ij", b"k"]
+
+    _write_all(write_fd, [memoryview(chunk) for chunk in chunks])
+
+    assert read_exactly(read_fd, 11) == b"abcdefghijk"
+    assert sum(writev.calls) == 11
+    assert all(n > 0 for n in writev.calls)
+
+
+def test_write_all_without_writev(pipe, monkeypatch):
+    read_fd, write_fd = pipe
+    monkeypatch.delattr(os, "writev")
+    _write_all(write_fd, [memoryview(b"abc"), memoryview(b"de")])
+    assert read_exactly(read_fd, 5) == b"abcde"
+
+
+def test_write_all_raises_on_closed_reader(pipe):
+    read_fd, write_fd = pipe
+    os.close(read_fd)
+    with pytest.raises(BrokenPipeError):
+        _write_all(write_fd, [memoryview(b"abc")])
+
+
+class FakeProcess:
+    """Stands in for the ffmpeg process; stdin is a real pipe drained by a thread."""
+
+    def __init__(self, args, **kwargs):
+        self.args = args
+        read_fd, write_fd = os.pipe()
+        self.stdin = os.fdopen(write_fd, "wb", buffering=0)
+        self.stderr = io.BytesIO(b"")
+        self.returncode = None
+        self.received = bytearray()
+        self._reader = os.fdopen(read_fd, "rb", buffering=0)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while chunk := self._reader.read(65536):
+            self.received.extend(chunk)
+        self._reader.close()
+
+    def wait(self):
+        self._thread.join()
+        if self.returncode is None:
+            self.returncode = 0
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+
+class ExitedProcess(FakeProcess):
+    """An ffmpeg process that has already exited with an error."""
+
+    def _drain(self):
+        self._reader.close()
+
+    def __init__(self, args, **kwargs):
+        super().__init__(args, **kwargs)
+        self._thread.join()
+        self.returncode = 1
+
+
+@pytest.fixture
+def fake_popen(monkeypatch):
+    monkeypatch.setattr(encode_utils.subprocess, "Popen", FakeProcess)
+
+
+def make_sink(tmp_path, frames_per_write):
+    return EncoderSink(
+        tmp_path / "out.mp4",
+        width=4,
+        height=2,
+        fps=25,
+        output_options={"vcodec": "libx264"},
+        frames_per_write=frames_per_write,
+        pipe_buffer_size=0,
+    )
+
+
+def make_frame(value):
+    return np.full((2, 4, 3), value, dtype=np.uint8)
+
+
+def test_encoder_sink_batches_writes_and_runs_callbacks(tmp_path, fake_popen):
+    flushed = []
+    sink = make_sink(tmp_path, frames_per_write=3)
+    for i in range(4):
+        sink.write(make_frame(i), on_flushed=lambda i=i: flushed.append(i))
+        # callbacks only run once the batch is written
+        assert flushed == list(range(3 if i >= 2 else 0))
+    assert sink.frames_written == 3
+
+    sink.close()
+    assert flushed == [0, 1, 2, 3]
+    assert sink.frames_written == 4
+    expected = b"".join(make_frame(i).tobytes() for i in range(4))
+    assert bytes(sink.process.received) == expected
+
+
+def test_encoder_sink_callback_lets_caller_reuse_buffer(tmp_path, fake_popen):
+    buffer = make_frame(0)
+    sink = make_sink(tmp_path, frames_per_write=2)
+    for value in (1, 2, 3):
+        # the caller may only overwrite the buffer after the previous write
+        # was flushed, so flush explicitly before reusing it
+        buffer[:] = value
+        sink.write(buffer)
+        sink.flush()
+    sink.close()
+    expected = b"".join(make_frame(value).tobytes() for value in (1, 2, 3))
+    assert bytes(sink.process.received) == expected
+
+
+def test_encoder_sink_writes_non_contiguous_frames(tmp_path, fake_popen):
+    sink = make_sink(tmp_path, frames_per_write=1)
+    wide = np.arange(2 * 8 * 3, dtype=np.uint8).reshape(2, 8, 3)
+    frame = wide[:, ::2]
+    assert not frame.flags.c_contiguous
+    sink.write(frame)
+    sink.close()
+    assert bytes(sink.process.received) == np.ascontiguousarray(frame).tobytes()
+
+
+def test_encoder_sink_rejects_wrong_frame_shape(tmp_path, fake_popen):
+    sink = make_sink(tmp_path, frames_per_write=1)
+    with pytest.raises(ValueError):
+        sink.write(np.zeros((3, 4, 3), dtype=np.uint8))
+    sink.close()
+
+
+def test_encoder_sink_partial_writev(tmp_path, fake_popen, monkeypatch):
+    monkeypatch.setattr(os, "writev", PartialWritev(5))
+    sink = make_sink(tmp_path, frames_per_write=3)
+    for i in range(5):
+        sink.write(make_frame(i))
+    sink.close()
+    expected = b"".join(make_frame(i).tobytes() for i in range(5))
+    assert bytes(sink.process.received) == expected
+
+
+def test_encoder_sink_broken_pipe_raises_and_releases(tmp_path, monkeypatch):
+    monkeypatch.setattr(encode_utils.subprocess, "Popen", ExitedProcess)
+    flushed = []
+    sink = make_sink(tmp_path, frames_per_write=2)
+    sink.write(make_frame(0), on_flushed=lambda: flushed.append(0))
+    with pytest.raises(RuntimeError, match="退出码 1"):
+        sink.write(make_frame(1), on_flushed=lambda: flushed.append(1))
+    # buffers are handed back even though the write failed
+    assert flushed == [0, 1]
+    sink.abort()
+
+
+def test_encoder_sink_abort_runs_pending_callbacks(tmp_path, fake_popen):
+    flushed = []
+    sink = make_sink(tmp_path, frames_per_write=10)
+    sink.output_path.write_bytes(b"partial")
+    sink.write(make_frame(0), on_flushed=lambda: flushed.append(0))
+    sink.abort()
+    assert flushed == [0]
+    assert not sink.output_path.exists()
+    assert sink.process.received == bytearray()
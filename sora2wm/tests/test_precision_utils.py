@@ -0,0 +1,26 @@
+import pytest
+
+from sora2wm.utils import precision_utils
+from sora2wm.utils.precision_utils import check_precision, resolve_int8
+
+
+def test_check_precision_rejects_unknown_names():
+    assert check_precision("int8") == "int8"
+    with pytest.raises(ValueError):
+        check_precision("fp16")
+
+
+@pytest.mark.parametrize("precision", ["fp32", "bf16"])
+def test_resolve_int8_leaves_other_precisions(monkeypatch, precision):
+    monkeypatch.setattr(precision_utils, "onnxruntime_available", lambda: False)
+    assert resolve_int8(precision) == precision
+
+
+def test_resolve_int8_falls_back_without_onnxruntime(monkeypatch):
+    monkeypatch.setattr(precision_utils, "onnxruntime_available", lambda: False)
+    assert resolve_int8("int8") == "fp32"
+
+
+def test_resolve_int8_keeps_int8_with_onnxruntime(monkeypatch):
+    monkeypatch.setattr(precision_utils, "onnxruntime_available", lambda: True)
+    assert resolve_int8("int8") == "int8"
@@ -0,0 +1,216 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from sora2wm.server import progress_store
+from sora2wm.server.db import Base
+from sora2wm.server.progress_store import ProgressStore
+from sora2wm.server.schemas import Status
+
+
+def run_with_db(tmp_path, monkeypatch, test):
+    """Run `test(store, fetch)` against a fresh sqlite database in tmp_path."""
+
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}")
+        session_maker = async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+        @asynccontextmanager
+        async def get_session():
+            async with session_maker() as session:
+                try:
+                    yield session
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+
+        async def fetch():
+            async with engine.connect() as conn:
+                result = await conn.execute(
+                    text("SELECT id, status, percentage FROM tasks ORDER BY id")
+                )
+                return {row.id: (row.status, row.percentage) for row in result}
+
+        monkeypatch.setattr(progress_store, "get_session", get_session)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            await test(fetch)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_flush_inserts_new_and_updates_existing(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore(min_delta=5)
+        store.create("a")
+        store.create("b")
+        await store.flush()
+        assert await fetch() == {"a": ("UPLOADING", 0), "b": ("UPLOADING", 0)}
+        assert store.flushes == 1 and store.rows_flushed == 2
+        assert not store.peek("a").is_new
+
+        store.update("a", status=Status.PROCESSING)
+        await store.flush()
+        assert await fetch() == {"a": ("PROCESSING", 0), "b": ("UPLOADING", 0)}
+        assert store.rows_flushed == 3
+
+        # nothing dirty, no write
+        await store.flush()
+        assert store.flushes == 2
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_status_is_stored_as_its_value(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore()
+        store.create("a")
+        store.update("a", status=Status.FINISHED, percentage=100)
+        await store.flush()
+        status, percentage = (await fetch())["a"]
+        assert status == "FINISHED" and type(status) is str
+        assert percentage == 100
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_progress_is_flushed_only_past_min_delta(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore(min_delta=10)
+        store.create("a", status=Status.PROCESSING)
+        await store.flush()
+
+        store.set_progress("a", 5)
+        assert not store.peek("a").dirty
+        await store.flush()
+        assert (await fetch())["a"] == ("PROCESSING", 0)
+
+        # the delta is measured from the last flushed value, not the last update
+        store.set_progress("a", 12)
+        assert store.peek("a").dirty
+        await store.flush()
+        assert (await fetch())["a"] == ("PROCESSING", 12)
+        assert store.peek("a").flushed_percentage == 12
+
+        store.set_progress("a", 20)
+        assert not store.peek("a").dirty
+        store.set_progress("a", 22)
+        assert store.peek("a").dirty
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_progress_after_terminal_status_is_ignored(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore(min_delta=1)
+        store.create("a")
+        store.update("a", status=Status.ERROR)
+        version = store.peek("a").version
+        store.set_progress("a", 50)
+        assert store.peek("a").percentage == 0
+        assert store.peek("a").version == version
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_flushed_percentage_is_the_value_written(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore(min_delta=10)
+        store.create("a", status=Status.PROCESSING)
+        store.set_progress("a", 30)
+
+        # progress moves while the flush is committing
+        flushing = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)
+        store.set_progress("a", 35)
+        await flushing
+
+        assert (await fetch())["a"] == ("PROCESSING", 30)
+        assert store.peek("a").flushed_percentage == 30
+        # the newer value is not lost, the next flush writes it
+        await store.flush()
+        assert (await fetch())["a"] == ("PROCESSING", 35)
+        assert store.peek("a").flushed_percentage == 35
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_failed_flush_keeps_states_dirty(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore()
+        store.create("a")
+
+        @asynccontextmanager
+        async def broken_session():
+            raise RuntimeError("database is locked")
+            yield
+
+        real_session = progress_store.get_session
+        monkeypatch.setattr(progress_store, "get_session", broken_session)
+        await store.flush()
+        assert store.peek("a").dirty and store.peek("a").is_new
+        assert store.flushes == 0
+
+        monkeypatch.setattr(progress_store, "get_session", real_session)
+        await store.flush()
+        assert await fetch() == {"a": ("UPLOADING", 0)}
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_evicts_oldest_flushed_terminal_tasks(tmp_path, monkeypatch):
+    async def test(fetch):
+        store = ProgressStore(max_terminal=2)
+        for task_id in ("a", "b", "c", "d"):
+            store.create(task_id, status=Status.PROCESSING)
+        for task_id in ("a", "b", "c"):
+            store.update(task_id, status=Status.FINISHED)
+
+        # dirty terminal tasks are kept until they are written
+        assert {task_id for task_id in "abcd" if store.peek(task_id)} == set("abcd")
+        await store.flush()
+        assert store.peek("a") is None
+        assert store.peek("b") and store.peek("c") and store.peek("d")
+
+        # evicted tasks are still served from the database
+        state = await store.get("a")
+        assert state.status == Status.FINISHED
+        assert store.peek("a") is state
+        # ...and loading one evicts the oldest again
+        assert store.peek("b") is None
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_reload_marks_interrupted_tasks_as_error(tmp_path, monkeypatch):
+    async def test(fetch):
+        before = ProgressStore()
+        before.create("running", status=Status.PROCESSING)
+        before.create("done", status=Status.PROCESSING)
+        before.set_progress("running", 40)
+        before.update("done", status=Status.FINISHED, percentage=100)
+        await before.flush()
+
+        # a new store, as after a server restart
+        store = ProgressStore()
+        assert await store.get("missing") is None
+
+        done = await store.get("done")
+        assert done.status == Status.FINISHED and not done.dirty
+
+        running = await store.get("running")
+        assert running.status == Status.ERROR
+        assert running.percentage == 40
+        assert running.dirty and not running.is_new
+        await store.flush()
+        assert (await fetch())["running"] == ("ERROR", 40)
+
+    run_with_db(tmp_path, monkeypatch, test)
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from sora2wm.utils.segment_utils import plan_segments, segment_decode_range
+
+
+def assert_partition(segments, total_frames):
+    """Segments must be contiguous, non-empty and cover [0, total_frames) once."""
+    assert segments[0][0] == 0
+    assert segments[-1][1] == total_frames
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start
+    assert all(start < end for start, end in segments)
+
+
+def test_boundaries_snap_to_nearest_keyframe():
+    # ideal cut at 50, keyframe 70 is closer than 25
+    assert plan_segments([0, 25, 70], 100, 2) == [(0, 70), (70, 100)]
+    assert plan_segments([0, 30, 60, 90], 120, 4) == [
+        (0, 30),
+        (30, 60),
+        (60, 90),
+        (90, 120),
+    ]
+
+
+def test_boundaries_are_keyframes_only():
+    keyframes = [0, 17, 41, 66, 80, 97]
+    segments = plan_segments(keyframes, 110, 3)
+    assert_partition(segments, 110)
+    assert all(start in keyframes for start, _ in segments)
+
+
+def test_last_segment_ends_at_total_frames():
+    segments = plan_segments([0, 10, 20, 30], 35, 4)
+    assert segments == [(0, 10), (10, 20), (20, 30), (30, 35)]
+
+
+def test_keyframes_outside_video_are_ignored():
+    segments = plan_segments([0, 50, 100, 150], 100, 4)
+    assert_partition(segments, 100)
+    assert all(end <= 100 for _, end in segments)
+
+
+@pytest.mark.parametrize(
+    "keyframes, total_frames, num_segments",
+    [
+        # one segment requested
+        ([0, 30, 60], 90, 1),
+        # no keyframe after the first frame
+        ([0], 90, 4),
+        ([], 90, 4),
+        # every candidate keyframe would leave a too-short segment
+        ([0, 5, 88], 90, 3),
+    ],
+)
+def test_single_segment_video(keyframes, total_frames, num_segments):
+    assert plan_segments(keyframes, total_frames, num_segments, 10) == [
+        (0, total_frames)
+    ]
+
+
+def test_empty_video_has_no_segments():
+    assert plan_segments([0], 0, 4) == []
+
+
+def test_min_segment_frames_is_respected():
+    keyframes = list(range(0, 100, 5))
+    segments = plan_segments(keyframes, 100, 10, min_segment_frames=30)
+    assert_partition(segments, 100)
+    assert all(end - start >= 30 for start, end in segments)
+
+
+def test_random_plans_cover_every_frame_once():
+    rng = random.Random(0)
+    for _ in range(300):
+        total_frames = rng.randint(1, 500)
+        num_keyframes = rng.randint(0, min(total_frames, 20))
+        keyframes = sorted(rng.sample(range(total_frames), num_keyframes))
+        num_segments = rng.randint(1, 12)
+        min_frames = rng.randint(1, 40)
+        segments = plan_segments(keyframes, total_frames, num_segments, min_frames)
+        assert_partition(segments, total_frames)
+        assert len(segments) <= num_segments
+        assert all(start == 0 or start in keyframes for start, _ in segments)
+
+
+def test_decode_range_adds_overlap_and_one_lookahead_frame():
+    assert segment_decode_range(100, 200, 8) == (92, 201)
+
+
+@pytest.mark.parametrize(
+    "start_frame, overlap", [(0, 8), (3, 8), (8, 8), (5, 0), (5, -2)]
+)
+def test_decode_range_start_is_clamped(start_frame, overlap):
+    decode_start, decode_end = segment_decode_range(start_frame, 50, overlap)
+    assert decode_start == max(0, start_frame - max(0, overlap))
+    assert 0 <= decode_start <= start_frame
+    assert decode_end == 51
+
+
+def test_decode_ranges_include_every_output_frame():
+    segments = plan_segments([0, 30, 60, 90], 120, 4)
+    for start, end in segments:
+        decode_start, decode_end = segment_decode_range(start, end, 8)
+        assert decode_start <= start and end < decode_end
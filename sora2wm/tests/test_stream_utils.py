@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+from sora2wm.utils.stream_utils import BBoxBackfillWindow, backfill_bboxes
+
+A = (10, 10, 50, 30)
+B = (12, 11, 52, 31)
+C = (100, 80, 140, 100)
+
+
+def run_window(bboxes):
+    """Push every bbox through the streaming window, return the output bboxes."""
+    window = BBoxBackfillWindow()
+    frames = [np.full((2, 2, 3), i % 256, dtype=np.uint8) for i in range(len(bboxes))]
+    outputs = []
+    for idx, (frame, bbox) in enumerate(zip(frames, bboxes)):
+        outputs.extend(window.push(idx, frame, bbox))
+        # one frame of lookahead is enough, the window never grows past it
+        assert len(window) <= 1
+    outputs.extend(window.flush())
+
+    assert [idx for idx, _, _ in outputs] == list(range(len(bboxes)))
+    assert all(frame is frames[idx] for idx, frame, _ in outputs)
+    return [bbox for _, _, bbox in outputs]
+
+
+@pytest.mark.parametrize(
+    "bboxes, expected",
+    [
+        # miss at the start takes the next detection
+        ([None, A, B], [A, A, B]),
+        # miss in the middle takes the previous frame
+        ([A, None, B], [A, A, B]),
+        # miss at the end takes the previous frame
+        ([A, B, None], [A, B, B]),
+        # consecutive misses carry the previous (filled) box forward
+        ([A, None, None, None, B], [A, A, A, A, B]),
+        # consecutive misses at the start: only the one next to a detection is filled
+        ([None, None, A], [None, A, A]),
+        ([None, None, None, A, None, None, B, None], [None, None, A, A, A, A, B, B]),
+        ([None, None, None], [None, None, None]),
+        ([None], [None]),
+        ([A], [A]),
+        ([], []),
+    ],
+)
+def test_backfill_cases(bboxes, expected):
+    assert backfill_bboxes(bboxes) == expected
+    assert run_window(bboxes) == expected
+
+
+def test_backfill_window_matches_two_pass_on_random_sequences():
+    rng = random.Random(0)
+    for _ in range(500):
+        length = rng.randint(1, 30)
+        bboxes = [rng.choice([None, None, A, B, C]) for _ in range(length)]
+        assert run_window(bboxes) == backfill_bboxes(bboxes), bboxes
+
+
+def test_backfill_does_not_modify_input():
+    bboxes = [None, A, None]
+    backfill_bboxes(bboxes)
+    assert bboxes == [None, A, None]
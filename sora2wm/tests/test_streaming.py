@@ -0,0 +1,175 @@
+import asyncio
+import struct
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+
+from sora2wm.server.streaming import complete_boxes_end, file_response, tail_fragments
+
+
+def box(box_type: bytes, payload_size: int) -> bytes:
+    return struct.pack(">I4s", 8 + payload_size, box_type) + b"\x00" * payload_size
+
+
+def large_box(box_type: bytes, payload_size: int) -> bytes:
+    """Box with size == 1 and a 64-bit largesize field."""
+    header = struct.pack(">I4sQ", 1, box_type, 16 + payload_size)
+    return header + b"\x00" * payload_size
+
+
+FTYP = box(b"ftyp", 16)
+MOOV = box(b"moov", 40)
+MOOF = box(b"moof", 24)
+MDAT = box(b"mdat", 100)
+
+
+def write(tmp_path, data: bytes):
+    path = tmp_path / "out.mp4"
+    path.write_bytes(data)
+    return path
+
+
+def test_complete_boxes_end_stops_at_whole_boxes(tmp_path):
+    data = FTYP + MOOV + MOOF + MDAT
+    path = write(tmp_path, data)
+    assert complete_boxes_end(path, 0) == len(data)
+    assert complete_boxes_end(path, len(FTYP)) == len(data)
+    assert complete_boxes_end(path, len(data)) == len(data)
+
+
+@pytest.mark.parametrize("cut", [1, 7, 8, 20])
+def test_complete_boxes_end_ignores_truncated_box(tmp_path, cut):
+    path = write(tmp_path, FTYP + MOOV[:cut])
+    assert complete_boxes_end(path, 0) == len(FTYP)
+
+
+def test_complete_boxes_end_holds_moof_until_mdat_is_complete(tmp_path):
+    head = FTYP + MOOV
+    # moof alone, moof with a partial mdat header, moof with a partial mdat
+    for tail in (MOOF, MOOF + MDAT[:4], MOOF + MDAT[:50]):
+        path = write(tmp_path, head + tail)
+        assert complete_boxes_end(path, 0) == len(head)
+
+    path = write(tmp_path, head + MOOF + MDAT + MOOF + MDAT[:-1])
+    assert complete_boxes_end(path, 0) == len(head + MOOF + MDAT)
+
+
+def test_complete_boxes_end_requires_mdat_after_moof(tmp_path):
+    path = write(tmp_path, FTYP + MOOF + box(b"free", 4))
+    assert complete_boxes_end(path, 0) == len(FTYP)
+
+
+def test_complete_boxes_end_reads_largesize(tmp_path):
+    mdat = large_box(b"mdat", 64)
+    path = write(tmp_path, FTYP + MOOF + mdat)
+    assert complete_boxes_end(path, 0) == len(FTYP + MOOF + mdat)
+
+    path = write(tmp_path, FTYP + large_box(b"moov", 64)[:-1])
+    assert complete_boxes_end(path, 0) == len(FTYP)
+    # largesize header itself cut short
+    path = write(tmp_path, FTYP + large_box(b"moov", 64)[:12])
+    assert complete_boxes_end(path, 0) == len(FTYP)
+
+
+def test_complete_boxes_end_stops_at_invalid_sizes(tmp_path):
+    # size 0 means "to end of file", only known once writing is done
+    path = write(tmp_path, FTYP + struct.pack(">I4s", 0, b"mdat") + b"\x00" * 10)
+    assert complete_boxes_end(path, 0) == len(FTYP)
+    path = write(tmp_path, FTYP + struct.pack(">I4s", 4, b"free") + b"\x00" * 10)
+    assert complete_boxes_end(path, 0) == len(FTYP)
+
+
+def test_tail_fragments_sends_complete_fragments_then_the_rest(tmp_path):
+    path = tmp_path / "out.mp4"
+    data = FTYP + MOOV + MOOF + MDAT + MOOF + MDAT[:30]
+    polls = []
+
+    async def is_running():
+        polls.append(len(polls))
+        if len(polls) == 1:
+            return True
+        if len(polls) == 2:
+            path.write_bytes(data)
+            return True
+        # finished: the final fragment is now complete
+        path.write_bytes(FTYP + MOOV + MOOF + MDAT + MOOF + MDAT)
+        return False
+
+    async def collect():
+        return [chunk async for chunk in tail_fragments(path, is_running, 0)]
+
+    chunks = asyncio.run(collect())
+    assert chunks[0] == FTYP + MOOV + MOOF + MDAT
+    assert b"".join(chunks) == FTYP + MOOV + MOOF + MDAT + MOOF + MDAT
+
+
+def test_tail_fragments_returns_when_file_never_appears(tmp_path):
+    async def is_running():
+        return False
+
+    async def collect():
+        return [c async for c in tail_fragments(tmp_path / "none.mp4", is_running, 0)]
+
+    assert asyncio.run(collect()) == []
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "result.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    app = FastAPI()
+
+    @app.get("/download")
+    async def download(request: Request):
+        return file_response(path, request.headers.get("range"), "video/mp4")
+
+    return TestClient(app)
+
+
+def get(client, range_header=None):
+    headers = {"Range": range_header} if range_header else {}
+    return client.get("/download", headers=headers)
+
+
+def test_file_response_without_range_sends_whole_file(client):
+    response = get(client)
+    assert response.status_code == 200
+    assert response.content == bytes(range(256)) * 4
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize(
+    "range_header, start, end",
+    [
+        ("bytes=0-99", 0, 99),
+        ("bytes=100-", 100, 1023),
+        ("bytes=1000-5000", 1000, 1023),
+        ("bytes=1023-1023", 1023, 1023),
+        # suffix ranges
+        ("bytes=-24", 1000, 1023),
+        ("bytes=-5000", 0, 1023),
+    ],
+)
+def test_file_response_serves_ranges(client, range_header, start, end):
+    response = get(client, range_header)
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/1024"
+    assert response.headers["content-length"] == str(end - start + 1)
+    assert response.content == (bytes(range(256)) * 4)[start : end + 1]
+
+
+@pytest.mark.parametrize(
+    "range_header", ["bytes=1024-", "bytes=2000-3000", "bytes=50-10", "bytes=-0"]
+)
+def test_file_response_rejects_unsatisfiable_ranges(client, range_header):
+    response = get(client, range_header)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+@pytest.mark.parametrize("range_header", [None, "items=0-10", "bytes=0-10,20-30"])
+def test_file_response_leaves_other_requests_to_file_response(tmp_path, range_header):
+    path = write(tmp_path, FTYP)
+    assert isinstance(file_response(path, range_header, "video/mp4"), FileResponse)
@@ -0,0 +1,124 @@
+import numpy as np
+
+from sora2wm.utils.video_utils import FramePool, read_frame_into
+
+
+class FakePipe:
+    """Binary stream whose readinto returns at most `max_read` bytes per call."""
+
+    def __init__(self, data: bytes, max_read: int):
+        self.data = data
+        self.pos = 0
+        self.max_read = max_read
+        self.calls = 0
+
+    def readinto(self, view):
+        self.calls += 1
+        n = min(len(view), self.max_read, len(self.data) - self.pos)
+        view[:n] = self.data[self.pos : self.pos + n]
+        self.pos += n
+        return n
+
+
+def make_frames(count, height=4, width=5):
+    size = height * width * 3
+    data = bytes(i % 251 for i in range(count * size))
+    return data, [
+        np.frombuffer(data[i * size : (i + 1) * size], dtype=np.uint8).reshape(
+            height, width, 3
+        )
+        for i in range(count)
+    ]
+
+
+def test_read_frame_into_loops_over_short_reads():
+    data, frames = make_frames(1)
+    pipe = FakePipe(data, max_read=7)
+    buffer = np.zeros((4, 5, 3), dtype=np.uint8)
+
+    assert read_frame_into(pipe, buffer)
+    assert np.array_equal(buffer, frames[0])
+    assert pipe.calls == -(-len(data) // 7)
+
+
+def test_read_frame_into_reuses_buffer_for_consecutive_frames():
+    data, frames = make_frames(3)
+    pipe = FakePipe(data, max_read=11)
+    buffer = np.zeros((4, 5, 3), dtype=np.uint8)
+    address = buffer.ctypes.data
+
+    for expected in frames:
+        assert read_frame_into(pipe, buffer)
+        assert np.array_equal(buffer, expected)
+        assert buffer.ctypes.data == address
+    assert not read_frame_into(pipe, buffer)
+
+
+def test_read_frame_into_returns_false_at_eof():
+    pipe = FakePipe(b"", max_read=16)
+    buffer = np.zeros((4, 5, 3), dtype=np.uint8)
+    assert not read_frame_into(pipe, buffer)
+
+
+def test_read_frame_into_drops_truncated_frame():
+    data, _ = make_frames(1)
+    pipe = FakePipe(data[:-1], max_read=16)
+    buffer = np.zeros((4, 5, 3), dtype=np.uint8)
+    assert not read_frame_into(pipe, buffer)
+    assert pipe.pos == len(data) - 1
+
+
+def test_read_frame_into_handles_none_from_non_blocking_stream():
+    class NonePipe:
+        def readinto(self, view):
+            return None
+
+    assert not read_frame_into(NonePipe(), np.zeros((2, 2, 3), dtype=np.uint8))
+
+
+def test_frame_pool_reuses_released_buffers():
+    pool = FramePool(4, 5, 2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first.shape == (4, 5, 3) and first.dtype == np.uint8
+    assert first is not second
+    assert len(pool) == 0 and pool.leased == 2
+
+    pool.release(first)
+    assert len(pool) == 1 and pool.leased == 1
+    assert pool.acquire() is first
+    assert pool.allocated == 2
+
+
+def test_frame_pool_grows_when_empty():
+    pool = FramePool(2, 2, 1)
+    frames = [pool.acquire() for _ in range(3)]
+    assert pool.allocated == 3
+    assert len({id(frame) for frame in frames}) == 3
+
+    for frame in frames:
+        pool.release(frame)
+    assert len(pool) == 3 and pool.leased == 0
+    # grown buffers stay in the pool
+    [pool.acquire() for _ in range(3)]
+    assert pool.allocated == 3
+
+
+def test_frame_pool_release_accepts_views():
+    pool = FramePool(6, 4, 1)
+    frame = pool.acquire()
+    # the loader hands out buffer[:height] when the detect frame is stacked below
+    pool.release(frame[:4])
+    assert pool.leased == 0
+    assert pool.acquire() is frame
+
+
+def test_frame_pool_ignores_foreign_and_double_release():
+    pool = FramePool(2, 2, 1)
+    frame = pool.acquire()
+    pool.release(np.zeros((2, 2, 3), dtype=np.uint8))
+    assert len(pool) == 0 and pool.leased == 1
+
+    pool.release(frame)
+    pool.release(frame)
+    assert len(pool) == 1 and pool.leased == 0
@@ -0,0 +1,54 @@
+import numpy as np
+
+from sora2wm.watermark_detector import StrideWaterMarkDetector
+
+
+class FakeDetector:
+    """Returns a fixed bbox for every frame and counts the frames it saw."""
+
+    def __init__(self, bbox):
+        self.bbox = bbox
+        self.calls = []
+
+    def detect_batch(self, images):
+        self.calls.append(len(images))
+        return [
+            {"detected": True, "bbox": self.bbox, "confidence": 0.9, "center": None}
+            for _ in images
+        ]
+
+
+def frames(count):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (32, 48, 3), dtype=np.uint8)
+    return [frame.copy() for _ in range(count)]
+
+
+def test_consistent_frames_reuse_the_key_frame_result():
+    detector = FakeDetector((4, 4, 20, 16))
+    stride = StrideWaterMarkDetector(detector, stride=4)
+    results = stride.detect_batch(frames(4))
+    assert [r["bbox"] for r in results] == [(4, 4, 20, 16)] * 4
+    assert detector.calls == [1]
+    assert stride.reused == 3
+
+
+def test_empty_bbox_is_never_consistent():
+    # zero width after clipping to the frame edge
+    detector = FakeDetector((48, 4, 48, 16))
+    stride = StrideWaterMarkDetector(detector, stride=4)
+    results = stride.detect_batch(frames(4))
+
+    assert stride.reference_patch is None
+    assert all(r["detected"] for r in results)
+    # the three in-between frames are re-detected in one batch
+    assert detector.calls == [1, 3]
+    assert stride.reused == 0
+
+
+def test_zero_height_bbox_is_not_stored_as_reference():
+    detector = FakeDetector((4, 10, 20, 10))
+    stride = StrideWaterMarkDetector(detector, stride=2)
+    stride.detect_batch(frames(2))
+    assert stride.reference_patch is None
+    assert not stride._is_consistent(frames(1)[0])
@@ -0,0 +1,265 @@
+"""
+ONNX水印检测工具模块
+
+在onnxruntime上运行导出的YOLO检测模型，预处理（letterbox）和后处理（NMS）均用NumPy实现，
+生产环境的worker无需导入ultralytics
+"""
+
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from sora2wm.configs import (
+    DETECT_CONF_THRESHOLD,
+    DETECT_IMAGE_SIZE,
+    DETECT_IOU_THRESHOLD,
+    DETECT_MAX_DET,
+)
+
+# letterbox填充颜色，与ultralytics一致
+_PAD_VALUE = 114
+# 按类别偏移边界框，使一次NMS只抑制同类别的框
+_CLASS_OFFSET = 7680.0
+
+
+def export_detector_onnx(
+    weights_path: Path, output_path: Path, imgsz: int = DETECT_IMAGE_SIZE
+) -> Path:
+    """
+    使用ultralytics将YOLO权重导出为ONNX模型（仅导出时需要ultralytics）
+
+    参数:
+    - weights_path: YOLO权重路径（best.pt）
+    - output_path: 导出的ONNX模型路径
+    - imgsz: 模型输入尺寸
+
+    返回:
+    - 导出的ONNX模型路径
+    """
+    from ultralytics import YOLO
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # 批大小设为动态，便于批量检测
+    exported = YOLO(str(weights_path)).export(
+        format="onnx", imgsz=imgsz, dynamic=True, simplify=True
+    )
+    if Path(exported).resolve() != output_path.resolve():
+        os.replace(exported, output_path)
+    logger.info(f"检测模型已导出为ONNX: {output_path}")
+    return output_path
+
+
+def letterbox_params(
+    shape: Tuple[int, int], imgsz: int
+) -> Tuple[float, Tuple[int, int], Tuple[int, int]]:
+    """
+    计算letterbox缩放比例和填充
+
+    参数:
+    - shape: 原图尺寸 (高, 宽)
+    - imgsz: 模型输入尺寸（正方形）
+
+    返回:
+    - (缩放比例, 缩放后尺寸 (宽, 高), 左上填充 (左, 上))
+    """
+    h, w = shape
+    gain = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    pad_left = int(round((imgsz - new_w) / 2 - 0.1))
+    pad_top = int(round((imgsz - new_h) / 2 - 0.1))
+    return gain, (new_w, new_h), (pad_left, pad_top)
+
+
+def letterbox_batch(
+    images: List[np.ndarray], imgsz: int
+) -> Tuple[np.ndarray, List[Tuple[float, Tuple[int, int]]]]:
+    """
+    将一批BGR图像缩放并填充为模型输入张量
+
+    参数:
+    - images: BGR图像列表（尺寸可以不同）
+    - imgsz: 模型输入尺寸（正方形）
+
+    返回:
+    - (形状为 [N, 3, imgsz, imgsz] 的float32 RGB张量, 每张图的 (缩放比例, 左上填充))
+    """
+    batch = np.full((len(images), imgsz, imgsz, 3), _PAD_VALUE, dtype=np.uint8)
+    params = []
+    for i, image in enumerate(images):
+        gain, (new_w, new_h), (left, top) = letterbox_params(image.shape[:2], imgsz)
+        if (new_w, new_h) != (image.shape[1], image.shape[0]):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        batch[i, top : top + new_h, left : left + new_w] = image
+        params.append((gain, (left, top)))
+    # BGR转RGB、NHWC转NCHW并归一化，整批一次完成
+    tensor = batch[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32)
+    tensor *= 1 / 255.0
+    return np.ascontiguousarray(tensor), params
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    非极大值抑制
+
+    参数:
+    - boxes: 形状为 [N, 4] 的 (x1, y1, x2, y2) 边界框
+    - scores: 形状为 [N] 的置信度
+    - iou_threshold: IoU阈值，超过该值的低分框被抑制
+
+    返回:
+    - 保留的框索引，按置信度从高到低排列
+    """
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess(
+    prediction: np.ndarray,
+    gain: float,
+    pad: Tuple[int, int],
+    shape: Tuple[int, int],
+    conf_threshold: float = DETECT_CONF_THRESHOLD,
+    iou_threshold: float = DETECT_IOU_THRESHOLD,
+    max_det: int = DETECT_MAX_DET,
+) -> np.ndarray:
+    """
+    将单张图像的YOLO原始输出转换为原图坐标系下的检测框
+
+    参数:
+    - prediction: 形状为 [4 + 类别数, 候选数] 的原始输出 (cx, cy, w, h, 各类别分数)
+    - gain: letterbox缩放比例
+    - pad: letterbox左上填充 (左, 上)
+    - shape: 原图尺寸 (高, 宽)
+    - conf_threshold: 置信度阈值
+    - iou_threshold: NMS的IoU阈值
+    - max_det: 最多保留的检测框数量
+
+    返回:
+    - 形状为 [K, 6] 的 (x1, y1, x2, y2, 置信度, 类别) 数组，按置信度从高到低排列
+    """
+    class_scores = prediction[4:]
+    cls = class_scores.argmax(axis=0)
+    conf = class_scores[cls, np.arange(class_scores.shape[1])]
+    mask = conf > conf_threshold
+    if not mask.any():
+        return np.zeros((0, 6), dtype=np.float32)
+
+    cx, cy, w, h = prediction[:4, mask]
+    conf, cls = conf[mask], cls[mask].astype(np.float32)
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    keep = nms(boxes + (cls * _CLASS_OFFSET)[:, None], conf, iou_threshold)[:max_det]
+    boxes, conf, cls = boxes[keep], conf[keep], cls[keep]
+
+    # 去掉填充并缩放回原图坐标
+    boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=boxes.dtype)
+    boxes /= gain
+    img_h, img_w = shape
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, img_w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, img_h)
+    return np.concatenate([boxes, conf[:, None], cls[:, None]], axis=1)
+
+
+class OnnxYoloDetector:
+    """基于onnxruntime的YOLO检测器，不依赖ultralytics"""
+
+    def __init__(
+        self,
+        model_path: Path,
+        device: str = "cpu",
+        imgsz: int = DETECT_IMAGE_SIZE,
+        conf_threshold: float = DETECT_CONF_THRESHOLD,
+        iou_threshold: float = DETECT_IOU_THRESHOLD,
+        max_det: int = DETECT_MAX_DET,
+    ):
+        """
+        初始化检测器
+
+        参数:
+        - model_path: 导出的ONNX模型路径
+        - device: 设备名称，cuda设备在可用时使用CUDAExecutionProvider
+        - imgsz: 模型输入尺寸
+        - conf_threshold: 置信度阈值
+        - iou_threshold: NMS的IoU阈值
+        - max_det: 每张图最多保留的检测框数量
+
+        异常:
+        - ImportError: 未安装onnxruntime
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "ONNX检测后端需要onnxruntime，请执行 pip install -r requirements.txt"
+            ) from e
+
+        providers = ["CPUExecutionProvider"]
+        if str(device).startswith("cuda") and (
+            "CUDAExecutionProvider" in ort.get_available_providers()
+        ):
+            providers.insert(0, "CUDAExecutionProvider")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.fspath(model_path), sess_options=options, providers=providers
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        # 静态导出的模型只接受批大小1
+        self.fixed_batch = isinstance(self.session.get_inputs()[0].shape[0], int)
+        self.imgsz = imgsz
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def predict(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        批量检测
+
+        参数:
+        - images: BGR图像列表
+
+        返回:
+        - 与输入一一对应的 [K, 6] 检测框数组列表，格式见postprocess
+        """
+        if not images:
+            return []
+        tensor, params = letterbox_batch(images, self.imgsz)
+        if self.fixed_batch:
+            outputs = np.concatenate(
+                [
+                    self.session.run(None, {self.input_name: tensor[i : i + 1]})[0]
+                    for i in range(len(images))
+                ]
+            )
+        else:
+            outputs = self.session.run(None, {self.input_name: tensor})[0]
+        return [
+            postprocess(
+                output,
+                gain,
+                pad,
+                image.shape[:2],
+                self.conf_threshold,
+                self.iou_threshold,
+                self.max_det,
+            )
+            for output, (gain, pad), image in zip(outputs, params, images)
+        ]
@@ -0,0 +1,364 @@
+"""
+视频编码工具函数模块
+
+根据命名的编码方案（见configs.ENCODING_PROFILES）生成ffmpeg输出参数，
+并提供把原始BGR帧写入ffmpeg编码进程的EncoderSink
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import ffmpeg
+import numpy as np
+from loguru import logger
+
+from sora2wm.configs import (
+    DEFAULT_ENCODING_PROFILE,
+    ENCODER_FRAMES_PER_WRITE,
+    ENCODER_PIPE_BUFFER_SIZE,
+    ENCODING_PROFILES,
+    FRAGMENT_SECONDS,
+)
+from sora2wm.utils.video_utils import select_audio_codec
+
+# 保留的ffmpeg错误输出行数
+_STDERR_TAIL_LINES = 50
+
+# 支持分片输出的容器后缀
+FRAGMENTED_SUFFIXES = (".mp4", ".m4v", ".mov")
+
+
+def get_encoding_profile(name: str | None = None) -> dict:
+    """
+    获取命名的编码方案
+
+    参数:
+    - name: 编码方案名称，为None时使用默认方案
+
+    返回:
+    - 编码方案字典
+
+    异常:
+    - ValueError: 编码方案不存在
+    """
+    name = name or DEFAULT_ENCODING_PROFILE
+    if name not in ENCODING_PROFILES:
+        raise ValueError(
+            f"未知的编码方案: {name}，可选: {', '.join(ENCODING_PROFILES)}"
+        )
+    return ENCODING_PROFILES[name]
+
+
+def build_output_options(
+    profile: str | None = None, original_bitrate: str | int | None = None
+) -> dict:
+    """
+    根据编码方案生成ffmpeg输出参数
+
+    参数:
+    - profile: 编码方案名称，为None时使用默认方案
+    - original_bitrate: 原视频比特率，可选
+
+    返回:
+    - 传给ffmpeg输出的参数字典
+    """
+    settings = get_encoding_profile(profile)
+    output_options = {
+        "pix_fmt": "yuv420p",  # 像素格式
+        "vcodec": "libx264",  # 视频编码器
+        "preset": settings["preset"],  # 编码预设
+    }
+    if settings["tune"]:
+        output_options["tune"] = settings["tune"]
+    if settings["threads"]:
+        output_options["threads"] = str(settings["threads"])
+
+    # 根据输入视频比特率设置输出视频质量
+    if settings["bitrate_factor"] and original_bitrate:
+        # 如果有原始比特率，按方案倍数设置比特率以保证质量
+        output_options["video_bitrate"] = str(
+            int(int(original_bitrate) * settings["bitrate_factor"])
+        )
+    else:
+        # 否则使用CRF参数控制质量
+        output_options["crf"] = str(settings["crf"])
+    return output_options
+
+
+def fragmented_options(
+    output_path: Path, fps: float, fragment_seconds: float = FRAGMENT_SECONDS
+) -> dict:
+    """
+    生成分片MP4输出参数
+
+    文件开头写入不含样本的moov，之后每隔fragment_seconds秒强制一个关键帧并写出一个
+    moof+mdat分片，编码过程中已写出的分片即可被播放器解码
+
+    参数:
+    - output_path: 输出路径，容器不支持分片时返回空字典
+    - fps: 帧率
+    - fragment_seconds: 每个分片的时长（秒）
+
+    返回:
+    - 需要合并到ffmpeg输出参数中的参数字典
+    """
+    if Path(output_path).suffix.lower() not in FRAGMENTED_SUFFIXES:
+        logger.warning(f"容器 {Path(output_path).suffix} 不支持分片输出，按普通文件输出")
+        return {}
+    return {
+        "movflags": "frag_keyframe+empty_moov+default_base_moof",
+        "g": str(max(1, round(fps * fragment_seconds))),
+    }
+
+
+def _set_pipe_size(fd: int, size: int):
+    """
+    尽量扩大管道缓冲区（仅Linux支持，失败时保持系统默认值）
+
+    参数:
+    - fd: 管道文件描述符
+    - size: 期望的缓冲区大小（字节）
+    """
+    if not sys.platform.startswith("linux") or size <= 0:
+        return
+    try:
+        import fcntl
+
+        # F_SETPIPE_SZ在Python 3.10之前没有常量定义
+        fcntl.fcntl(fd, getattr(fcntl, "F_SETPIPE_SZ", 1031), size)
+    except OSError as e:
+        logger.debug(f"无法设置编码管道缓冲区大小: {e}")
+
+
+def _write_all(fd: int, views: List[memoryview]):
+    """
+    把多个缓冲区完整写入文件描述符
+
+    支持writev时一次系统调用写入多个缓冲区，并处理部分写入
+
+    参数:
+    - fd: 文件描述符
+    - views: 一维字节视图列表
+    """
+    views = [view for view in views if len(view)]
+    while views:
+        if hasattr(os, "writev"):
+            written = os.writev(fd, views)
+        else:
+            written = os.write(fd, views[0])
+        # 跳过已完整写入的缓冲区，截断部分写入的缓冲区
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if views and written:
+            views[0] = views[0][written:]
+
+
+class EncoderSink:
+    """
+    FFmpeg编码输出
+
+    从标准输入读取原始BGR帧并编码到文件。帧通过memoryview直接写入管道，不再逐帧调用
+    tobytes()复制；每frames_per_write帧合并为一次writev系统调用，并尽量扩大管道缓冲区。
+    ffmpeg的错误输出在后台线程中持续读取，编码进程异常退出时抛出带错误输出的RuntimeError。
+
+    由于写入是批量的，帧在write返回后可能仍未写出；需要复用帧缓冲区的调用方应通过
+    on_flushed回调得知帧已写出。支持with语句：正常结束时close，出错时终止编码进程。
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        width: int,
+        height: int,
+        fps: float,
+        output_options: dict,
+        audio_source: Path | None = None,
+        audio_codec: str | None = None,
+        audio_options: dict | None = None,
+        frames_per_write: int = ENCODER_FRAMES_PER_WRITE,
+        pipe_buffer_size: int = ENCODER_PIPE_BUFFER_SIZE,
+    ):
+        """
+        启动FFmpeg编码进程
+
+        指定audio_source时，原始视频作为第二输入，其音频轨道在同一次编码中直接封装，
+        容器支持时音频流直接复制
+
+        参数:
+        - output_path: 编码输出路径
+        - width: 视频宽度
+        - height: 视频高度
+        - fps: 帧率
+        - output_options: 编码参数
+        - audio_source: 提供音频轨道的原始视频路径，可选
+        - audio_codec: 原始音频流的编码格式，为None时表示没有音频
+        - audio_options: 音频输入的ffmpeg参数（如裁剪到处理范围的ss/t），可选
+        - frames_per_write: 每次写入系统调用合并的帧数
+        - pipe_buffer_size: 编码管道缓冲区大小（字节），仅Linux有效
+        """
+        self.output_path = Path(output_path)
+        self.frame_shape = (height, width, 3)
+        self.frames_per_write = max(1, frames_per_write)
+        # 已写入的帧数
+        self.frames_written = 0
+
+        streams = [
+            ffmpeg.input(
+                "pipe:",
+                format="rawvideo",  # 原始视频格式
+                pix_fmt="bgr24",    # 像素格式
+                s=f"{width}x{height}",  # 视频尺寸
+                r=fps,               # 帧率
+            )
+        ]
+        if audio_source is not None and audio_codec is not None:
+            # 映射原始视频的音频流
+            streams.append(
+                ffmpeg.input(str(audio_source), **(audio_options or {})).audio
+            )
+            output_options = {
+                **output_options,
+                "acodec": select_audio_codec(audio_codec, output_path),
+            }
+        args = (
+            ffmpeg.output(*streams, str(output_path), **output_options)  # 输出配置
+            .overwrite_output()       # 覆盖现有文件
+            .global_args("-loglevel", "error")  # 最小化日志输出
+            .compile()
+        )
+
+        # 标准输入不使用Python缓冲，直接按文件描述符写入
+        self.process = subprocess.Popen(
+            args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+        )
+        self._fd = self.process.stdin.fileno()
+        _set_pipe_size(self._fd, pipe_buffer_size)
+
+        # 待写入的帧视图及其写出后的回调
+        self._pending: List[memoryview] = []
+        self._callbacks: List[Callable[[], None]] = []
+        # 后台读取ffmpeg错误输出，避免管道写满阻塞编码进程
+        self._stderr_tail = deque(maxlen=_STDERR_TAIL_LINES)
+        self._stderr_thread = threading.Thread(
+            target=self._read_stderr, name="encoder-stderr", daemon=True
+        )
+        self._stderr_thread.start()
+        self._closed = False
+
+    def __enter__(self) -> "EncoderSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def stderr(self) -> str:
+        """最近的ffmpeg错误输出"""
+        return "\n".join(self._stderr_tail)
+
+    def write(
+        self, frame: np.ndarray, on_flushed: Optional[Callable[[], None]] = None
+    ):
+        """
+        写入一帧
+
+        参数:
+        - frame: BGR帧，形状必须与编码尺寸一致；不连续的数组会先复制为连续数组
+        - on_flushed: 该帧数据写入管道后调用的回调（例如归还帧缓冲区），可选
+
+        异常:
+        - RuntimeError: 编码进程已退出
+        """
+        if frame.shape != self.frame_shape:
+            raise ValueError(
+                f"帧尺寸 {frame.shape} 与编码尺寸 {self.frame_shape} 不一致"
+            )
+        if not frame.flags.c_contiguous:
+            frame = np.ascontiguousarray(frame)
+        self._pending.append(memoryview(frame).cast("B"))
+        if on_flushed is not None:
+            self._callbacks.append(on_flushed)
+        if len(self._pending) >= self.frames_per_write:
+            self.flush()
+
+    def flush(self):
+        """
+        把缓存的帧写入编码管道
+
+        异常:
+        - RuntimeError: 编码进程已退出
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        callbacks, self._callbacks = self._callbacks, []
+        try:
+            _write_all(self._fd, pending)
+        except (BrokenPipeError, OSError) as e:
+            self.process.wait()
+            self._stderr_thread.join(timeout=1)
+            raise RuntimeError(
+                f"FFmpeg编码进程已退出（退出码 {self.process.returncode}）: "
+                f"{self.stderr or e}"
+            ) from e
+        finally:
+            # 无论写入是否成功都执行回调，保证帧缓冲区被归还
+            for callback in callbacks:
+                callback()
+        self.frames_written += len(pending)
+
+    def close(self):
+        """
+        写出剩余帧，关闭输入并等待编码完成
+
+        异常:
+        - RuntimeError: 编码进程返回非零退出码
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+        finally:
+            self.process.stdin.close()
+            returncode = self.process.wait()
+            self._stderr_thread.join()
+        if returncode != 0:
+            raise RuntimeError(
+                f"FFmpeg编码失败（退出码 {returncode}）: {self.stderr}"
+            )
+
+    def abort(self):
+        """终止编码进程并丢弃未写出的帧（处理出错时调用）"""
+        if self._closed:
+            return
+        self._closed = True
+        for callback in self._callbacks:
+            callback()
+        self._pending, self._callbacks = [], []
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.kill()
+        self.process.wait()
+        self._stderr_thread.join(timeout=1)
+        self.output_path.unlink(missing_ok=True)
+
+    def _read_stderr(self):
+        """后台线程：逐行读取ffmpeg错误输出"""
+        for line in iter(self.process.stderr.readline, b""):
+            text = line.decode(errors="ignore").rstrip()
+            if text:
+                self._stderr_tail.append(text)
+                logger.warning(f"[ffmpeg] {text}")
+        self.process.stderr.close()
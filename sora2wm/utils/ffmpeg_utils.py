@@ -4,7 +4,10 @@ FFmpeg路径配置工具
 """
 
 import os
+import shutil
 import sys
+import time
+from functools import cache
 from pathlib import Path
 from sora2wm.configs import FFMPEG_DIR_PATH
 from loguru import logger
@@ -67,7 +70,6 @@ def setup_ffmpeg_path():
         
         # 检查系统PATH中是否有ffmpeg
         try:
-            import shutil
             system_ffmpeg = shutil.which("ffmpeg")
             system_ffprobe = shutil.which("ffprobe")
             
@@ -104,18 +106,46 @@ def check_ffmpeg_available():
         return False
 
 
+# 已验证可用的ffmpeg路径，通过环境变量传给子进程（spawn启动的分段worker），避免重复检查
+_FFMPEG_READY_ENV = "SORA2WM_FFMPEG_READY"
+
+# init_ffmpeg的耗时（秒），用于启动耗时统计
+init_seconds = 0.0
+
+
 # 在模块导入时自动配置ffmpeg路径
-def init_ffmpeg():
-    """初始化ffmpeg配置"""
-    success = setup_ffmpeg_path()
-    if success:
+@cache
+def init_ffmpeg() -> bool:
+    """
+    初始化ffmpeg配置
+
+    每个进程只执行一次，结果被缓存；父进程已验证过同一个ffmpeg时直接复用结果
+
+    返回：
+        bool: ffmpeg是否可用
+    """
+    global init_seconds
+    start = time.perf_counter()
+    try:
+        success = setup_ffmpeg_path()
+        if not success:
+            logger.warning("FFmpeg未正确配置，视频处理功能可能无法使用")
+            return False
+
+        ffmpeg_path = shutil.which("ffmpeg")
+        if ffmpeg_path and os.environ.get(_FFMPEG_READY_ENV) == ffmpeg_path:
+            logger.debug(f"FFmpeg已由父进程验证: {ffmpeg_path}")
+            return True
         # 验证ffmpeg是否真的可用
         if check_ffmpeg_available():
             logger.success("✓ FFmpeg已就绪")
-        else:
-            logger.warning("FFmpeg配置完成但无法正常运行，请检查")
-    else:
-        logger.warning("FFmpeg未正确配置，视频处理功能可能无法使用")
+            if ffmpeg_path:
+                os.environ[_FFMPEG_READY_ENV] = ffmpeg_path
+            return True
+        logger.warning("FFmpeg配置完成但无法正常运行，请检查")
+        return False
+    finally:
+        init_seconds = time.perf_counter() - start
 
 
 if __name__ == "__main__":
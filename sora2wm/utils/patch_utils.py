@@ -0,0 +1,236 @@
+"""
+修复结果复用工具模块
+
+镜头静止时，水印周围的画面在相邻帧之间几乎不变，
+对这些帧可以直接复用最近一次推理得到的修复块，跳过LaMa推理
+"""
+
+from collections import deque
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from sora2wm.configs import (
+    PATCH_REUSE_CACHE_SIZE,
+    PATCH_REUSE_COLOR_CORRECTION,
+    PATCH_REUSE_MAX_HITS,
+    PATCH_REUSE_RING,
+    PATCH_REUSE_TOLERANCE,
+)
+
+# 边界框类型：(x1, y1, x2, y2)
+BBox = Tuple[int, int, int, int]
+
+# 计算签名时环形区域的下采样倍数
+_SIGNATURE_SCALE = 4
+
+
+def clamp_bbox(bbox, image_shape) -> BBox:
+    """
+    将边界框裁剪到图像范围内并转为整数
+
+    参数:
+    - bbox: 边界框 (x1, y1, x2, y2)
+    - image_shape: 图像形状 (高, 宽, ...)
+
+    返回:
+    - 裁剪后的整数边界框
+    """
+    img_h, img_w = image_shape[:2]
+    x1 = min(max(int(bbox[0]), 0), img_w)
+    y1 = min(max(int(bbox[1]), 0), img_h)
+    x2 = min(max(int(bbox[2]), 0), img_w)
+    y2 = min(max(int(bbox[3]), 0), img_h)
+    return x1, y1, x2, y2
+
+
+class PatchEntry:
+    """一个缓存的修复块"""
+
+    def __init__(self, bbox: BBox, signature: np.ndarray):
+        """
+        初始化缓存条目
+
+        参数:
+        - bbox: 修复块对应的边界框
+        - signature: 推理帧中边界框周围环形区域的签名
+        """
+        self.bbox = bbox
+        self.signature = signature
+        # 签名的各通道均值，用于颜色校正
+        self.mean = signature.mean(axis=0)
+        # 修复后的边界框区域，推理完成前为None
+        self.patch: Optional[np.ndarray] = None
+        # 被复用的次数
+        self.hits = 0
+
+
+class PatchReuseCache:
+    """
+    修复块复用缓存
+
+    以边界框和其周围环形区域（不含水印本身）的下采样签名作为键。
+    当前帧的签名与同一边界框的某个最近推理帧的签名平均绝对差不超过容差时，
+    直接复用该帧的修复块；开启颜色校正时先消除两帧环形区域的整体亮度/色彩偏移再比较，
+    并把偏移量加到复用的修复块上。
+
+    边界框必须完全一致才能复用，因此与步长检测（detect_stride > 1）配合时命中率最高。
+    每个视频应新建一个缓存。
+    """
+
+    def __init__(
+        self,
+        tolerance: float = PATCH_REUSE_TOLERANCE,
+        ring: int = PATCH_REUSE_RING,
+        size: int = PATCH_REUSE_CACHE_SIZE,
+        max_hits: int = PATCH_REUSE_MAX_HITS,
+        color_correction: bool = PATCH_REUSE_COLOR_CORRECTION,
+    ):
+        """
+        初始化缓存
+
+        参数:
+        - tolerance: 签名平均绝对差的容差（像素值，0-255）
+        - ring: 边界框周围参与签名计算的环形区域宽度（像素）
+        - size: 最多缓存的修复块数量
+        - max_hits: 单个修复块最多被复用的次数，超过后强制重新推理
+        - color_correction: 是否对复用的修复块做颜色校正
+        """
+        self.tolerance = tolerance
+        self.ring = max(1, ring)
+        self.max_hits = max_hits
+        self.color_correction = color_correction
+        self.entries = deque(maxlen=max(1, size))
+        # 查询次数
+        self.lookups = 0
+        # 命中次数（即跳过的推理次数）
+        self.hits = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """缓存命中率"""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def skipped_inferences(self) -> int:
+        """因复用而跳过的推理次数"""
+        return self.hits
+
+    def signature(self, image: np.ndarray, bbox: BBox) -> np.ndarray:
+        """
+        计算边界框周围环形区域的签名
+
+        参数:
+        - image: 输入图像（BGR格式）
+        - bbox: 已裁剪到图像范围内的边界框
+
+        返回:
+        - 形状为 (N, 通道数) 的float32数组
+        """
+        img_h, img_w = image.shape[:2]
+        x1, y1, x2, y2 = bbox
+        strips = [
+            image[max(y1 - self.ring, 0) : y1, x1:x2],  # 上
+            image[y2 : min(y2 + self.ring, img_h), x1:x2],  # 下
+            image[y1:y2, max(x1 - self.ring, 0) : x1],  # 左
+            image[y1:y2, x2 : min(x2 + self.ring, img_w)],  # 右
+        ]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        parts = []
+        for strip in strips:
+            if strip.size == 0:
+                continue
+            strip_h, strip_w = strip.shape[:2]
+            small = cv2.resize(
+                strip,
+                (
+                    max(1, strip_w // _SIGNATURE_SCALE),
+                    max(1, strip_h // _SIGNATURE_SCALE),
+                ),
+                interpolation=cv2.INTER_AREA,
+            )
+            parts.append(small.reshape(-1, channels).astype(np.float32))
+        if not parts:
+            return np.zeros((0, channels), dtype=np.float32)
+        return np.concatenate(parts)
+
+    def lookup(
+        self, bbox: BBox, signature: np.ndarray
+    ) -> Tuple[Optional[PatchEntry], Optional[np.ndarray]]:
+        """
+        查找可复用的修复块
+
+        参数:
+        - bbox: 已裁剪到图像范围内的边界框
+        - signature: 当前帧的环形区域签名
+
+        返回:
+        - (缓存条目, 颜色偏移)，未命中时为 (None, None)；
+          条目的修复块可能仍在等待同一批次的推理结果
+        """
+        self.lookups += 1
+        if not len(signature):
+            return None, None
+
+        best, best_offset, best_diff = None, None, None
+        mean = signature.mean(axis=0)
+        for entry in self.entries:
+            if entry.bbox != bbox or entry.hits >= self.max_hits:
+                continue
+            if entry.signature.shape != signature.shape:
+                continue
+            offset = mean - entry.mean if self.color_correction else None
+            diff = signature - entry.signature
+            if offset is not None:
+                diff -= offset
+            diff = float(np.abs(diff).mean())
+            if best_diff is None or diff < best_diff:
+                best, best_offset, best_diff = entry, offset, diff
+
+        if best is None or best_diff > self.tolerance:
+            return None, None
+        best.hits += 1
+        self.hits += 1
+        return best, best_offset
+
+    def add(self, bbox: BBox, signature: np.ndarray) -> PatchEntry:
+        """
+        为即将推理的帧新建缓存条目（推理完成后设置条目的patch）
+
+        参数:
+        - bbox: 已裁剪到图像范围内的边界框
+        - signature: 该帧的环形区域签名
+
+        返回:
+        - 新的缓存条目
+        """
+        entry = PatchEntry(bbox, signature)
+        self.entries.append(entry)
+        return entry
+
+    @staticmethod
+    def corrected_patch(
+        entry: PatchEntry, offset: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """
+        返回经过颜色校正的修复块
+
+        参数:
+        - entry: 缓存条目（patch已设置）
+        - offset: 各通道的颜色偏移，为None时不校正
+
+        返回:
+        - 修复块（uint8）
+        """
+        if offset is None or float(np.abs(offset).max()) < 0.5:
+            return entry.patch
+        corrected = entry.patch.astype(np.float32) + offset
+        return np.clip(corrected, 0, 255).astype(np.uint8)
+
+    def summary(self) -> str:
+        """返回一行可读的统计摘要"""
+        return (
+            f"修复块复用: 查询 {self.lookups} 次, 命中率 {self.hit_rate:.1%}, "
+            f"跳过推理 {self.skipped_inferences} 次"
+        )
@@ -0,0 +1,258 @@
+"""
+多线程流水线工具模块
+
+将处理流程拆分为若干阶段，每个阶段运行在独立线程中，阶段之间通过有界队列连接，
+使解码、推理和编码可以并行执行，端到端耗时接近最慢的阶段而不是各阶段之和
+"""
+
+import threading
+import time
+from queue import Empty, Full, Queue
+from typing import Callable, Iterable, List, Optional
+
+from loguru import logger
+
+# 流结束标记
+_END = object()
+
+
+def _item_size(item) -> int:
+    """返回一个流水线数据项包含的帧数（列表按长度计，其余按1计）"""
+    if isinstance(item, (list, tuple)):
+        return len(item)
+    return 1
+
+
+class StageStats:
+    """单个流水线阶段的统计信息"""
+
+    def __init__(self, name: str, queue_capacity: int = 0):
+        """
+        初始化阶段统计
+
+        参数:
+        - name: 阶段名称
+        - queue_capacity: 输入队列容量（源阶段为0）
+        """
+        self.name = name
+        self.queue_capacity = queue_capacity
+        # 处理的帧数
+        self.items = 0
+        # 实际处理耗时（不含等待队列的时间）
+        self.busy_time = 0.0
+        # 阶段从启动到结束的总耗时
+        self.wall_time = 0.0
+        # 输入队列占用采样
+        self.queue_samples = 0
+        self.queue_total = 0
+        self.queue_max = 0
+
+    def record_queue(self, size: int):
+        """记录一次输入队列占用采样"""
+        self.queue_samples += 1
+        self.queue_total += size
+        self.queue_max = max(self.queue_max, size)
+
+    @property
+    def throughput(self) -> float:
+        """阶段自身的处理能力（帧/秒，按实际处理耗时计算）"""
+        return self.items / self.busy_time if self.busy_time > 0 else 0.0
+
+    @property
+    def avg_queue(self) -> float:
+        """输入队列的平均占用"""
+        return self.queue_total / self.queue_samples if self.queue_samples else 0.0
+
+    def as_dict(self) -> dict:
+        """以字典形式返回统计信息"""
+        return {
+            "name": self.name,
+            "items": self.items,
+            "busy_time": self.busy_time,
+            "wall_time": self.wall_time,
+            "throughput": self.throughput,
+            "avg_queue": self.avg_queue,
+            "max_queue": self.queue_max,
+            "queue_capacity": self.queue_capacity,
+        }
+
+    def summary(self) -> str:
+        """返回一行可读的统计摘要"""
+        text = (
+            f"[{self.name}] 帧数: {self.items}, "
+            f"处理耗时: {self.busy_time:.2f}s, 吞吐: {self.throughput:.2f} fps"
+        )
+        if self.queue_capacity:
+            text += (
+                f", 输入队列占用: 平均 {self.avg_queue:.2f} / "
+                f"最大 {self.queue_max} / 容量 {self.queue_capacity}"
+            )
+        return text
+
+
+class StagePipeline:
+    """
+    多线程阶段流水线
+
+    第一个阶段是数据源（在独立线程中迭代），后续每个阶段是一个函数，
+    接收上一阶段的一个数据项并返回零个或多个输出项；可选的flush函数在流结束时调用，
+    用于输出阶段内部缓存的数据。任一阶段出错时整条流水线停止，并在调用线程中重新抛出异常。
+    """
+
+    def __init__(self, queue_size: int = 4):
+        """
+        初始化流水线
+
+        参数:
+        - queue_size: 阶段之间每个有界队列的容量（以数据项计）
+        """
+        self.queue_size = max(1, queue_size)
+        self._stages = []
+        self._stop = threading.Event()
+        self._errors = []
+
+    def add_stage(
+        self,
+        name: str,
+        fn: Callable[[object], Iterable],
+        flush: Optional[Callable[[], Iterable]] = None,
+    ) -> "StagePipeline":
+        """
+        追加一个处理阶段
+
+        参数:
+        - name: 阶段名称
+        - fn: 处理函数，接收一个数据项，返回输出数据项列表
+        - flush: 流结束时调用的函数，返回剩余的输出数据项列表，可选
+
+        返回:
+        - 流水线自身，便于链式调用
+        """
+        self._stages.append((name, fn, flush))
+        return self
+
+    def run(self, source: Iterable, source_name: str = "source") -> List[StageStats]:
+        """
+        运行流水线直到数据源耗尽
+
+        参数:
+        - source: 数据源，可迭代对象
+        - source_name: 数据源阶段名称
+
+        返回:
+        - 各阶段的统计信息列表（按阶段顺序）
+        """
+        self._stop.clear()
+        self._errors = []
+        queues = [Queue(maxsize=self.queue_size) for _ in self._stages]
+        stats = [StageStats(source_name)] + [
+            StageStats(name, self.queue_size) for name, _, _ in self._stages
+        ]
+
+        threads = [
+            threading.Thread(
+                target=self._run_source,
+                args=(source, queues[0] if queues else None, stats[0]),
+                name=f"pipeline-{source_name}",
+                daemon=True,
+            )
+        ]
+        for i, (name, fn, flush) in enumerate(self._stages):
+            out_queue = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(fn, flush, queues[i], out_queue, stats[i + 1]),
+                    name=f"pipeline-{name}",
+                    daemon=True,
+                )
+            )
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        return stats
+
+    def _fail(self, e: BaseException):
+        """记录异常并通知所有阶段停止"""
+        logger.error(f"流水线阶段 {threading.current_thread().name} 出错: {e}")
+        self._errors.append(e)
+        self._stop.set()
+
+    def _put(self, queue: Optional[Queue], item) -> bool:
+        """向队列放入数据项，流水线停止时返回False"""
+        if queue is None:
+            return True
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _get(self, queue: Queue, stats: StageStats):
+        """从队列取出数据项，流水线停止时返回结束标记"""
+        stats.record_queue(queue.qsize())
+        while not self._stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return _END
+
+    def _run_source(self, source: Iterable, out_queue: Optional[Queue], stats):
+        """数据源线程：迭代数据源并放入第一个队列"""
+        start = time.perf_counter()
+        try:
+            iterator = iter(source)
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.busy_time += time.perf_counter() - t0
+                stats.items += _item_size(item)
+                if not self._put(out_queue, item):
+                    break
+            self._put(out_queue, _END)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            stats.wall_time = time.perf_counter() - start
+
+    def _run_stage(self, fn, flush, in_queue: Queue, out_queue, stats: StageStats):
+        """处理阶段线程：从输入队列取数据、处理并放入输出队列"""
+        start = time.perf_counter()
+        try:
+            while True:
+                item = self._get(in_queue, stats)
+                if item is _END:
+                    break
+                t0 = time.perf_counter()
+                outputs = fn(item)
+                stats.busy_time += time.perf_counter() - t0
+                stats.items += _item_size(item)
+                for output in outputs or []:
+                    if not self._put(out_queue, output):
+                        return
+
+            if self._stop.is_set():
+                return
+            if flush is not None:
+                t0 = time.perf_counter()
+                outputs = flush()
+                stats.busy_time += time.perf_counter() - t0
+                for output in outputs or []:
+                    if not self._put(out_queue, output):
+                        return
+            self._put(out_queue, _END)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            stats.wall_time = time.perf_counter() - start
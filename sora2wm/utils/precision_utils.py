@@ -0,0 +1,203 @@
+"""
+低精度推理工具模块
+
+提供低精度推理模式（int8动态量化、bfloat16自动混合精度）的支持检测和模型转换，
+以及用于精度守卫的PSNR/SSIM计算
+"""
+
+import importlib.util
+from contextlib import nullcontext
+from pathlib import Path
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# 支持的推理精度
+#   fp32: 默认精度
+#   int8: onnxruntime动态量化（卷积/矩阵乘权重量化为int8，需要ONNX后端）
+#   bf16: torch自动混合精度（需要CPU支持bfloat16指令）
+PRECISIONS = ("fp32", "int8", "bf16")
+
+
+def check_precision(precision: str) -> str:
+    """
+    校验推理精度名称
+
+    参数:
+    - precision: 推理精度名称
+
+    返回:
+    - 推理精度名称
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"未知的推理精度: {precision}，可选: {', '.join(PRECISIONS)}")
+    return precision
+
+
+def bf16_supported() -> bool:
+    """
+    判断当前CPU是否支持高效的bfloat16计算（AVX512_BF16或AMX）
+
+    返回:
+    - 支持时返回True
+    """
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        pass
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_bf16(precision: str, device) -> str:
+    """
+    bf16在不支持的CPU上退回fp32
+
+    参数:
+    - precision: 请求的推理精度
+    - device: 推理设备
+
+    返回:
+    - 实际使用的推理精度
+    """
+    if precision != "bf16" or str(device).startswith("cuda"):
+        return precision
+    if not bf16_supported():
+        logger.warning("当前CPU不支持bfloat16指令，退回fp32推理")
+        return "fp32"
+    return precision
+
+
+def onnxruntime_available() -> bool:
+    """
+    判断是否安装了onnxruntime（int8动态量化和推理都依赖它）
+
+    返回:
+    - 已安装时返回True
+    """
+    return importlib.util.find_spec("onnxruntime") is not None
+
+
+def resolve_int8(precision: str) -> str:
+    """
+    int8在未安装onnxruntime时退回fp32
+
+    参数:
+    - precision: 请求的推理精度
+
+    返回:
+    - 实际使用的推理精度
+    """
+    if precision != "int8":
+        return precision
+    if not onnxruntime_available():
+        logger.warning("未安装onnxruntime，无法进行int8动态量化，退回fp32推理")
+        return "fp32"
+    return precision
+
+
+def autocast_context(precision: str, device):
+    """
+    返回推理时使用的自动混合精度上下文
+
+    参数:
+    - precision: 推理精度
+    - device: 推理设备
+
+    返回:
+    - bf16时为torch.autocast上下文，否则为空上下文
+    """
+    if precision != "bf16":
+        return nullcontext()
+    import torch
+
+    device_type = "cuda" if str(device).startswith("cuda") else "cpu"
+    return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
+
+
+def quantized_path(model_path: Path) -> Path:
+    """返回ONNX模型对应的int8量化模型路径（如 best.onnx -> best.int8.onnx）"""
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}.int8{model_path.suffix}")
+
+
+def quantize_onnx_dynamic(model_path: Path, output_path: Path | None = None) -> Path:
+    """
+    对ONNX模型做int8动态量化（已存在时直接返回）
+
+    只量化权重可静态确定的卷积和矩阵乘，激活在运行时按张量量化；
+    FFT等无法量化的算子保持fp32
+
+    参数:
+    - model_path: fp32 ONNX模型路径
+    - output_path: 量化模型路径，默认为quantized_path(model_path)
+
+    返回:
+    - 量化模型路径
+    """
+    output_path = Path(output_path or quantized_path(model_path))
+    if output_path.exists():
+        return output_path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"int8动态量化ONNX模型: {model_path} -> {output_path}")
+    quantize_dynamic(
+        str(model_path),
+        str(output_path),
+        op_types_to_quantize=["Conv", "MatMul"],
+        # CPU上的ConvInteger只支持uint8权重
+        weight_type=QuantType.QUInt8,
+    )
+    return output_path
+
+
+def psnr(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """
+    计算两张uint8图像的PSNR
+
+    参数:
+    - reference: 参考图像
+    - candidate: 待比较图像（与参考图像形状相同）
+
+    返回:
+    - PSNR（dB），两图完全相同时为inf
+    """
+    mse = np.mean((reference.astype(np.float64) - candidate.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return float(10 * np.log10(255.0**2 / mse))
+
+
+def ssim(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """
+    计算两张uint8图像的平均SSIM（11x11高斯窗口，多通道取均值）
+
+    参数:
+    - reference: 参考图像
+    - candidate: 待比较图像（与参考图像形状相同）
+
+    返回:
+    - SSIM，范围 [-1, 1]
+    """
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    x = reference.astype(np.float64)
+    y = candidate.astype(np.float64)
+
+    def blur(img):
+        return cv2.GaussianBlur(img, (11, 11), 1.5)
+
+    mu_x, mu_y = blur(x), blur(y)
+    sigma_x = blur(x * x) - mu_x**2
+    sigma_y = blur(y * y) - mu_y**2
+    sigma_xy = blur(x * y) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / (
+        (mu_x**2 + mu_y**2 + c1) * (sigma_x + sigma_y + c2)
+    )
+    return float(ssim_map.mean())
@@ -0,0 +1,120 @@
+"""
+分段并行处理工具函数模块
+
+按关键帧（GOP边界）将视频切分为若干片段，并使用ffmpeg concat demuxer无损拼接编码后的片段
+"""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import ffmpeg
+from loguru import logger
+
+from sora2wm.utils.video_utils import select_audio_codec
+
+
+def plan_segments(
+    keyframe_indices: List[int],
+    total_frames: int,
+    num_segments: int,
+    min_segment_frames: int = 1,
+) -> List[Tuple[int, int]]:
+    """
+    按关键帧规划视频片段
+
+    片段边界只落在关键帧上，各片段长度尽量接近 total_frames / num_segments
+
+    参数:
+    - keyframe_indices: 升序排列的关键帧帧索引
+    - total_frames: 视频总帧数
+    - num_segments: 期望的片段数
+    - min_segment_frames: 单个片段的最少帧数
+
+    返回:
+    - [(起始帧, 结束帧), ...]，结束帧不包含，片段首尾相接覆盖整个视频
+    """
+    if total_frames <= 0:
+        return []
+    num_segments = max(1, num_segments)
+    target = max(total_frames / num_segments, min_segment_frames)
+    candidates = [idx for idx in keyframe_indices if 0 < idx < total_frames]
+
+    boundaries = [0]
+    for i in range(1, num_segments):
+        wanted = i * target
+        if wanted >= total_frames:
+            break
+        # 选择距离理想切分点最近的关键帧
+        valid = [
+            idx
+            for idx in candidates
+            if idx - boundaries[-1] >= min_segment_frames
+            and total_frames - idx >= min_segment_frames
+        ]
+        if not valid:
+            break
+        best = min(valid, key=lambda idx: abs(idx - wanted))
+        if best > boundaries[-1]:
+            boundaries.append(best)
+    boundaries.append(total_frames)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def segment_decode_range(start_frame: int, end_frame: int, overlap: int) -> Tuple[int, int]:
+    """
+    计算处理片段时需要解码的帧范围
+
+    片段前多解码overlap帧、后多解码1帧，供漏检帧补全跨越片段边界使用；
+    起点不小于0，超出视频末尾的部分由VideoLoader截断
+
+    参数:
+    - start_frame: 片段起始帧（包含）
+    - end_frame: 片段结束帧（不包含）
+    - overlap: 片段前额外检测的帧数
+
+    返回:
+    - (解码起始帧, 解码结束帧)，结束帧不包含
+    """
+    return max(0, start_frame - max(0, overlap)), end_frame + 1
+
+
+def concat_segments(
+    segment_paths: List[Path],
+    output_path: Path,
+    audio_source: Optional[Path] = None,
+    audio_codec: Optional[str] = None,
+    audio_options: Optional[dict] = None,
+):
+    """
+    使用concat demuxer无损拼接编码参数相同的视频片段
+
+    参数:
+    - segment_paths: 按顺序排列的片段文件路径
+    - output_path: 拼接后的输出路径
+    - audio_source: 提供音频轨道的原始视频路径，可选（拼接时一并封装音频）
+    - audio_codec: 原始音频流的编码格式，为None时表示没有音频
+    - audio_options: 音频输入的ffmpeg参数（如裁剪到处理范围的ss/t），可选
+    """
+    list_path = output_path.parent / f"{output_path.stem}_segments.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for segment_path in segment_paths:
+            # concat列表中的单引号需要转义
+            escaped = str(Path(segment_path).absolute()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    logger.info(f"拼接 {len(segment_paths)} 个视频片段...")
+    streams = [ffmpeg.input(str(list_path), format="concat", safe=0)]
+    output_options = {"vcodec": "copy"}  # 直接复制视频流，不重新编码
+    if audio_source is not None and audio_codec is not None:
+        streams.append(ffmpeg.input(str(audio_source), **(audio_options or {})).audio)
+        output_options["acodec"] = select_audio_codec(audio_codec, output_path)
+
+    try:
+        (
+            ffmpeg.output(*streams, str(output_path), **output_options)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    finally:
+        list_path.unlink(missing_ok=True)
@@ -0,0 +1,129 @@
+"""
+流式处理工具函数模块
+
+提供滑动前瞻窗口，用于在不缓存整段视频的情况下补全漏检帧的水印位置
+"""
+
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 边界框类型：(x1, y1, x2, y2)
+BBox = Tuple[int, int, int, int]
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    将可迭代对象按固定大小切分为列表
+
+    参数:
+    - iterable: 任意可迭代对象
+    - size: 每块的最大元素数
+
+    返回:
+    - 依次生成每一块（最后一块可能不足size个元素）
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def backfill_bboxes(bboxes: List[Optional[BBox]]) -> List[Optional[BBox]]:
+    """
+    两阶段流程的漏检帧补全
+
+    按帧顺序处理漏检帧：优先使用前一帧（已补全后）的水印位置，其次使用后一帧的原始检测结果
+
+    参数:
+    - bboxes: 各帧的原始检测边界框，未检测到时为None
+
+    返回:
+    - 补全后的边界框列表（仍可能包含None）
+    """
+    filled = list(bboxes)
+    last = len(filled) - 1
+    for idx, bbox in enumerate(bboxes):
+        if bbox is not None:
+            continue
+        # 前一帧已按顺序补全，后一帧尚未处理，仍为原始检测结果
+        before_box = filled[max(idx - 1, 0)]
+        after_box = filled[min(idx + 1, last)]
+        if before_box is not None:
+            filled[idx] = before_box
+        elif after_box is not None:
+            filled[idx] = after_box
+    return filled
+
+
+class BBoxBackfillWindow:
+    """
+    漏检帧补全的滑动前瞻窗口
+
+    与两阶段流程的补全规则（backfill_bboxes）完全一致：
+    漏检帧优先使用前一帧（已补全后）的水印位置，其次使用后一帧的原始检测结果。
+    窗口只需前瞻一帧即可确定当前帧的边界框，因此内存占用与视频长度无关。
+    """
+
+    def __init__(self):
+        """初始化窗口状态"""
+        # 待输出的帧：[帧索引, 帧数据, 原始检测边界框]
+        self.pending = deque()
+        # 上一个已输出帧的最终边界框
+        self.prev_bbox: Optional[BBox] = None
+
+    def __len__(self):
+        """返回窗口中待输出的帧数"""
+        return len(self.pending)
+
+    def push(
+        self, idx: int, frame: np.ndarray, bbox: Optional[BBox]
+    ) -> List[Tuple[int, np.ndarray, Optional[BBox]]]:
+        """
+        加入一帧检测结果，返回已能确定边界框的帧
+
+        参数:
+        - idx: 帧索引
+        - frame: 帧数据
+        - bbox: 该帧的原始检测边界框，未检测到时为None
+
+        返回:
+        - (帧索引, 帧数据, 最终边界框) 列表，按帧顺序排列
+        """
+        self.pending.append((idx, frame, bbox))
+        ready = []
+        # 队首帧已检测到水印，或已有后一帧可供参考时即可输出
+        while self.pending and (
+            self.pending[0][2] is not None or len(self.pending) > 1
+        ):
+            ready.append(self._pop())
+        return ready
+
+    def flush(self) -> List[Tuple[int, np.ndarray, Optional[BBox]]]:
+        """
+        输出窗口中剩余的所有帧（视频结束时调用）
+
+        返回:
+        - (帧索引, 帧数据, 最终边界框) 列表
+        """
+        ready = []
+        while self.pending:
+            ready.append(self._pop())
+        return ready
+
+    def _pop(self) -> Tuple[int, np.ndarray, Optional[BBox]]:
+        """弹出队首帧并确定其最终边界框"""
+        idx, frame, bbox = self.pending.popleft()
+        if bbox is None:
+            # 优先使用前一帧的水印位置
+            if self.prev_bbox is not None:
+                bbox = self.prev_bbox
+            # 如果前一帧没有，使用后一帧的原始检测结果
+            elif self.pending:
+                bbox = self.pending[0][2]
+        self.prev_bbox = bbox
+        return idx, frame, bbox
@@ -1,3 +1,5 @@
+import math
+import threading
 from pathlib import Path
 
 # 初始化ffmpeg路径配置（优先使用本地ffmpeg）
@@ -6,6 +8,132 @@ init_ffmpeg()
 
 import ffmpeg
 import numpy as np
+from loguru import logger
+
+
+# 各容器格式可直接复制（不重新编码）的音频编码，None表示不限制
+COPYABLE_AUDIO_CODECS = {
+    ".mp4": {"aac", "mp3", "alac", "ac3", "eac3", "opus", "flac"},
+    ".m4v": {"aac", "mp3", "alac", "ac3", "eac3"},
+    ".mov": {"aac", "mp3", "alac", "ac3", "eac3", "pcm_s16le", "pcm_s24le"},
+    ".mkv": None,
+    ".avi": {"mp3", "ac3", "pcm_s16le"},
+}
+
+
+def select_audio_codec(audio_codec: str, output_path: Path) -> str:
+    """
+    根据输出容器选择音频编码方式
+
+    参数:
+    - audio_codec: 源音频流的编码格式
+    - output_path: 输出文件路径（根据后缀判断容器）
+
+    返回:
+    - "copy"（容器支持时直接复制音频流），否则为"aac"
+    """
+    suffix = Path(output_path).suffix.lower()
+    if suffix not in COPYABLE_AUDIO_CODECS:
+        return "aac"
+    copyable = COPYABLE_AUDIO_CODECS[suffix]
+    if copyable is None or audio_codec in copyable:
+        return "copy"
+    return "aac"
+
+
+class FramePool:
+    """
+    预分配的可写帧缓冲池
+
+    解码器通过acquire租用缓冲区并用readinto直接写入，下游处理完一帧后调用release归还，
+    缓冲区在池中循环复用，稳定状态下不再为每帧分配内存。
+    池中没有空闲缓冲区时会额外分配一个（之后同样参与复用），因此即使下游持有的帧数
+    超过预分配数量也不会阻塞。acquire和release可以在不同线程中调用。
+    """
+
+    def __init__(self, height: int, width: int, size: int):
+        """
+        初始化缓冲池
+
+        参数:
+        - height: 帧高度
+        - width: 帧宽度
+        - size: 预分配的缓冲区数量
+        """
+        self.shape = (height, width, 3)
+        self._lock = threading.Lock()
+        self._free = [np.empty(self.shape, dtype=np.uint8) for _ in range(size)]
+        # 已租出的缓冲区：id -> 缓冲区
+        self._leased = {}
+        # 已分配的缓冲区总数
+        self.allocated = size
+
+    def __len__(self):
+        """返回当前空闲的缓冲区数量"""
+        return len(self._free)
+
+    @property
+    def leased(self) -> int:
+        """当前已租出的缓冲区数量"""
+        return len(self._leased)
+
+    def acquire(self) -> np.ndarray:
+        """
+        租用一个可写缓冲区
+
+        返回:
+        - 形状为 (高, 宽, 3) 的uint8数组，内容未初始化
+        """
+        with self._lock:
+            if self._free:
+                frame = self._free.pop()
+            else:
+                frame = np.empty(self.shape, dtype=np.uint8)
+                self.allocated += 1
+            self._leased[id(frame)] = frame
+        return frame
+
+    def release(self, frame: np.ndarray):
+        """
+        归还缓冲区，归还后调用方不能再使用该帧
+
+        参数:
+        - frame: acquire返回的数组或它的切片视图；不属于本池或已归还的数组会被忽略
+        """
+        with self._lock:
+            for candidate in (frame, frame.base):
+                if candidate is None:
+                    continue
+                buffer = self._leased.pop(id(candidate), None)
+                if buffer is not None:
+                    self._free.append(buffer)
+                    return
+
+
+def read_frame_into(stream, buffer: np.ndarray) -> bool:
+    """
+    从管道中读取一整帧到预分配的缓冲区
+
+    管道读取可能返回不足一帧的数据，这里循环读取直到填满缓冲区或遇到流结束
+
+    参数:
+    - stream: 支持readinto的二进制流
+    - buffer: 目标缓冲区（C连续的uint8数组）
+
+    返回:
+    - 读满一整帧时返回True，流结束时返回False（不完整的末帧会被丢弃）
+    """
+    view = memoryview(buffer).cast("B")
+    total = len(view)
+    filled = 0
+    while filled < total:
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    if 0 < filled < total:
+        logger.warning(f"视频流在帧中间结束，丢弃不完整的帧（{filled}/{total} 字节）")
+    return filled == total
 
 
 class VideoLoader:
@@ -15,16 +143,57 @@ class VideoLoader:
     基于ffmpeg实现，支持逐帧读取视频，自动处理视频信息获取和资源清理
     """
     
-    def __init__(self, video_path: Path):
+    def __init__(
+        self,
+        video_path: Path,
+        start_frame: int = 0,
+        end_frame: int | None = None,
+        pool_size: int = 0,
+        start_time: float | None = None,
+        end_time: float | None = None,
+        detect_size: int = 0,
+    ):
         """
         初始化视频加载器
         
         参数:
         - video_path: 视频文件路径
+        - start_frame: 起始帧索引（包含），通过输入端-ss定位，无需解码之前的帧
+        - end_frame: 结束帧索引（不包含），默认读取到视频末尾
+        - start_time: 起始时间（秒），指定时覆盖start_frame，从时间戳不早于该时间的第一帧开始
+        - end_time: 结束时间（秒），指定时覆盖end_frame，只读取时间戳早于该时间的帧
+        - pool_size: 预分配的帧缓冲区数量，大于0时迭代得到的帧从缓冲池租用，
+          下游处理完后必须调用release归还；为0时每帧单独分配
+        - detect_size: 低分辨率检测帧的最长边，大于0且小于原视频最长边时，
+          同一次解码通过split/scale滤镜额外输出缩小的检测帧（见iter_with_detect_frames）
         """
         self.video_path = video_path
         # 获取视频信息（分辨率、帧率、总帧数等）
         self.get_video_info()
+        # 时间戳换算为帧索引
+        if start_time is not None:
+            start_frame = self.time_to_frame(start_time)
+        if end_time is not None:
+            end_frame = self.time_to_frame(end_time)
+        # 读取的帧范围
+        self.start_frame = min(max(0, start_frame), self.total_frames)
+        if end_frame is None:
+            self.end_frame = self.total_frames
+        else:
+            self.end_frame = min(max(end_frame, self.start_frame), self.total_frames)
+        # 低分辨率检测帧尺寸（不启用时与原视频相同）
+        scale = detect_size / max(self.width, self.height) if detect_size > 0 else 1.0
+        if scale < 1.0:
+            self.detect_width = max(1, round(self.width * scale))
+            self.detect_height = max(1, round(self.height * scale))
+        else:
+            self.detect_width, self.detect_height = self.width, self.height
+        # 帧缓冲池（启用检测帧时，检测帧拼接在原始帧下方，共用一个缓冲区）
+        self.frame_pool = (
+            FramePool(self._buffer_height, self.width, pool_size)
+            if pool_size > 0
+            else None
+        )
 
     def get_video_info(self):
         """
@@ -43,6 +212,8 @@ class VideoLoader:
         
         # 计算帧率（注意：r_frame_rate通常是分数形式，需要eval计算）
         fps = eval(video_info["r_frame_rate"])
+        # 视频流的起始时间（关键帧时间戳需要减去该偏移）
+        self.stream_start_time = float(video_info.get("start_time", 0) or 0)
         
         # 存储视频基本信息
         self.width = width
@@ -61,21 +232,186 @@ class VideoLoader:
         original_bitrate = video_info.get("bit_rate", None)
         self.original_bitrate = original_bitrate
 
+        # 获取第一个音频流的编码格式（没有音频时为None）
+        audio_info = next(
+            (s for s in probe["streams"] if s["codec_type"] == "audio"), None
+        )
+        self.audio_codec = audio_info.get("codec_name") if audio_info else None
+
     def __len__(self):
-        """返回视频总帧数"""
-        return self.total_frames
+        """返回读取范围内的帧数"""
+        return self.end_frame - self.start_frame
+
+    @property
+    def has_detect_stream(self) -> bool:
+        """是否输出单独的低分辨率检测帧"""
+        return (self.detect_width, self.detect_height) != (self.width, self.height)
+
+    @property
+    def _buffer_height(self) -> int:
+        """每帧缓冲区的高度（原始帧加上拼接在下方的检测帧）"""
+        if self.has_detect_stream:
+            return self.height + self.detect_height
+        return self.height
+
+    def to_full_res_bbox(self, bbox):
+        """
+        将检测帧上的边界框映射回原始分辨率
+
+        向外扩展一个检测帧像素，弥补缩放带来的取整误差
+
+        参数:
+        - bbox: 检测帧上的边界框 (x1, y1, x2, y2)，为None时原样返回
+
+        返回:
+        - 原始分辨率下的边界框
+        """
+        if bbox is None or not self.has_detect_stream:
+            return bbox
+        sx = self.width / self.detect_width
+        sy = self.height / self.detect_height
+        x1, y1, x2, y2 = bbox
+        return (
+            max(0, math.floor((x1 - 1) * sx)),
+            max(0, math.floor((y1 - 1) * sy)),
+            min(self.width, math.ceil((x2 + 1) * sx)),
+            min(self.height, math.ceil((y2 + 1) * sy)),
+        )
+
+    def time_to_frame(self, timestamp: float) -> int:
+        """
+        将相对视频开头的时间戳换算为第一个不早于该时间的帧索引
+
+        参数:
+        - timestamp: 时间戳（秒）
+
+        返回:
+        - 帧索引（未裁剪到视频范围）
+        """
+        # 减去微小量，避免浮点误差使恰好落在帧时间戳上的时间被算到下一帧
+        return max(0, math.ceil(timestamp * self.fps - 1e-6))
+
+    @property
+    def is_partial(self) -> bool:
+        """是否只读取视频的一部分"""
+        return self.start_frame > 0 or self.end_frame < self.total_frames
+
+    @property
+    def start_seconds(self) -> float:
+        """读取范围的起始时间（秒）"""
+        return self.start_frame / self.fps
+
+    @property
+    def end_seconds(self) -> float:
+        """读取范围的结束时间（秒）"""
+        return self.end_frame / self.fps
+
+    def range_input_options(self) -> dict:
+        """
+        返回将同一视频的其他输入（如音频轨道）裁剪到读取范围的ffmpeg输入参数
+
+        返回:
+        - 读取整个视频时为空字典，否则为 {"ss": 起始时间, "t": 时长}
+        """
+        if not self.is_partial:
+            return {}
+        return {
+            "ss": self.start_seconds,
+            "t": self.end_seconds - self.start_seconds,
+        }
+
+    def release(self, frame: np.ndarray):
+        """
+        归还迭代得到的帧，使其缓冲区可以被后续帧复用
+
+        没有缓冲池时不做任何操作，因此下游可以无条件调用
+
+        参数:
+        - frame: 迭代得到的帧
+        """
+        if self.frame_pool is not None:
+            self.frame_pool.release(frame)
+
+    def get_keyframe_indices(self) -> list:
+        """
+        获取视频中所有关键帧的帧索引
+
+        只读取数据包的标志位，不解码视频，速度很快
+
+        返回:
+        - 升序排列的关键帧帧索引列表（至少包含0）
+        """
+        probe = ffmpeg.probe(
+            self.video_path,
+            select_streams="v:0",
+            show_entries="packet=pts_time,flags",
+        )
+        indices = {0}
+        for packet in probe.get("packets", []):
+            pts_time = packet.get("pts_time")
+            if "K" not in packet.get("flags", "") or pts_time in (None, "N/A"):
+                continue
+            idx = int(round((float(pts_time) - self.stream_start_time) * self.fps))
+            if 0 <= idx < self.total_frames:
+                indices.add(idx)
+        return sorted(indices)
 
     def __iter__(self):
         """
         迭代器方法，用于逐帧读取视频
         
-        生成器模式，每次yield一个视频帧
+        生成器模式，每次yield一个可写的视频帧（BGR格式），下游可以直接原地修改；
+        使用缓冲池时，帧在调用release之前一直归调用方所有
         确保即使提前退出迭代，资源也会被正确清理
         """
+        for frame, _ in self.iter_with_detect_frames():
+            yield frame
+
+    def iter_with_detect_frames(self):
+        """
+        逐帧读取视频，同时返回用于水印检测的帧
+
+        启用低分辨率检测帧时，ffmpeg在同一次解码中用split/scale滤镜生成缩小的检测帧，
+        并用vstack拼接在原始帧下方一起输出，只需一个管道且两路帧严格对齐；
+        检测帧上的边界框需要用to_full_res_bbox映射回原始分辨率。
+        未启用时检测帧就是原始帧本身。
+
+        返回:
+        - 依次生成 (原始帧, 检测帧)，原始帧的所有权约定与__iter__相同
+        """
+        # 读取范围为空时不启动ffmpeg
+        if self.end_frame <= self.start_frame:
+            return
+
+        input_options = {}
+        output_options = {}
+        if self.start_frame > 0:
+            # 输入端定位：提前半帧，保证起始帧被保留且前一帧被丢弃
+            input_options["ss"] = max(0.0, (self.start_frame - 0.5) / self.fps)
+        if self.end_frame < self.total_frames:
+            # 输入端-to让解复用器在范围结束后停止读取（延后半帧以免丢失末帧），
+            # 输出帧数由vframes精确限制
+            input_options["to"] = (self.end_frame + 0.5) / self.fps
+            output_options["vframes"] = self.end_frame - self.start_frame
+
+        video = ffmpeg.input(self.video_path, **input_options).video
+        if self.has_detect_stream:
+            # 一路保持原始分辨率，另一路缩小后补齐到原始宽度，上下拼接为一帧输出
+            split = video.filter_multi_output("split")
+            full = split[0].filter("format", "bgr24")
+            small = (
+                split[1]
+                .filter("scale", self.detect_width, self.detect_height)
+                .filter("format", "bgr24")
+                .filter("pad", self.width, self.detect_height, 0, 0)
+            )
+            video = ffmpeg.filter([full, small], "vstack")
+
         # 创建ffmpeg子进程，将视频输出为原始视频流
         process_in = (
-            ffmpeg.input(self.video_path)
-            .output("pipe:", format="rawvideo", pix_fmt="bgr24")  # 输出为BGR格式的原始视频
+            video.output(
+                "pipe:", format="rawvideo", pix_fmt="bgr24", **output_options
+            )  # 输出为BGR格式的原始视频
             .global_args("-loglevel", "error")  # 只输出错误信息
             .run_async(pipe_stdout=True)  # 异步运行，启用标准输出管道
         )
@@ -83,18 +419,29 @@ class VideoLoader:
         try:
             # 循环读取每一帧
             while True:
-                # 读取一帧的数据（宽度×高度×3通道）
-                in_bytes = process_in.stdout.read(self.width * self.height * 3)
+                # 直接读取到可写的帧缓冲区（宽度×高度×3通道）
+                if self.frame_pool is not None:
+                    buffer = self.frame_pool.acquire()
+                else:
+                    buffer = np.empty(
+                        (self._buffer_height, self.width, 3), dtype=np.uint8
+                    )
                 # 如果没有更多数据，退出循环
-                if not in_bytes:
+                if not read_frame_into(process_in.stdout, buffer):
+                    self.release(buffer)
                     break
 
-                # 将字节数据转换为numpy数组（BGR格式）
-                frame = np.frombuffer(in_bytes, np.uint8).reshape(
-                    [self.height, self.width, 3]
-                )
+                if self.has_detect_stream:
+                    # 原始帧是缓冲区上半部分的连续视图，检测帧复制出来（很小）
+                    frame = buffer[: self.height]
+                    detect_frame = np.ascontiguousarray(
+                        buffer[self.height :, : self.detect_width]
+                    )
+                else:
+                    frame = detect_frame = buffer
+
                 # 生成当前帧
-                yield frame
+                yield frame, detect_frame
         finally:
             # 确保进程被正确清理，即使提前退出迭代
             process_in.stdout.close()
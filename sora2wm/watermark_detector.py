@@ -1,12 +1,25 @@
 from pathlib import Path
 
+import cv2
 import numpy as np
 from loguru import logger
-from ultralytics import YOLO
 
-from sora2wm.configs import WATER_MARK_DETECT_YOLO_WEIGHTS
+from sora2wm.configs import (
+    DETECT_MIN_SIMILARITY,
+    DETECT_PRECISION,
+    DETECT_STRIDE,
+    DETECTOR_BACKEND,
+    WATER_MARK_DETECT_ONNX_WEIGHTS,
+    WATER_MARK_DETECT_YOLO_WEIGHTS,
+)
 from sora2wm.utils.download_utils import download_detector_weights
 from sora2wm.utils.devices_utils import get_device
+from sora2wm.utils.precision_utils import (
+    autocast_context,
+    check_precision,
+    resolve_bf16,
+    resolve_int8,
+)
 from sora2wm.utils.video_utils import VideoLoader
 
 # 基于Sora2水印模板进行检测，然后获取图标部分区域
@@ -15,15 +28,59 @@ from sora2wm.utils.video_utils import VideoLoader
 class Sora2WaterMarkDetector:
     """Sora2视频水印检测器"""
     
-    def __init__(self):
-        """初始化水印检测器"""
+    def __init__(
+        self, backend: str = DETECTOR_BACKEND, precision: str = DETECT_PRECISION
+    ):
+        """
+        初始化水印检测器
+
+        参数:
+        - backend: 检测后端，"ultralytics"（YOLO预测器）或 "onnx"（onnxruntime，不导入ultralytics）
+        - precision: 推理精度，"fp32"、"int8"（使用ONNX后端）或 "bf16"（使用ultralytics后端）
+        """
+        if backend not in ("ultralytics", "onnx"):
+            raise ValueError(f"未知的检测后端: {backend}，可选: ultralytics, onnx")
+        precision = resolve_int8(check_precision(precision))
+        # int8依赖onnxruntime动态量化，bf16依赖torch自动混合精度
+        required = {"int8": "onnx", "bf16": "ultralytics"}.get(precision, backend)
+        if required != backend:
+            logger.info(f"检测精度 {precision} 使用 {required} 后端")
+            backend = required
+        self.backend = backend
+        self.device = get_device()
+        self.precision = resolve_bf16(precision, self.device)
+        self.model = None
+        self.onnx_model = None
+
+        if backend == "onnx":
+            from sora2wm.utils.detect_utils import OnnxYoloDetector, export_detector_onnx
+
+            if not WATER_MARK_DETECT_ONNX_WEIGHTS.exists():
+                # 首次使用时由YOLO权重导出（需要ultralytics），生产环境应预先导出
+                logger.info(f"ONNX检测模型不存在，从YOLO权重导出")
+                download_detector_weights()
+                export_detector_onnx(
+                    WATER_MARK_DETECT_YOLO_WEIGHTS, WATER_MARK_DETECT_ONNX_WEIGHTS
+                )
+            model_path = WATER_MARK_DETECT_ONNX_WEIGHTS
+            if self.precision == "int8":
+                from sora2wm.utils.precision_utils import quantize_onnx_dynamic
+
+                model_path = quantize_onnx_dynamic(model_path)
+            logger.debug(f"开始加载ONNX水印检测模型。")
+            self.onnx_model = OnnxYoloDetector(model_path, device=str(self.device))
+            logger.debug(f"ONNX水印检测模型加载完成。")
+            return
+
+        from ultralytics import YOLO
+
         # 下载检测器权重文件（如果不存在）
         download_detector_weights()
         logger.debug(f"开始加载YOLO水印检测模型。")
         # 加载YOLO模型
         self.model = YOLO(WATER_MARK_DETECT_YOLO_WEIGHTS)
         # 将模型移至适当的设备（CPU或GPU）
-        self.model.to(str(get_device()))
+        self.model.to(str(self.device))
         logger.debug(f"YOLO水印检测模型加载完成。")
 
         # 设置模型为评估模式
@@ -39,24 +96,71 @@ class Sora2WaterMarkDetector:
         返回:
         - 字典，包含检测结果信息：检测状态、边界框、置信度和中心点
         """
+        if self.onnx_model is not None:
+            return self._parse_boxes(self.onnx_model.predict([input_image])[0])
         # 运行YOLO模型推理
-        results = self.model(input_image, verbose=False)
+        with autocast_context(self.precision, self.device):
+            results = self.model(input_image, verbose=False)
         # 提取第一个（也是唯一的）结果中的预测
-        result = results[0]
+        return self._parse_result(results[0])
+
+    def detect_batch(self, input_images: list) -> list:
+        """
+        在一次模型调用中批量检测多张图像中的水印
+
+        参数:
+        - input_images: 输入图像列表（numpy数组格式）
+
+        返回:
+        - 与输入一一对应的检测结果字典列表，格式与detect()相同
+        """
+        if len(input_images) == 0:
+            return []
+        if self.onnx_model is not None:
+            return [
+                self._parse_boxes(boxes)
+                for boxes in self.onnx_model.predict(list(input_images))
+            ]
+        # 一次性将整批图像送入YOLO模型推理
+        with autocast_context(self.precision, self.device):
+            results = self.model(list(input_images), verbose=False)
+        return [self._parse_result(result) for result in results]
+
+    @staticmethod
+    def _parse_result(result) -> dict:
+        """
+        将单张图像的YOLO推理结果转换为检测结果字典
 
-        # 检查是否有任何检测结果
-        if len(result.boxes) == 0:
+        参数:
+        - result: ultralytics的单图推理结果
+
+        返回:
+        - 字典，包含检测结果信息：检测状态、边界框、置信度和中心点
+        """
+        # 只取回置信度最高的 [x1, y1, x2, y2, conf, cls]，避免逐字段拷贝到CPU
+        return Sora2WaterMarkDetector._parse_boxes(
+            result.boxes.data[:1].float().cpu().numpy()
+        )
+
+    @staticmethod
+    def _parse_boxes(boxes: np.ndarray) -> dict:
+        """
+        将按置信度排序的检测框数组转换为检测结果字典
+
+        参数:
+        - boxes: 形状为 [K, 6] 的 (x1, y1, x2, y2, 置信度, 类别) 数组
+
+        返回:
+        - 字典，包含检测结果信息：检测状态、边界框、置信度和中心点
+        """
+        if len(boxes) == 0:
             return {"detected": False, "bbox": None, "confidence": None, "center": None}
 
         # 获取第一个检测结果（置信度最高的）
-        box = result.boxes[0]
-
-        # 提取边界框坐标（xyxy格式）
-        # 将张量转换为numpy数组，再转换为Python浮点数，最后转换为整数
-        xyxy = box.xyxy[0].cpu().numpy()
-        x1, y1, x2, y2 = float(xyxy[0]), float(xyxy[1]), float(xyxy[2]), float(xyxy[3])
+        data = boxes[0]
+        x1, y1, x2, y2 = float(data[0]), float(data[1]), float(data[2]), float(data[3])
         # 提取置信度分数
-        confidence = float(box.conf[0].cpu().numpy())
+        confidence = float(data[4])
         # 计算中心点
         center_x = (x1 + x2) / 2
         center_y = (y1 + y2) / 2
@@ -69,6 +173,140 @@ class Sora2WaterMarkDetector:
         }
 
 
+class StrideWaterMarkDetector:
+    """
+    按时间步长检测水印
+
+    每隔stride帧执行一次完整检测，中间帧只对上一个水印框做廉价的一致性校验：
+    当前帧与参考帧在该框内的灰度块相关性足够高时直接复用上一次的结果，否则重新检测。
+    实例保存跨批次的状态，每个视频应使用一个新实例。
+    """
+
+    def __init__(
+        self,
+        detector: Sora2WaterMarkDetector,
+        stride: int = DETECT_STRIDE,
+        min_similarity: float = DETECT_MIN_SIMILARITY,
+    ):
+        """
+        初始化步长检测器
+
+        参数:
+        - detector: 实际执行检测的水印检测器
+        - stride: 完整检测的帧间隔（1表示每帧都检测）
+        - min_similarity: 一致性校验的最小归一化相关系数
+        """
+        self.detector = detector
+        self.stride = max(1, stride)
+        self.min_similarity = min_similarity
+        # 已处理的帧数
+        self.frame_count = 0
+        # 上一次检测结果及其水印框内的灰度参考块
+        self.last_result = None
+        self.reference_patch = None
+        # 统计信息
+        self.full_detections = 0
+        self.reused = 0
+
+    def detect_batch(self, input_images: list) -> list:
+        """
+        批量检测水印，关键帧合并为一次模型调用
+
+        参数:
+        - input_images: 按时间顺序排列的输入图像列表
+
+        返回:
+        - 与输入一一对应的检测结果字典列表，格式与detect()相同
+        """
+        # 关键帧一次性批量检测
+        key_positions = [
+            i
+            for i in range(len(input_images))
+            if (self.frame_count + i) % self.stride == 0
+        ]
+        key_results = dict(
+            zip(
+                key_positions,
+                self.detector.detect_batch([input_images[i] for i in key_positions]),
+            )
+        )
+        self.full_detections += len(key_positions)
+
+        # 一致性校验失败的帧先记录下来，之后合并为一次模型调用；
+        # 在此之前后续帧仍与原参考块比较
+        results = [None] * len(input_images)
+        failed_positions = []
+        # 最后一个经过完整检测的帧位置，参考块需要与其保持一致
+        last_full = None
+        for i, image in enumerate(input_images):
+            if i in key_results:
+                results[i] = key_results[i]
+                self._update_reference(image, results[i])
+                last_full = i
+            elif self._is_consistent(image):
+                # 复用上一次的检测结果，参考块保持不变
+                results[i] = dict(self.last_result)
+                self.reused += 1
+            else:
+                failed_positions.append(i)
+                last_full = i
+
+        if failed_positions:
+            # 一致性校验失败的帧批量重新检测
+            detections = self.detector.detect_batch(
+                [input_images[i] for i in failed_positions]
+            )
+            for i, result in zip(failed_positions, detections):
+                results[i] = result
+            self.full_detections += len(failed_positions)
+            if last_full == failed_positions[-1]:
+                self._update_reference(input_images[last_full], results[last_full])
+
+        self.frame_count += len(input_images)
+        return results
+
+    def _is_consistent(self, image: np.ndarray) -> bool:
+        """判断当前帧在上一个水印框内是否与参考块一致"""
+        if self.last_result is None or not self.last_result["detected"]:
+            return False
+        if self.reference_patch is None:
+            return False
+        patch = self._crop_gray(image, self.last_result["bbox"])
+        if patch is None or patch.shape != self.reference_patch.shape:
+            return False
+        if np.array_equal(patch, self.reference_patch):
+            return True
+        # 同尺寸块的归一化相关系数，对亮度整体变化不敏感
+        score = cv2.matchTemplate(patch, self.reference_patch, cv2.TM_CCOEFF_NORMED)
+        score = float(score[0][0])
+        return not np.isnan(score) and score >= self.min_similarity
+
+    def _update_reference(self, image: np.ndarray, result: dict):
+        """使用新的检测结果更新参考块（水印框裁剪为空时不保存参考块）"""
+        self.last_result = result
+        if result["detected"]:
+            self.reference_patch = self._crop_gray(image, result["bbox"])
+        else:
+            self.reference_patch = None
+
+    @staticmethod
+    def _crop_gray(image: np.ndarray, bbox) -> np.ndarray | None:
+        """
+        裁剪水印框区域并转为灰度图
+
+        参数:
+        - image: BGR图像
+        - bbox: 水印框 (x1, y1, x2, y2)
+
+        返回:
+        - 灰度块，水印框裁剪后宽或高为0时返回None
+        """
+        x1, y1, x2, y2 = bbox
+        crop = image[y1:y2, x1:x2]
+        if crop.size == 0:
+            return None
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
 if __name__ == "__main__":
     """水印检测器的演示示例"""
     from pathlib import Path
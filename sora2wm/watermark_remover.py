@@ -5,12 +5,23 @@ import numpy as np
 import torch
 from loguru import logger
 
-from sora2wm.configs import DEFAULT_WATERMARK_REMOVE_MODEL
+from sora2wm.configs import (
+    DEFAULT_WATERMARK_REMOVE_MODEL,
+    LAMA_BACKEND,
+    LAMA_BATCH_SIZE,
+    LAMA_CROP_BUCKET,
+    LAMA_PRECISION,
+)
 from sora2wm.iopaint.const import DEFAULT_MODEL_DIR
-from sora2wm.iopaint.download import cli_download_model, scan_models
+from sora2wm.iopaint.download import (
+    cli_download_model,
+    get_erase_model_info,
+    scan_models,
+)
 from sora2wm.iopaint.model_manager import ModelManager
 from sora2wm.iopaint.schema import InpaintRequest
 from sora2wm.utils.devices_utils import get_device
+from sora2wm.utils.patch_utils import PatchReuseCache, clamp_bbox
 
 # 代码基于 https://github.com/Sanster/IOPaint#，感谢他们的出色工作！
 
@@ -18,22 +29,28 @@ from sora2wm.utils.devices_utils import get_device
 class WaterMarkRemover:
     """水印清除器类"""
     
-    def __init__(self):
+    def __init__(
+        self, lama_backend: str = LAMA_BACKEND, precision: str = LAMA_PRECISION
+    ):
         """
         初始化水印清除器
         - 加载默认的水印移除模型
         - 自动下载缺失的模型权重
         - 设置适当的设备（CPU或GPU）
+
+        参数:
+        - lama_backend: LAMA推理后端，"torch" 或 "onnx"（ONNX Runtime，CPU节点上更快）
+        - precision: 推理精度，"fp32"、"int8"（使用ONNX后端）或 "bf16"（使用torch后端）
         """
         # 设置要使用的模型
         self.model = DEFAULT_WATERMARK_REMOVE_MODEL
         # 获取可用设备（CPU或GPU）
         self.device = get_device()
 
-        # 扫描已安装的模型
-        scanned_models = scan_models()
-        # 检查模型是否已安装
-        if self.model not in [it.name for it in scanned_models]:
+        # 检查模型是否已安装：内置修复模型直接检查权重文件，其余模型才扫描整个模型缓存
+        if get_erase_model_info(self.model) is None and self.model not in [
+            it.name for it in scan_models()
+        ]:
             logger.info(
                 f"{self.model} 模型未在 {DEFAULT_MODEL_DIR} 中找到，正在尝试下载"
             )
@@ -41,7 +58,12 @@ class WaterMarkRemover:
             cli_download_model(self.model)
         
         # 初始化模型管理器
-        self.model_manager = ModelManager(name=self.model, device=self.device)
+        self.model_manager = ModelManager(
+            name=self.model,
+            device=self.device,
+            lama_backend=lama_backend,
+            lama_precision=precision,
+        )
         # 创建修复请求配置
         self.inpaint_request = InpaintRequest()
 
@@ -64,6 +86,116 @@ class WaterMarkRemover:
         inpaint_result = cv2.cvtColor(inpaint_result, cv2.COLOR_BGR2RGB)
         return inpaint_result
 
+    def clean_bbox(
+        self, input_image: np.array, bbox, inplace: bool = False
+    ) -> np.array:
+        """
+        清除图像中指定边界框内的水印
+
+        只对带边距的水印区域进行修复并贴回原图，无需构建整帧掩码
+
+        参数:
+        - input_image: 输入图像（numpy数组格式）
+        - bbox: 水印边界框 (x1, y1, x2, y2)
+        - inplace: 是否直接写回输入图像（要求输入图像可写）
+
+        返回:
+        - 去除水印后的图像（numpy数组格式）
+        """
+        # 仅修复水印区域周围的裁剪块
+        crop_result, (l, t, r, b) = self.model_manager.inpaint_box(
+            input_image, bbox, self.inpaint_request
+        )
+        output = input_image if inplace else input_image.copy()
+        # 转换颜色空间（从BGR到RGB）后贴回原位置
+        output[t:b, l:r] = crop_result[:, :, ::-1]
+        return output
+
+    def clean_bboxes(
+        self,
+        input_images: list,
+        bboxes: list,
+        inplace: bool = False,
+        batch_size: int = LAMA_BATCH_SIZE,
+        patch_cache: PatchReuseCache | None = None,
+    ) -> list:
+        """
+        批量清除多张图像中指定边界框内的水印
+
+        各图像的水印裁剪块按尺寸分桶后合并为一个批次送入模型推理
+
+        参数:
+        - input_images: 输入图像列表（numpy数组格式）
+        - bboxes: 与输入图像一一对应的水印边界框列表
+        - inplace: 是否直接写回输入图像（要求输入图像可写）
+        - batch_size: 每次模型推理的最大裁剪块数量
+        - patch_cache: 修复块复用缓存，可选；命中的图像直接复用缓存的修复块，不参与推理
+
+        返回:
+        - 去除水印后的图像列表（numpy数组格式）
+        """
+        outputs = [
+            input_image if inplace else input_image.copy()
+            for input_image in input_images
+        ]
+        if patch_cache is None:
+            todo = list(range(len(input_images)))
+            reused = []
+        else:
+            todo, reused, entries = self._lookup_patches(
+                input_images, bboxes, patch_cache
+            )
+
+        crop_results = []
+        if todo:
+            crop_results = self.model_manager.inpaint_boxes(
+                [input_images[i] for i in todo],
+                [bboxes[i] for i in todo],
+                self.inpaint_request,
+                batch_size=batch_size,
+                bucket=LAMA_CROP_BUCKET,
+            )
+        for i, (crop_result, (l, t, r, b)) in zip(todo, crop_results):
+            # 转换颜色空间（从BGR到RGB）后贴回原位置
+            outputs[i][t:b, l:r] = crop_result[:, :, ::-1]
+            if patch_cache is not None:
+                # 缓存边界框内的修复结果
+                x1, y1, x2, y2 = entries[i].bbox
+                entries[i].patch = outputs[i][y1:y2, x1:x2].copy()
+
+        # 命中的图像在同批次推理完成后贴回缓存的修复块
+        for i, entry, offset in reused:
+            x1, y1, x2, y2 = entry.bbox
+            outputs[i][y1:y2, x1:x2] = patch_cache.corrected_patch(entry, offset)
+        return outputs
+
+    @staticmethod
+    def _lookup_patches(input_images: list, bboxes: list, patch_cache):
+        """
+        在修复块缓存中查找每张图像可复用的修复块
+
+        未命中的图像立即登记为新的缓存条目，使同一批次中的后续图像也能复用它的推理结果
+
+        参数:
+        - input_images: 输入图像列表
+        - bboxes: 对应的水印边界框列表
+        - patch_cache: 修复块复用缓存
+
+        返回:
+        - (需要推理的图像索引列表, [(图像索引, 缓存条目, 颜色偏移)], {图像索引: 新缓存条目})
+        """
+        todo, reused, entries = [], [], {}
+        for i, (input_image, bbox) in enumerate(zip(input_images, bboxes)):
+            bbox = clamp_bbox(bbox, input_image.shape)
+            signature = patch_cache.signature(input_image, bbox)
+            entry, offset = patch_cache.lookup(bbox, signature)
+            if entry is None:
+                entries[i] = patch_cache.add(bbox, signature)
+                todo.append(i)
+            else:
+                reused.append((i, entry, offset))
+        return todo, reused, entries
+
 
 if __name__ == "__main__":
     """水印清除器使用示例"""
@@ -6,40 +6,40 @@ Sora2水印清除器 - 服务器启动脚本
 
 import argparse
 
-import fire
 import uvicorn
 from loguru import logger
 
-from sora2wm.configs import LOGS_PATH  # 导入日志文件路径配置
+from sora2wm.configs import LOGS_PATH, SERVER_NUM_WORKERS  # 导入日志文件路径和推理工作池配置
 from sora2wm.server.app import init_app  # 导入FastAPI应用初始化函数
+from sora2wm.server.worker import worker  # 导入任务处理器
 
-# 创建命令行参数解析器
-parser = argparse.ArgumentParser(description="启动Sora2水印清除器服务器")
-parser.add_argument("--host", default="0.0.0.0", help="服务器主机地址")
-parser.add_argument("--port", default=5344, help="服务器端口")
-parser.add_argument("--workers", default=1, type=int, help="工作进程数量")
-args = parser.parse_args()
 
-# 配置日志记录器，日志文件按周轮换
-logger.add(LOGS_PATH / "log_file.log", rotation="1 week")
-
-
-def start_server(port=args.port, host=args.host):
+def start_server(
+    port=5344,
+    host="0.0.0.0",
+    workers=1,
+    inference_workers=SERVER_NUM_WORKERS,
+):
     """
     启动FastAPI服务器
     
     参数:
     - port: 服务器监听端口
     - host: 服务器主机地址
+    - workers: Uvicorn工作进程数量
+    - inference_workers: 推理工作进程数量，每个进程持有一份模型副本
     """
     # 记录服务器启动信息
     logger.info(f"服务器启动在 {host}:{port}")
     
+    # 设置推理工作池的进程数量
+    worker.num_workers = inference_workers
+
     # 初始化FastAPI应用实例
     app = init_app()
     
     # 创建Uvicorn配置，设置主机、端口和工作进程数
-    config = uvicorn.Config(app, host=host, port=port, workers=args.workers)
+    config = uvicorn.Config(app, host=host, port=port, workers=workers)
     
     # 创建并运行服务器
     server = uvicorn.Server(config=config)
@@ -53,5 +53,21 @@ def start_server(port=args.port, host=args.host):
 
 
 if __name__ == "__main__":
-    # 使用Fire库启动服务器函数，支持命令行参数解析和参数传递
-    fire.Fire(start_server)
+    # 创建命令行参数解析器
+    # 放在主模块保护中：推理工作池以spawn方式启动子进程时会重新导入本模块
+    parser = argparse.ArgumentParser(description="启动Sora2水印清除器服务器")
+    parser.add_argument("--host", default="0.0.0.0", help="服务器主机地址")
+    parser.add_argument("--port", default=5344, type=int, help="服务器端口")
+    parser.add_argument("--workers", default=1, type=int, help="工作进程数量")
+    parser.add_argument(
+        "--inference-workers",
+        default=SERVER_NUM_WORKERS,
+        type=int,
+        help="推理工作进程数量，每个进程持有一份模型副本",
+    )
+    args = parser.parse_args()
+
+    # 配置日志记录器，日志文件按周轮换
+    logger.add(LOGS_PATH / "log_file.log", rotation="1 week")
+
+    start_server(args.port, args.host, args.workers, args.inference_workers)